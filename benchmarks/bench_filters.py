@@ -0,0 +1,81 @@
+"""Compare filtering the rows of an export as they are loaded with filtering
+the notes once they are built, and splitting notes by tag through the
+inverted index with the scan of every note's tag names used before.
+
+Run from the repository root:
+
+    python benchmarks/bench_filters.py --notes 100k
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from generate_export import NOTEBOOKS, TAGS, parse_size, write_export
+
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.filters import NoteFilter
+from notes_converter.utils.parallel import load_notes
+from notes_converter.utils.sorters import sort_notes_by_reference
+from notes_converter.utils.splitters import split_notes
+
+FILTERS = {
+    "tag": {"tags": [TAGS[-1]]},
+    "notebook": {"notebooks": [NOTEBOOKS[-1]]},
+    "30 days": {"since": "2018-03-01", "until": "2018-03-30"},
+    "volume": {"volumes": ["Pearl of Great Price"]},
+}
+
+
+def legacy_split_by_tag(notes):
+    """The grouping of `split_notes` used before the inverted index, which
+    read the names of every note's tags."""
+    groups: Dict[str, List] = {}
+    for note in notes:
+        names = [name for name in note.tags if name]
+        for name in names or ["No Tag"]:
+            groups.setdefault(name, []).append(note)
+    return [(name, groups[name]) for name in sorted(groups, key=str.casefold)]
+
+
+def timed(function, *args, **kwargs):
+    gc.collect()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=parse_size, default=parse_size("100k"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export = write_export(Path(temp_dir) / "notes.csv", args.notes)
+        notes, seconds = timed(load_notes, [export], FIELD_NAMES)
+        print(f"notes: {len(notes)}, loaded in {seconds:.2f} s")
+
+        for name, criteria in FILTERS.items():
+            note_filter = NoteFilter(**criteria)
+            _, after = timed(lambda: list(filter(note_filter.matches, notes)))
+            kept, before = timed(
+                load_notes, [export], FIELD_NAMES, note_filter=note_filter
+            )
+            print(
+                f"{name:<10}{len(kept):8} notes"
+                f"{seconds + after:8.2f} s built, then filtered"
+                f"{before:8.2f} s filtered as loaded"
+            )
+
+        sorted_notes = sort_notes_by_reference(notes)
+        legacy, scan = timed(legacy_split_by_tag, sorted_notes)
+        parts, index = timed(lambda: list(split_notes(sorted_notes, by="tag")))
+        assert [(n, len(p)) for n, p in parts] == [(n, len(p)) for n, p in legacy]
+        print(f"split by tag: {scan:.2f} s scanning names, {index:.2f} s indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Time adding linked paragraphs to a python-docx document, and fail unless
+the time per link stays flat as the document grows.
+
+Each link is added with its paragraph, as `write_to_docx` does, in equal
+blocks, and the time per link of each block is compared with the first. For
+comparison, the first blocks are also timed with python-docx's
+`doc.add_paragraph` and `part.relate_to`, whose time per link grows with the
+number of paragraphs and links already in the document.
+
+Run from the repository root:
+
+    python benchmarks/bench_hyperlinks.py --links 50k
+"""
+
+import argparse
+import sys
+import time
+from typing import Callable, List
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from generate_export import parse_size
+
+from notes_converter.utils.constants import TEMPLATE_PATH
+from notes_converter.utils.writers import (
+    HyperlinkBuilder,
+    _ParagraphAdder,
+    _style,
+    read_template,
+)
+
+SITE = "https://www.churchofjesuschrist.org/study/scriptures"
+# The number of blocks the links are timed in.
+BLOCKS = 10
+
+
+def make_urls(count: int) -> List[str]:
+    """Return `count` urls, each linking to a different verse, as in an
+    export without duplicates."""
+    return [
+        f"{SITE}/bofm/alma/{i // 40 + 1}?lang=eng&id=p{i % 40 + 1}"
+        for i in range(count)
+    ]
+
+
+def relate_to_link(doc) -> Callable:
+    """Add linked paragraphs the way python-docx does, as `write_to_docx`
+    used to."""
+    part = doc.part
+
+    def add(url, text):
+        paragraph = doc.add_paragraph(style="Link")
+        r_id = part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+        hyperlink = OxmlElement("w:hyperlink")
+        hyperlink.set(qn("r:id"), r_id)
+        new_run = OxmlElement("w:r")
+        rPr = OxmlElement("w:rPr")
+        c = OxmlElement("w:color")
+        c.set(qn("w:val"), "0000EE")
+        rPr.append(c)
+        u = OxmlElement("w:u")
+        u.set(qn("w:val"), "none")
+        rPr.append(u)
+        new_run.append(rPr)
+        new_run.text = text
+        hyperlink.append(new_run)
+        paragraph._p.append(hyperlink)
+
+    return add
+
+
+def builder_link(doc) -> Callable:
+    """Add linked paragraphs as `write_to_docx` does."""
+    add_paragraph = _ParagraphAdder(doc)
+    style_id = _style(read_template(None).styles, "Link")
+    hyperlinks = HyperlinkBuilder(doc.part)
+
+    def add(url, text):
+        hyperlinks.add(add_paragraph("", style_id), url, text)
+
+    return add
+
+
+def time_blocks(count: int, make_adder: Callable, blocks: int) -> List[float]:
+    """Add `count` linked paragraphs to a new document in `blocks` equal
+    blocks and return the microseconds per link of each block."""
+    doc = Document(str(TEMPLATE_PATH / "default.docx"))
+    doc._body.clear_content()
+    urls = make_urls(count)
+    add = make_adder(doc)
+
+    size = count // blocks
+    timings = []
+    for block in range(blocks):
+        start = time.perf_counter()
+        for i in range(block * size, (block + 1) * size):
+            add(urls[i], "Alma 1:1")
+        timings.append((time.perf_counter() - start) / size * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=parse_size, default=parse_size("50k"))
+    parser.add_argument(
+        "--relate-to-links",
+        type=parse_size,
+        default=parse_size("5k"),
+        help="The number of links timed with part.relate_to (default: 5k).",
+    )
+    parser.add_argument(
+        "--max-growth",
+        type=float,
+        default=2.0,
+        help="The most the time per link of the last block may be, as a "
+        "multiple of the first block (default: 2.0).",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"add_paragraph and relate_to, {args.relate_to_links} links "
+        "(us per link by block):"
+    )
+    timings = time_blocks(args.relate_to_links, relate_to_link, BLOCKS)
+    print("  " + " ".join(f"{timing:.1f}" for timing in timings))
+
+    print(f"write_to_docx, {args.links} links (us per link by block):")
+    timings = time_blocks(args.links, builder_link, BLOCKS)
+    print("  " + " ".join(f"{timing:.1f}" for timing in timings))
+
+    # The fastest of the first blocks, so that a slow start is not mistaken
+    # for linear time.
+    growth = timings[-1] / min(timings[: BLOCKS // 2])
+    print(f"growth: {growth:.2f}x")
+    if growth > args.max_growth:
+        print(
+            f"FAILED the time per link grew {growth:.2f}x "
+            f"(allowed {args.max_growth:.1f}x)",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the per-note cost of cleaning the notes' text with the three
+passes used before and with the single-pass normalizer.
+
+The single pass also makes the quotes curly, which the three passes did
+not do, so the three passes are also timed with a fourth pass giving
+their paragraphs curly quotes, and the results are compared with those.
+
+Run from the repository root:
+
+    python benchmarks/bench_normalize.py --notes 100k
+"""
+
+import argparse
+import re
+import time
+
+from generate_export import generate_rows, parse_size
+
+from notes_converter.utils.normalizers import (
+    NORMALIZE_BATCH_SIZE,
+    normalize_text,
+    normalize_texts,
+    smarten_quotes,
+)
+
+
+def legacy_normalize(note_text: str):
+    """The passes of `_convert_note_text_to_list` and `_remove_headers`
+    used before the normalizer."""
+    paragraphs = re.compile(r"([^\n]+(?:\n(?!\n)[^\n]+)*)")
+    p = paragraphs.findall(note_text)
+    text = [i.replace("\n", " ") for i in p]
+    n = ["" if i.startswith("[") or i.startswith("-----") else i for i in text]
+    return [i for i in n if i.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=parse_size, default=parse_size("100k"))
+    args = parser.parse_args()
+
+    texts = [row[2] for row in generate_rows(args.notes)]
+
+    start = time.perf_counter()
+    legacy = [legacy_normalize(text) for text in texts]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [normalize_text(text) for text in texts]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(texts), NORMALIZE_BATCH_SIZE):
+        batched.extend(normalize_texts(texts[i : i + NORMALIZE_BATCH_SIZE]))
+    batch_time = time.perf_counter() - start
+
+    # The quotes, as a fourth pass over the paragraphs of the three passes.
+    start = time.perf_counter()
+    curly = [[smarten_quotes(paragraph) for paragraph in note] for note in legacy]
+    quotes_time = time.perf_counter() - start
+
+    assert single == curly, "The normalized paragraphs differ."
+    assert batched == single, "The batched paragraphs differ."
+
+    per_note = 1e6 / args.notes
+    print(f"notes:                {args.notes}")
+    print(f"three passes:         {legacy_time * per_note:8.2f} us/note")
+    print(
+        f"three passes, quotes: {(legacy_time + quotes_time) * per_note:8.2f} us/note"
+    )
+    print(f"single pass:          {single_time * per_note:8.2f} us/note")
+    batches = f"batches of {NORMALIZE_BATCH_SIZE}:"
+    print(f"{batches:<22}{batch_time * per_note:8.2f} us/note")
+    print(f"speed-up:             {(legacy_time + quotes_time) / batch_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Time and memory-profile each stage of a conversion, and fail when a stage
+is slower or uses more memory than its stored baseline.
+
+The stages are run on synthetic exports from `generate_export.py`:
+
+* load: read the rows of the `csv` file.
+* dedup: remove the duplicate rows.
+* build: build the notes.
+* sort: sort the notes by reference.
+* resolve: build the reference of each note, with a cold cache.
+* write_docx: write the notes with the in-memory Word writer.
+* write: write the notes with the streaming Word writer.
+
+Run from the repository root:
+
+    python benchmarks/bench_stages.py --rows 10k --rows 100k
+    python benchmarks/bench_stages.py --rows 10k --update-baselines
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from generate_export import SIZES, parse_size, write_export
+
+from notes_converter.utils.constants import DATA_PATH, FIELD_NAMES
+from notes_converter.utils.converters import build_notes
+from notes_converter.utils.filters import remove_duplicate_notes
+from notes_converter.utils.loaders import iter_csv_files, load_json
+from notes_converter.utils.resolvers import ReferenceResolver, get_reference_resolver
+from notes_converter.utils.sorters import sort_notes_by_reference
+from notes_converter.utils.writers import stream_to_docx, write_to_docx
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+STAGES = ("load", "dedup", "build", "sort", "resolve", "write_docx", "write")
+# Differences below these are never reported, as they are within the noise
+# of short stages.
+NOISE = {"seconds": 0.05, "peak_mb": 1.0}
+
+Stage = Tuple[str, Callable[[], None]]
+
+
+def make_stages(export: Path, output: Path) -> List[Stage]:
+    """Return the stages of a conversion of `export`, each feeding the next
+    through `state`."""
+    state: Dict[str, object] = {}
+    sort_key = get_reference_resolver().sort_key
+
+    def load():
+        state["rows"] = list(iter_csv_files([export], FIELD_NAMES))
+
+    def dedup():
+        state["rows"] = remove_duplicate_notes(state.pop("rows"))
+
+    def build():
+        state["notes"] = build_notes(state.pop("rows"), FIELD_NAMES, sort_key)
+
+    def sort():
+        state["notes"] = sort_notes_by_reference(state["notes"])
+
+    def resolve():
+        resolver = ReferenceResolver(
+            load_json(DATA_PATH / "data_maps.json"),
+            load_json(DATA_PATH / "standard_works_order.json"),
+        )
+        for note in state["notes"]:
+            resolver.resolve(note.source_location)
+
+    def write_docx():
+        write_to_docx(state["notes"], output.with_suffix(".memory.docx"), None)
+
+    def write():
+        stream_to_docx(state.pop("notes"), output, None)
+
+    stages = (load, dedup, build, sort, resolve, write_docx, write)
+    return list(zip(STAGES, stages))
+
+
+def run_stages(export: Path, trace: bool) -> Dict[str, float]:
+    """Run the stages on `export` and return either the seconds each stage
+    took or, with `trace`, the megabytes each stage allocated at its peak."""
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stages = make_stages(export, Path(temp_dir) / "notes.docx")
+        if trace:
+            tracemalloc.start()
+        try:
+            for name, stage in stages:
+                gc.collect()
+                if trace:
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    stage()
+                    results[name] = (
+                        tracemalloc.get_traced_memory()[1] - before
+                    ) / 2**20
+                else:
+                    start = time.perf_counter()
+                    stage()
+                    results[name] = time.perf_counter() - start
+        finally:
+            if trace:
+                tracemalloc.stop()
+    return results
+
+
+def compare(results, baselines, tolerance: float) -> List[str]:
+    """Return a message for each result above its baseline by more than
+    `tolerance`, as a share of the baseline, and by more than the noise
+    allowed for its measure."""
+    failures = []
+    for size, stages in results.items():
+        for stage, measures in stages.items():
+            for measure, value in measures.items():
+                baseline = baselines.get(size, {}).get(stage, {}).get(measure)
+                if baseline is None:
+                    continue
+                allowed = max(baseline * tolerance, NOISE[measure])
+                if value - baseline > allowed:
+                    failures.append(
+                        f"{size} {stage} {measure}: {value:.3f} "
+                        f"(baseline {baseline:.3f}, +{value / baseline - 1:.0%})"
+                    )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        action="append",
+        help=f"The size of an export, such as {', '.join(SIZES)} (default: 10k).",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="The share by which a stage may exceed its baseline (default: 0.3).",
+    )
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Only time the stages."
+    )
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.rows or ["10k"]:
+            export = write_export(
+                Path(temp_dir) / f"{size}.csv", parse_size(size), args.seed
+            )
+            seconds = run_stages(export, trace=False)
+            memory = {} if args.no_memory else run_stages(export, trace=True)
+
+            results[size] = {}
+            print(f"{size} rows")
+            for stage in STAGES:
+                results[size][stage] = {"seconds": round(seconds[stage], 3)}
+                line = f"  {stage:<10} {seconds[stage]:8.3f} s"
+                if stage in memory:
+                    results[size][stage]["peak_mb"] = round(memory[stage], 1)
+                    line += f" {memory[stage]:8.1f} MB"
+                print(line)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4) + "\n")
+
+    baselines = (
+        json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    )
+    if args.update_baselines:
+        baselines.update(results)
+        args.baselines.write_text(json.dumps(baselines, indent=4) + "\n")
+        print(f"Baselines written to {args.baselines}")
+        return
+
+    failures = compare(results, baselines, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
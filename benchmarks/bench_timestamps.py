@@ -0,0 +1,77 @@
+"""Compare the per-note cost of formatting the notes' dates before and after
+timestamps were parsed at load time and formatted through a cache.
+
+Run from the repository root:
+
+    python benchmarks/bench_timestamps.py --notes 100000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from notes_converter.utils.timestamps import TimestampFormatter, parse_timestamp
+
+
+def legacy_convert_datetime(note_time: str) -> str:
+    """The implementation `_convert_datetime` used before the formatter."""
+    default_time = datetime.fromisoformat(note_time.replace("Z", "+00:00"))
+    dt = default_time.replace(tzinfo=pytz.utc)
+    pacific_tz = pytz.timezone("America/Los_Angeles")
+    dt_pacific = dt.astimezone(pacific_tz)
+    return dt_pacific.strftime("%B %d, %Y, %I:%M %p %Z")
+
+
+def make_timestamps(count: int, sessions: float, seed: int = 0):
+    """Build ISO 8601 timestamps the way Gospel Library exports them. Notes
+    are written during study sessions, so many share the same hour.
+    `sessions` is the probability that a note starts a new session."""
+    rng = random.Random(seed)
+    start = datetime(2018, 1, 1, tzinfo=timezone.utc)
+    timestamps = []
+    moment = start
+    for _ in range(count):
+        if rng.random() < sessions:
+            moment = start + timedelta(minutes=rng.randrange(3_000_000))
+        moment += timedelta(seconds=rng.randrange(30))
+        timestamps.append(moment.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+    return timestamps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--sessions", type=float, default=0.05)
+    args = parser.parse_args()
+
+    timestamps = make_timestamps(args.notes, args.sessions)
+
+    start = time.perf_counter()
+    legacy = [legacy_convert_datetime(t) for t in timestamps]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    epochs = [parse_timestamp(t) for t in timestamps]  # Done at load time.
+    parse_time = time.perf_counter() - start
+
+    formatter = TimestampFormatter()
+    start = time.perf_counter()
+    formatted = [formatter.format(e) for e in epochs]
+    format_time = time.perf_counter() - start
+
+    assert formatted == legacy, "The formatted dates differ."
+
+    per_note = 1e6 / args.notes
+    print(f"notes:                {args.notes}")
+    print(f"legacy:               {legacy_time * per_note:8.2f} us/note")
+    print(f"parse (load time):    {parse_time * per_note:8.2f} us/note")
+    print(f"format (cached):      {format_time * per_note:8.2f} us/note")
+    print(f"speed-up:             {legacy_time / (parse_time + format_time):8.1f}x")
+    print(f"formatter cache:      {formatter.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare the time per note of each output format's writer.
+
+The notes of a synthetic export are built and sorted once, then written
+by the streaming Word writer and by each text writer, and by the writer
+of plain text used before, which made several small writes per note.
+
+Run from the repository root:
+
+    python benchmarks/bench_writers.py --notes 100k
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+from pathlib import Path
+
+from generate_export import parse_size, write_export
+
+from notes_converter.utils.constants import DEFAULT_TIMEZONE, FIELD_NAMES
+from notes_converter.utils.converters import build_notes
+from notes_converter.utils.filters import remove_duplicate_notes
+from notes_converter.utils.loaders import iter_csv_files
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.sorters import sort_notes_by_reference
+from notes_converter.utils.timestamps import get_timestamp_formatter
+from notes_converter.utils.writers import WRITERS
+
+
+def legacy_write_to_txt(notes, output_path, time_zone, grouping):
+    """The implementation of `write_to_txt` used before the text writers,
+    which does not group the notes."""
+    formatter = get_timestamp_formatter(time_zone)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for note in notes:
+            f.write("\n\n" + note.title + "\n")
+            f.write(formatter.format(note.created) + "\n\n")
+            for body in note.note_text:
+                f.write(body + " ")
+            f.write("\n" + note.source_location)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=parse_size, default=parse_size("100k"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        export = write_export(temp_dir / "notes.csv", args.notes)
+        rows = remove_duplicate_notes(iter_csv_files([export], FIELD_NAMES))
+        notes = sort_notes_by_reference(
+            build_notes(rows, FIELD_NAMES, get_reference_resolver().sort_key)
+        )
+
+        writers = [
+            (name, writer.stream, {"template_path": None} if writer.templated else {})
+            for name, writer in WRITERS.items()
+        ]
+        writers.append(("txt, before", legacy_write_to_txt, {}))
+
+        per_note = 1e6 / len(notes)
+        print(f"notes: {len(notes)}")
+        for name, write, options in writers:
+            output = temp_dir / f"notes.{name.split(',')[0]}"
+            gc.collect()
+            start = time.perf_counter()
+            write(notes, output, time_zone=DEFAULT_TIMEZONE, grouping=True, **options)
+            seconds = time.perf_counter() - start
+            size = output.stat().st_size / 2**20
+            print(
+                f"{name:<12}{seconds * per_note:8.2f} us/note"
+                f"{seconds:8.2f} s{size:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Check that the command line starts within its import-time budget and
+never imports the modules it does not need.
+
+The imports are measured with `python -X importtime`, which reports the
+time spent importing each module. The cold start is the total of the
+top-level imports, including those of the interpreter's start-up. Two
+start-up paths are checked:
+
+* help: `converter --help`, which must not import the converter, nor
+  `typing` or any module that needs it.
+* stream: a streamed conversion of a small export, which must not import
+  Tk or python-docx.
+
+Run from the repository root:
+
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-ms 40 --repeat 10
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from generate_export import write_export
+
+# The modules that must not be imported by each path.
+FORBIDDEN = {
+    "help": (
+        "tkinter",
+        "docx",
+        "lxml",
+        "psutil",
+        "pytz",
+        "typing",
+        "notes_converter.converter",
+        "notes_converter.utils.splitters",
+    ),
+    "stream": ("tkinter", "docx"),
+}
+
+
+def measure(arguments: List[str]) -> Tuple[float, Dict[str, float]]:
+    """Run the program with `arguments` under `-X importtime`.
+
+    Returns
+    -------
+    The total import time in milliseconds, and the cumulative time of each
+    imported module.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "notes_converter", *arguments],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header.
+        milliseconds = int(cumulative) / 1000
+        modules[name.strip()] = milliseconds
+        if not name.startswith("  "):
+            total += milliseconds
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=50.0,
+        help="The most milliseconds `--help` may spend importing (default: 50).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="The number of runs, of which the fastest is kept (default: 5).",
+    )
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export = write_export(Path(temp_dir) / "notes.csv", 10)
+        document = Path(temp_dir) / "notes.docx"
+        paths = {
+            "help": ["--help"],
+            "stream": ["-i", str(export), "-o", str(document), "-s"],
+        }
+        for path, arguments in paths.items():
+            runs = [measure(arguments) for _ in range(args.repeat)]
+            total, modules = min(runs, key=lambda run: run[0])
+            print(f"{path:<8} {total:8.1f} ms")
+
+            for module in FORBIDDEN[path]:
+                if module in modules:
+                    failures.append(f"{path} imports {module}")
+            if path == "help" and total > args.budget_ms:
+                slowest = sorted(modules.items(), key=lambda item: -item[1])[:10]
+                failures.append(
+                    f"{path} spends {total:.1f} ms importing "
+                    f"(budget {args.budget_ms:.0f} ms), slowest: "
+                    + ", ".join(f"{name} {ms:.1f} ms" for name, ms in slowest)
+                )
+
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
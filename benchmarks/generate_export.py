@@ -0,0 +1,219 @@
+"""Generate a synthetic Gospel Library export in the `FIELD_NAMES` schema.
+
+The notes point to scriptures, manuals and Ensign articles, hold several
+paragraphs with the date headers and rulers of real exports, share a small
+vocabulary of tags and notebooks, and include duplicates.
+
+Run from the repository root:
+
+    python benchmarks/generate_export.py --rows 100k -o notes-100k.csv
+"""
+
+import argparse
+import csv
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from notes_converter.utils.constants import DATA_PATH
+from notes_converter.utils.loaders import load_json
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# The titles of the columns of a Gospel Library export.
+HEADER = [
+    "Type",
+    "Title",
+    "Note Text",
+    "Source Location",
+    "Tags",
+    "Notebooks",
+    "Study Set",
+    "Last Updated",
+    "Created",
+    "Highlight",
+]
+
+SITE = "https://www.churchofjesuschrist.org/study"
+MANUALS = [
+    "come-follow-me-for-individuals-and-families-book-of-mormon-2024",
+    "come-follow-me-for-individuals-and-families-new-testament-2023",
+    "preach-my-gospel-2023",
+    "gospel-principles",
+]
+ARTICLES = ["the-atonement", "faith-in-christ", "come-unto-me", "a-living-prophet"]
+TAGS = [
+    "Faith",
+    "Repentance",
+    "Prayer",
+    "Covenants",
+    "Charity",
+    "Atonement",
+    "Revelation",
+    "Temple",
+    "Family",
+    "Prophets",
+    "Grace",
+    "Service",
+]
+NOTEBOOKS = ["Sunday School", "Seminary", "Personal Study", "Talks"]
+HIGHLIGHTS = ["yellow", "blue", "green", "red", "purple", "clear"]
+WORDS = (
+    "and it came to pass that the lord spake unto me saying behold i will "
+    "prepare a way for them that they may accomplish the thing which he "
+    "commandeth them faith hope charity covenant promise wisdom"
+).split()
+
+# The share of each kind of note.
+SCRIPTURE, MANUAL, ENSIGN = 0.85, 0.08, 0.04  # The rest are annotations.
+
+
+def generate_rows(
+    count: int, seed: int = 0, duplicates: float = 0.03
+) -> Iterator[List[str]]:
+    """Yield `count` rows of a synthetic export, including `duplicates` as a
+    share of copies of earlier notes.
+
+    Parameters
+    ----------
+    count : The number of rows.
+    seed : The seed of the random generator, so that exports can be
+        generated again.
+    duplicates : The share of rows copying an earlier note. Half of them
+        are exact copies, and half have other tags and a later update.
+    """
+    rng = random.Random(seed)
+    name_maps: Dict[str, str] = load_json(DATA_PATH / "data_maps.json")
+    standard_works = load_json(DATA_PATH / "standard_works_order.json")
+    books = [
+        (volume, book) for volume in standard_works for book in standard_works[volume]
+    ]
+    moment = datetime(2018, 1, 1, tzinfo=timezone.utc)
+
+    recent: List[List[str]] = []
+    for _ in range(count):
+        if recent and rng.random() < duplicates:
+            row = list(rng.choice(recent))
+            if rng.random() < 0.5:
+                row[4] = _names(rng, TAGS, 3)
+                row[7] = _timestamp(moment + timedelta(days=rng.randrange(1, 90)))
+            yield row
+            continue
+
+        # Notes are written in study sessions, a few minutes apart.
+        if rng.random() < 0.05:
+            moment += timedelta(hours=rng.randrange(12, 72))
+        moment += timedelta(seconds=rng.randrange(30, 600))
+
+        title, url = _source(rng, books, name_maps)
+        created = _timestamp(moment)
+        updated = (
+            created if rng.random() < 0.8 else _timestamp(moment + timedelta(days=3))
+        )
+        row = [
+            rng.choice(["highlight", "journal"]),
+            title,
+            _note_text(rng, moment),
+            url,
+            _names(rng, TAGS, 3),
+            _names(rng, NOTEBOOKS, 1),
+            "",
+            updated,
+            created,
+            rng.choice(HIGHLIGHTS),
+        ]
+        recent.append(row)
+        if len(recent) > 1000:
+            recent.pop(rng.randrange(len(recent)))
+        yield row
+
+
+def write_export(path, count: int, seed: int = 0, duplicates: float = 0.03) -> Path:
+    """Write a synthetic export of `count` rows to `path`."""
+    path = Path(path)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(count, seed, duplicates))
+    return path
+
+
+def parse_size(value: str) -> int:
+    """Convert a size such as `10k`, `1m` or `2500` to a number of rows."""
+    value = value.lower()
+    if value in SIZES:
+        return SIZES[value]
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    number = value[:-1] if multiplier > 1 else value
+    return int(float(number) * multiplier)
+
+
+def _source(rng: random.Random, books, name_maps):
+    kind = rng.random()
+    paragraph = rng.randrange(1, 40)
+    anchor = f"p{paragraph}"
+    if rng.random() < 0.1:
+        anchor += f"-p{paragraph + rng.randrange(1, 4)}"
+
+    if kind < SCRIPTURE:
+        volume, book = rng.choice(books)
+        chapter = rng.randrange(1, 30)
+        url = f"{SITE}/scriptures/{volume}/{book}/{chapter}?lang=eng&id={anchor}"
+        return f"{name_maps.get(book, book)} {chapter}:{paragraph}", url
+    if kind < SCRIPTURE + MANUAL:
+        manual = rng.choice(MANUALS)
+        lesson = rng.randrange(1, 52)
+        return (
+            f"Lesson {lesson}",
+            f"{SITE}/manual/{manual}/{lesson}?lang=eng&id={anchor}",
+        )
+    if kind < SCRIPTURE + MANUAL + ENSIGN:
+        year, month = rng.randrange(1971, 2021), rng.randrange(1, 13)
+        article = rng.choice(ARTICLES)
+        url = f"{SITE}/ensign/{year}/{month:02d}/{article}?lang=eng&id={anchor}"
+        return article.replace("-", " ").title(), url
+    return "", "undefined"
+
+
+def _note_text(rng: random.Random, moment: datetime) -> str:
+    paragraphs = []
+    if rng.random() < 0.3:
+        # Copied notes start with the date of the original and a ruler.
+        paragraphs.append(f"[{moment:%B %d, %Y}]\n-----")
+    for _ in range(rng.choice([1, 1, 1, 2, 2, 3, 5])):
+        lines = [
+            " ".join(rng.choices(WORDS, k=rng.randrange(4, 20)))
+            for _ in range(rng.choice([1, 1, 2]))
+        ]
+        paragraphs.append(
+            "\n".join(lines).capitalize() + rng.choice([".", '."', "'s."])
+        )
+    return "\n\n".join(paragraphs)
+
+
+def _names(rng: random.Random, names: List[str], most: int) -> str:
+    # The first names are used the most, like in a real export.
+    count = rng.randrange(most + 1)
+    chosen = {names[int(len(names) * rng.random() ** 2)] for _ in range(count)}
+    return "; ".join(sorted(chosen))
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=parse_size, default=SIZES["10k"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicates", type=float, default=0.03)
+    parser.add_argument("-o", "--output", type=Path, required=True)
+    args = parser.parse_args()
+
+    write_export(args.output, args.rows, args.seed, args.duplicates)
+    print(f"{args.rows} rows written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
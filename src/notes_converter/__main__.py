@@ -3,22 +3,32 @@
 Convert a `.csv` file to a styled `.docx` file.
 """
 
-from notes_converter.cli import Cli, parse_args
-from notes_converter.converter import NotesConverter
-from notes_converter.gui import MainWindow
+from notes_converter.cli import BatchCli, Cli, parse_args
 
 
 def main():
 
+    # The arguments are parsed before the converter and the GUI are
+    # imported, so that `--help` and headless runs start quickly and never
+    # load Tk.
+    args = parse_args()
+    if args.manifest or args.watch:
+        # Batch mode
+        BatchCli(args).run()
+        return
+
+    from notes_converter.converter import NotesConverter
+
     converter = NotesConverter()
 
-    # Command-line mode
-    args = parse_args()
     if args.input:
+        # Command-line mode
         cli = Cli(args, converter)
         cli.run()
     else:
         # GUI mode
+        from notes_converter.gui import MainWindow
+
         window = MainWindow(converter)
         window.mainloop()
 
@@ -0,0 +1,248 @@
+"""A module containing the batch and watch-folder modes, which convert many
+exports in one long-lived process."""
+
+import json
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+
+from notes_converter.converter import NotesConverter
+from notes_converter.utils.parallel import worker_count
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.timestamps import get_timestamp_formatter
+from notes_converter.utils.writers import get_writer, read_template
+
+# The number of seconds between two scans of a watched folder.
+WATCH_INTERVAL = 2.0
+
+
+class Job(NamedTuple):
+    """The `csv` files converted to a single output path."""
+
+    inputs: Tuple[Path, ...]
+    output: Path
+
+
+class JobResult(NamedTuple):
+    """The outcome of a job. `error` is `None` if the job succeeded."""
+
+    job: Job
+    seconds: float
+    error: Union[str, None]
+
+
+def load_manifest(path: Union[str, Path]) -> List[Job]:
+    """Load the jobs of a manifest.
+
+    A manifest is a `.json` file listing the input files and output path of
+    each job:
+
+        {"jobs": [{"input": ["a.csv", "b.csv"], "output": "ab.docx"}]}
+
+    `input` may also be a single path. Relative paths are relative to the
+    manifest's folder.
+
+    Parameters
+    ----------
+    path : A string or Path object to the manifest.
+
+    Returns
+    -------
+    A list of `Job`s, in the order of the manifest.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    jobs = []
+    for number, entry in enumerate(manifest.get("jobs", []), start=1):
+        try:
+            inputs, output = entry["input"], entry["output"]
+        except (KeyError, TypeError):
+            raise ValueError(
+                f"job {number} of '{path}' needs an 'input' and an 'output'"
+            ) from None
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        jobs.append(
+            Job(
+                inputs=tuple(path.parent / file for file in inputs),
+                output=path.parent / output,
+            )
+        )
+    return jobs
+
+
+def warm_up(options: Dict[str, Any]) -> None:
+    """Load the resources shared by every conversion of a process: the name
+    maps, the time zone and the template."""
+    get_reference_resolver()
+    if "time_zone" in options:
+        get_timestamp_formatter(options["time_zone"])
+    read_template(options.get("template_path"))
+
+
+def run_job(job: Job, options: Dict[str, Any]) -> JobResult:
+    """Convert a single job with a new `NotesConverter`.
+
+    Parameters
+    ----------
+    job : The job to convert.
+    options : The attributes of `NotesConverter` to set, such as
+        `time_zone` or `split_by`.
+
+    Returns
+    -------
+    A `JobResult`. Errors are reported rather than raised, so that a broken
+    export does not stop the other jobs.
+    """
+    start = time.perf_counter()
+    converter = NotesConverter()
+    for name, value in options.items():
+        setattr(converter, name, value)
+    converter.input_path = list(job.inputs)
+    converter.output_path = job.output
+    try:
+        converter.convert()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    else:
+        error = None
+    return JobResult(job, time.perf_counter() - start, error)
+
+
+class BatchRunner:
+    """Run jobs in a pool of worker processes that live as long as the
+    runner, so that the start-up, imports and shared resources are paid
+    once per worker rather than once per job.
+
+    Parameters
+    ----------
+    options : The attributes of `NotesConverter` to set for every job.
+    workers : The number of worker processes. `1` runs the jobs in this
+        process, and `0` uses one process per CPU.
+    """
+
+    def __init__(self, options: Dict[str, Any], workers: int = 1) -> None:
+        # Each job runs in a single process, since the jobs run in parallel.
+        self.options = {**options, "jobs": 1}
+        self.workers = worker_count(workers)
+        self.results: List[JobResult] = []
+        self._executor: Union[ProcessPoolExecutor, None] = None
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=warm_up,
+                initargs=(self.options,),
+            )
+        else:
+            warm_up(self.options)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def submit(
+        self, job: Job, callback: Union[Callable[[JobResult], None], None] = None
+    ) -> Future:
+        """Start a job, and call `callback` with its result once it is done."""
+        if self._executor is None:
+            future: Future = Future()
+            future.set_result(run_job(job, self.options))
+        else:
+            future = self._executor.submit(run_job, job, self.options)
+
+        def done(future: Future) -> None:
+            result = future.result()
+            self.results.append(result)
+            if callback is not None:
+                callback(result)
+
+        future.add_done_callback(done)
+        return future
+
+    def run(
+        self,
+        jobs: List[Job],
+        callback: Union[Callable[[JobResult], None], None] = None,
+    ) -> List[JobResult]:
+        """Run all `jobs` and return their results, in the order of `jobs`."""
+        futures = [self.submit(job, callback) for job in jobs]
+        return [future.result() for future in futures]
+
+    @property
+    def jobs_per_minute(self) -> float:
+        """The number of jobs finished per minute since the runner started."""
+        elapsed = time.perf_counter() - self._start
+        return len(self.results) * 60 / elapsed if elapsed else 0.0
+
+    def summary(self) -> str:
+        failed = sum(result.error is not None for result in self.results)
+        elapsed = time.perf_counter() - self._start
+        text = (
+            f"{len(self.results) - failed} jobs converted in {elapsed:.1f} s "
+            f"({self.jobs_per_minute:.1f} jobs/min)"
+        )
+        if failed:
+            text += f", {failed} failed"
+        return text
+
+
+def watch_folder(
+    runner: BatchRunner,
+    folder: Union[str, Path],
+    output_folder: Union[str, Path, None] = None,
+    interval: float = WATCH_INTERVAL,
+    callback: Union[Callable[[JobResult], None], None] = None,
+) -> None:
+    """Convert each `csv` file that appears in `folder`, or that changes,
+    until interrupted.
+
+    A file is converted once its size and modification time are the same
+    in two scans, so that files still being copied are left alone. Files
+    older than their document are skipped, so that restarting the watch
+    does not convert them again.
+
+    Parameters
+    ----------
+    runner : The `BatchRunner` running the conversions.
+    folder : The folder to watch.
+    output_folder : The folder of the documents, named after each file, with
+        the extension of the runner's `output_format`. Defaults to `folder`.
+    interval : The number of seconds between two scans.
+    callback : Called with the result of each job.
+    """
+    folder = Path(folder)
+    output_folder = Path(output_folder) if output_folder else folder
+    output_folder.mkdir(parents=True, exist_ok=True)
+    suffix = get_writer(runner.options.get("output_format")).suffixes[0]
+    pending: Dict[Path, Tuple[int, int]] = {}
+    converted: Dict[Path, Tuple[int, int]] = {}
+
+    while True:
+        for path in sorted(folder.glob("*.csv")):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Removed since the scan.
+            version = (stat.st_size, stat.st_mtime_ns)
+            if converted.get(path) == version:
+                continue
+            if pending.get(path) != version:
+                pending[path] = version
+                continue
+
+            del pending[path]
+            converted[path] = version
+            output = output_folder / f"{path.stem}{suffix}"
+            if output.exists() and output.stat().st_mtime_ns >= stat.st_mtime_ns:
+                continue
+            runner.submit(Job((path,), output), callback)
+        time.sleep(interval)
@@ -1,8 +1,25 @@
-"""A module containing all CLI elements and functions for `notes_converter`."""
+"""A module containing all CLI elements and functions for `notes_converter`.
+
+Only the modules needed to parse the arguments are imported here, so that
+the program starts quickly. The others are imported once they are needed.
+"""
 
 import argparse
+import sys
 from pathlib import Path
 
+from notes_converter.utils.constants import (
+    DEFAULT_TIMEZONE,
+    OUTPUT_FORMATS,
+    PIPELINES,
+    SPLIT_OPTIONS,
+)
+
+# Set by type checkers only, so that `typing` is not imported at startup.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from notes_converter.batch import JobResult
+
 
 def parse_args():
     """Parse command line inputs."""
@@ -23,13 +40,273 @@ def parse_args():
         type=str,
         help="The path to the target file.",
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="output_format",
+        choices=OUTPUT_FORMATS,
+        help="The format of the output (default: chosen by its extension, or docx).",
+    )
     parser.add_argument(
         "-t",
         "--template",
         type=str,
         help="The path to a custom template.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="Write the document one note at a time to save memory.",
+    )
+    parser.add_argument(
+        "-z",
+        "--timezone",
+        dest="time_zone",
+        metavar="TIMEZONE",
+        type=_time_zone,
+        default=DEFAULT_TIMEZONE,
+        help=f"The time zone in which dates are displayed (default: {DEFAULT_TIMEZONE}).",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of processes used to load and write files (0 for one per CPU).",
+    )
+    parser.add_argument(
+        "--split-by",
+        choices=SPLIT_OPTIONS,
+        help="Write one document per volume, tag or notebook.",
+    )
+    parser.add_argument(
+        "--max-notes",
+        type=_positive_int,
+        help="The maximum number of notes per document.",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=_positive_int,
+        help="The approximate maximum size of the text in each document.",
+    )
+    parser.add_argument(
+        "--tag",
+        dest="tags",
+        metavar="TAG",
+        action="append",
+        help="Only convert the notes with this tag (repeat for any of several).",
+    )
+    parser.add_argument(
+        "--notebook",
+        dest="notebooks",
+        metavar="NOTEBOOK",
+        action="append",
+        help="Only convert the notes in this notebook (repeat for any of several).",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="DATE",
+        type=_date,
+        help="Only convert the notes created on or after this date, "
+        "such as 2024-01-31, in --timezone.",
+    )
+    parser.add_argument(
+        "--until",
+        metavar="DATE",
+        type=_date,
+        help="Only convert the notes created on or before this date.",
+    )
+    parser.add_argument(
+        "--volume",
+        dest="volumes",
+        metavar="VOLUME",
+        type=_volume,
+        action="append",
+        help="Only convert the notes of this volume, such as "
+        "'Book of Mormon' (repeat for any of several).",
+    )
+    parser.add_argument(
+        "--no-grouping",
+        dest="grouping",
+        action="store_false",
+        help="Give each note its own heading, even when it shares its reference.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the notes and paragraphs stored by earlier conversions.",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        help="The path to the note store used by --incremental.",
+    )
+    parser.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="Read the sorted notes from the cache of the input files, or "
+        "write them to it, so that unchanged files are not parsed again.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="The directory of the caches used by --from-cache.",
+    )
+    parser.add_argument(
+        "--pipeline",
+        choices=PIPELINES,
+        help="Sort the notes in memory, on disk or in a database "
+        "(default: chosen by the memory budget).",
+    )
+    parser.add_argument(
+        "--max-memory",
+        metavar="SIZE",
+        type=_memory_size,
+        help="The most memory the conversion may use, such as 512M or 2G "
+        "(in megabytes without a unit). Used to choose the pipeline.",
+    )
+    parser.add_argument(
+        "--temp-dir",
+        type=str,
+        help="The directory in which notes are spilled to disk.",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="REPORT",
+        type=str,
+        help="Write the time, rows and peak memory of each stage to a JSON file.",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="FILE",
+        type=str,
+        help="With --profile (required), write the cProfile statistics of the "
+        "slowest stage.",
+    )
+    parser.add_argument(
+        "--manifest",
+        metavar="FILE",
+        type=str,
+        help="Convert each job of a JSON manifest, with --jobs worker processes.",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="FOLDER",
+        type=str,
+        help="Convert each csv file added to a folder until interrupted, "
+        "with --jobs worker processes, into the --output folder.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Explain the choices made during the conversion.",
+    )
+    args = parser.parse_args()
+    if args.profile_dump and not args.profile:
+        parser.error("--profile-dump requires --profile")
+    return args
+
+
+def _time_zone(value: str) -> str:
+    """Validate a time zone name given on the command line."""
+    if value == DEFAULT_TIMEZONE:
+        # argparse also validates the default, which should not cost the
+        # import of pytz.
+        return value
+    import pytz
+
+    if value not in pytz.all_timezones_set:
+        raise argparse.ArgumentTypeError(f"unknown time zone: '{value}'")
+    return value
+
+
+def _date(value: str) -> str:
+    """Validate a date, or a date and time, in ISO 8601 format."""
+    from datetime import datetime
+
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: '{value}'") from None
+    return value
+
+
+def _volume(value: str) -> str:
+    """Validate the name of a volume given on the command line."""
+    from notes_converter.utils.filters import NoteFilter
+
+    try:
+        NoteFilter(volumes=[value]).volume_indexes()
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return value
+
+
+def _positive_int(value: str) -> int:
+    """Validate a count or size that must be at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: '{value}'") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: '{value}'")
+    return number
+
+
+def _memory_size(value: str) -> int:
+    """Convert a size such as `512M`, `2G` or `800` (megabytes) to bytes."""
+    units = {"K": 2**10, "M": 2**20, "G": 2**30}
+    unit = value[-1:].upper()
+    number = value[:-1] if unit in units else value
+    try:
+        size = float(number) * units.get(unit, 2**20)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{value}'") from None
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size: '{value}'")
+    return int(size)
+
+
+def _configure_logging(verbose: bool) -> None:
+    """Show the messages explaining the conversion's choices if `verbose`."""
+    if verbose:
+        import logging
+
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+def converter_options(args) -> dict:
+    """Return the attributes of `NotesConverter` set by the command line."""
+    options = {
+        "output_format": args.output_format,
+        "streaming": args.stream,
+        "time_zone": args.time_zone,
+        "jobs": args.jobs,
+        "split_by": args.split_by,
+        "max_notes": args.max_notes,
+        "max_bytes": args.max_bytes,
+        "grouping": args.grouping,
+        "tags": args.tags or [],
+        "notebooks": args.notebooks or [],
+        "since": args.since,
+        "until": args.until,
+        "volumes": args.volumes or [],
+        "incremental": args.incremental,
+        "from_cache": args.from_cache,
+        "pipeline": args.pipeline,
+        "max_memory": args.max_memory,
+    }
+    if args.template:
+        options["template_path"] = Path(args.template)
+    if args.store:
+        options["store_path"] = Path(args.store)
+    if args.cache_dir:
+        options["cache_dir"] = Path(args.cache_dir)
+    if args.temp_dir:
+        options["temp_dir"] = Path(args.temp_dir)
+    return options
 
 
 class Cli:
@@ -41,6 +318,8 @@ class Cli:
         self.converter = converter
 
     def run(self):
+        _configure_logging(self.args.verbose)
+
         input_path = [Path(i) for i in self.args.input]
         output_path = Path(self.args.output)
 
@@ -49,8 +328,61 @@ class Cli:
         self.converter.output_path = output_path
 
         # Optional values:
-        if self.args.template:
-            self.converter.template_path = Path(self.args.template)
+        for name, value in converter_options(self.args).items():
+            setattr(self.converter, name, value)
+
+        profiler = None
+        if self.args.profile:
+            from notes_converter.utils.profilers import Profiler
 
-        status = self.converter.convert()
+            profiler = Profiler(profile_hottest=bool(self.args.profile_dump))
+            self.converter.add_hook(profiler)
+
+        try:
+            status = self.converter.convert()
+        finally:
+            if profiler is not None:
+                profiler.close()
         print(status)
+
+        if profiler is not None:
+            profiler.write_report(self.args.profile)
+            if self.args.profile_dump:
+                profiler.dump_hottest_profile(self.args.profile_dump)
+
+
+class BatchCli:
+    """Run the jobs of a manifest, or watch a folder, in one process."""
+
+    def __init__(self, args) -> None:
+        self.args = args
+
+    def run(self):
+        from notes_converter.batch import BatchRunner, load_manifest, watch_folder
+
+        _configure_logging(self.args.verbose)
+
+        # The processes load the files of different jobs rather than the
+        # parts of a single job.
+        with BatchRunner(converter_options(self.args), self.args.jobs) as runner:
+            try:
+                if self.args.manifest:
+                    runner.run(load_manifest(self.args.manifest), self.show_result)
+                else:
+                    watch_folder(
+                        runner,
+                        self.args.watch,
+                        self.args.output,
+                        callback=self.show_result,
+                    )
+            except KeyboardInterrupt:
+                pass
+        print(runner.summary())
+        if any(result.error for result in runner.results):
+            sys.exit(1)
+
+    def show_result(self, result: "JobResult") -> None:
+        if result.error is None:
+            print(f"{result.job.output} saved in {result.seconds:.1f} s")
+        else:
+            print(f"{result.job.output} failed: {result.error}", file=sys.stderr)
@@ -1,79 +1,517 @@
-"""A module containing the `NotesConverter` engine.
-"""
+"""A module containing the `NotesConverter` engine."""
 
+import contextlib
+import glob
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
 
-from notes_converter.utils.checkers import SystemMemory, check_file_size
-from notes_converter.utils.constants import DATA_PATH, FIELD_NAMES
-from notes_converter.utils.converters import build_notes
-from notes_converter.utils.loaders import load_csv_files, load_json
-from notes_converter.utils.sorters import sort_notes_by_title_and_verse
-from notes_converter.utils.writers import write_to_docx
+from notes_converter.utils.caches import (
+    NoteCache,
+    note_cache_digest,
+    note_cache_path,
+    open_note_cache,
+    write_note_cache,
+)
+from notes_converter.utils.constants import (
+    DEFAULT_TIMEZONE,
+    FIELD_NAMES,
+    NOTE_CACHE_PATH,
+    NOTE_STORE_PATH,
+    PIPELINES,
+)
+from notes_converter.utils.converters import iter_notes
+from notes_converter.utils.database import (
+    NoteStore,
+    commit_to_database,
+    open_database,
+    select_sorted_notes,
+)
+from notes_converter.utils.exceptions import ConversionCancelled
+from notes_converter.utils.filters import NoteFilter, remove_sorted_duplicates
+from notes_converter.utils.loaders import iter_csv_column, iter_csv_files
+from notes_converter.utils.parallel import load_notes, write_parts
+from notes_converter.utils.planners import MemoryPlan, plan_conversion
+from notes_converter.utils.profilers import (
+    ConversionHook,
+    StageStats,
+    start_peak,
+    traced_peak,
+)
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.sorters import (
+    RUN_SIZE,
+    external_sort,
+    is_sorted,
+    sort_notes_by_reference,
+)
+from notes_converter.utils.splitters import split_notes
+from notes_converter.utils.writers import get_writer
+
+# The number of rows between two progress reports of a stage.
+PROGRESS_INTERVAL = 1000
+
+
+class StageProgress:
+    """The rows processed by a stage, reported to the hooks every
+    `PROGRESS_INTERVAL` rows.
+
+    Parameters
+    ----------
+    stage : The name of the stage.
+    hooks : The hooks to notify.
+    total : The number of rows the stage is expected to process, if known.
+    cancelled : An event set when the conversion is cancelled, if it can be.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        hooks: List[ConversionHook],
+        total: Union[int, None] = None,
+        cancelled: Union[threading.Event, None] = None,
+    ) -> None:
+        self.stage = stage
+        self.rows = 0
+        self.total = total
+        self._hooks = hooks
+        self._cancelled = cancelled
+        self._next_report = PROGRESS_INTERVAL
+        self._reported = -1
+
+    def advance(self, rows: int = 1) -> None:
+        """Count `rows` more processed rows.
+
+        Raises
+        ------
+        ConversionCancelled : If the conversion was cancelled.
+        """
+        if self._cancelled is not None and self._cancelled.is_set():
+            raise ConversionCancelled
+        self.rows += rows
+        if self.rows >= self._next_report:
+            self._next_report = self.rows + PROGRESS_INTERVAL
+            self.report()
+
+    def report(self) -> None:
+        if self.rows == self._reported:
+            return
+        self._reported = self.rows
+        for hook in self._hooks:
+            hook.stage_progress(self.stage, self.rows, self.total)
 
 
 class NotesConverter:
-    """A class for converting a `csv` file to an MS Word document."""
+    """A class for converting a `csv` file to an MS Word document, or to
+    any other format of `writers.WRITERS`."""
 
     def __init__(self) -> None:
         self.input_path: List[Any] = []
         self.output_path = Path()
         self.template_path = None
-        self._smu = SystemMemory()
+        # The name of a format of `writers.WRITERS`. `None` chooses by the
+        # extension of `output_path`.
+        self.output_format = None
+        self.streaming = False
+        self.time_zone = DEFAULT_TIMEZONE
+        self.jobs = 1
+        self.split_by = None
+        self.max_notes = None
+        self.max_bytes = None
+        # Only the notes with any of `tags`, any of `notebooks`, created
+        # between `since` and `until` and in any of `volumes` are converted,
+        # for the criteria that are set. See `filters.NoteFilter`.
+        self.tags: List[str] = []
+        self.notebooks: List[str] = []
+        self.since = None
+        self.until = None
+        self.volumes: List[str] = []
+        self.incremental = False
+        # Whether the notes sharing a reference are written under one heading.
+        self.grouping = True
+        # One of `PIPELINES`. `None` chooses by the memory budget.
+        self.pipeline = None
+        # The most memory the process may use, in bytes. `None` allows a
+        # share of the available system memory.
+        self.max_memory = None
+        # The choice made for the last conversion without a pipeline.
+        self.plan: Union[MemoryPlan, None] = None
+        self.temp_dir = None
+        self.store_path = NOTE_STORE_PATH
+        # Whether the sorted notes are read from, and written to, a note
+        # cache in `cache_dir`, so that unchanged inputs are not parsed again.
+        self.from_cache = False
+        self.cache_dir = NOTE_CACHE_PATH
+        self.saved_paths: List[Path] = []
+        self.hooks: List[ConversionHook] = []
+        self._cancelled = threading.Event()
+
+    def add_hook(self, hook: ConversionHook) -> None:
+        """Register a hook notified when each stage of a conversion starts,
+        as it processes rows and when it finishes.
+
+        The stages are `load` and `sort`, followed by `write`, after a `plan`
+        stage when the pipeline is chosen by the memory budget. When the notes
+        are not held in memory, they are loaded, sorted and written together
+        in a single `stream` stage. With `from_cache`, the sorted notes are
+        written to the note cache in a `cache` stage.
+        """
+        self.hooks.append(hook)
+
+    def cancel(self) -> None:
+        """Stop the running conversion before its next stage starts, or as
+        its current stage processes its next row, by raising
+        `ConversionCancelled` from `self.convert`. The files written so far
+        are removed. May be called from another thread.
+
+        The converter stays cancelled, even before its next conversion
+        starts, until `self.clear_cancel` is called."""
+        self._cancelled.set()
+
+    def clear_cancel(self) -> None:
+        """Let the next conversion run after a cancelled one. Called before
+        the conversion is started, by the thread that may cancel it, so that
+        a cancel made as the conversion starts is never lost."""
+        self._cancelled.clear()
+
+    @contextlib.contextmanager
+    def stage(
+        self, name: str, total: Union[int, None] = None
+    ) -> Iterator[StageProgress]:
+        """Measure a stage of the conversion and notify the hooks.
+
+        The context manager returns a `StageProgress` counting the rows the
+        stage processed, out of `total` if known. The stage does not start
+        if the conversion was cancelled, and stops at its next row if it is
+        cancelled while it runs.
+        """
+        if self._cancelled.is_set():
+            raise ConversionCancelled
+        for hook in self.hooks:
+            hook.stage_started(name)
+        progress = StageProgress(name, self.hooks, total, self._cancelled)
+        progress.report()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            start_peak()
+        wall_start, cpu_start = time.perf_counter(), _cpu_time()
+
+        try:
+            yield progress
+            progress.report()
+        finally:
+            # Also reported when the stage fails, so that hooks can clean up.
+            stats = StageStats(
+                stage=name,
+                wall_time=time.perf_counter() - wall_start,
+                cpu_time=_cpu_time() - cpu_start,
+                rows=progress.rows,
+                peak_memory=traced_peak() if tracing else None,
+            )
+            for hook in self.hooks:
+                hook.stage_finished(stats)
 
     def convert(self):
         """Convert the specified files using either
-        `self.convert_with_full_memory` or `self.convert_with_limited_memory`.
+        `self.convert_with_full_memory`, `self.convert_with_external_sort`
+        or `self.convert_with_limited_memory`, as chosen by `self.pipeline`,
+        or `self.convert_incrementally` if `self.incremental` is set. With
+        `self.from_cache`, the notes are read by `self.convert_from_cache`
+        while the files match their note cache.
+
+        Without a pipeline, `plan_conversion` chooses one within
+        `self.max_memory` and keeps its choice in `self.plan`.
+
+        The notes are written by the writer of `self.output_format`, or of
+        the extension of `self.output_path`, whose extension is added to an
+        output path without one.
+
+        The notes left out by `self.note_filter` are dropped as their rows
+        are loaded, or by their tags and notebooks once the duplicates are
+        removed. A note cache holds every note, and is filtered as it is
+        read.
         """
         self.output_path = Path(self.output_path)
+        # Checked before the notes are loaded, like the filter's dates and
+        # volumes.
+        writer = get_writer(self.output_format, self.output_path)
+        note_filter = self.note_filter()
+        if note_filter and note_filter.volumes:
+            note_filter.volume_indexes()
+        if self.output_path.name and not self.output_path.suffix:
+            self.output_path = self.output_path.with_suffix(writer.suffixes[0])
+
+        pipeline = self.pipeline
+        self.plan = None
+        if pipeline is None:
+            with self.stage("plan") as progress:
+                self.plan = plan_conversion(
+                    self.input_path,
+                    FIELD_NAMES,
+                    get_reference_resolver().sort_key,
+                    max_memory=self.max_memory,
+                    streaming=self.streaming,
+                )
+                progress.advance(self.plan.rows)
+            pipeline = self.plan.pipeline
+        elif pipeline not in PIPELINES:
+            raise ValueError(f"unknown pipeline: '{pipeline}'")
+
+        with contextlib.ExitStack() as stack:
+            store = None
+            cache = cache_digest = None
+            if self.from_cache:
+                cache_digest = note_cache_digest(
+                    self.input_path, get_reference_resolver().fingerprint
+                )
+                cache = open_note_cache(self.note_cache_path(), cache_digest)
+
+            if cache is not None:
+                stack.enter_context(cache)
+                sorted_notes = self.convert_from_cache(cache, pipeline == "memory")
+            elif pipeline == "memory" and self.incremental:
+                store = stack.enter_context(self.open_note_store())
+                sorted_notes = self.convert_incrementally(self.input_path, store)
+            elif pipeline == "memory":
+                sorted_notes = self.convert_with_full_memory(
+                    self.input_path, cache_digest
+                )
+            elif pipeline == "spill":
+                sorted_notes = self.convert_with_external_sort(self.input_path)
+            else:
+                sorted_notes = self.convert_with_limited_memory(self.input_path)
+            self.write(sorted_notes, pipeline == "memory", store)
+
+        return "".join(self.show_saved_status())
+
+    def note_filter(self) -> Union[NoteFilter, None]:
+        """Return the `NoteFilter` of the filtering attributes, or `None` if
+        none is set."""
+        note_filter = NoteFilter(
+            tags=self.tags,
+            notebooks=self.notebooks,
+            since=self.since,
+            until=self.until,
+            volumes=self.volumes,
+            time_zone=self.time_zone,
+        )
+        return note_filter if note_filter else None
 
-        # Estimated memory needed to run the program
-        overhead_memory = 10  # in megabytes
+    def write(self, sorted_notes, in_memory: bool, store=None):
+        """Write the sorted notes to one or more files, in the format of
+        `self.output_format`.
 
-        # Estimated memory needed to convert the input file(s)
-        conversion_memory = check_file_size(self.input_path)  # in megabytes
-        total_memory_needed = overhead_memory + conversion_memory
+        Parameters
+        ----------
+        sorted_notes : The notes, sorted by reference.
+        in_memory : Whether the notes are held in memory. Otherwise, the
+            document is streamed to disk.
+        store : A `NoteStore` caching each note's rendered paragraphs,
+            if the notes are converted incrementally.
+        """
+        if isinstance(sorted_notes, list):
+            total = len(sorted_notes)
+        else:
+            total = self._planned_rows()
+        self.saved_paths = []
+        with self.stage("write" if in_memory else "stream", total) as progress:
+            before = self._output_states()
+            try:
+                self._write(_count(sorted_notes, progress), in_memory, store)
+            except ConversionCancelled:
+                # Partly written files would look like finished ones. The
+                # files of earlier conversions that were not written to yet
+                # are kept.
+                states = self._output_states()
+                for path in self.saved_paths:
+                    if path in states and states[path] != before.get(path):
+                        path.unlink()
+                self.saved_paths = []
+                raise
 
-        enough_memory = self._smu.check_memory(megabytes=total_memory_needed)
-        if enough_memory:
-            sorted_notes = self.convert_with_full_memory(self.input_path)
+    def _write(self, sorted_notes, in_memory: bool, store):
+        output = get_writer(self.output_format, self.output_path)
+        writer = output.write
+        options = {"time_zone": self.time_zone, "grouping": self.grouping}
+        if output.templated:
+            options["template_path"] = self.template_path
+        if store is not None and output.fragments:
+            # Only the streaming writer splices cached paragraphs.
+            writer = output.stream
+            options["fragment_store"] = store
+        elif self.streaming or not in_memory or (self.plan and self.plan.streaming):
+            # Documents too large for memory are streamed to disk.
+            writer = output.stream
+
+        if self.split_by or self.max_notes or self.max_bytes:
+            parts = split_notes(
+                sorted_notes,
+                by=self.split_by,
+                max_notes=self.max_notes,
+                max_bytes=self.max_bytes,
+                volume_name=get_reference_resolver().volume_name,
+            )
+            # With limited memory, only one part is held at a time, and the
+            # note store cannot be shared with other processes.
+            jobs = self.jobs if in_memory and store is None else 1
+            write_parts(
+                parts,
+                writer,
+                self.output_path,
+                jobs=jobs,
+                paths=self.saved_paths,
+                **options,
+            )
         else:
-            sorted_notes = self.convert_with_limited_memory(self.input_path)
-            # TODO: Pass the data from one generator to another. The second
-            # generator must convert each note into a namedtuple object in
-            # order to be used by write_to_docx()
-            return  # Remove for production
-
-        write_to_docx(
-            notes=sorted_notes,
-            output_path=self.output_path,
-            template_path=self.template_path,
+            self.saved_paths.append(self.output_path)
+            writer(notes=sorted_notes, output_path=self.output_path, **options)
+
+    def _output_states(self) -> Dict[Path, Tuple[int, int]]:
+        """Return the modification time and size of the output file and of
+        the files of its parts, by path."""
+        output = self.output_path
+        pattern = f"{glob.escape(output.stem)}*{glob.escape(output.suffix)}"
+        states = {}
+        for path in output.parent.glob(pattern):
+            stat = path.stat()
+            states[path] = (stat.st_mtime_ns, stat.st_size)
+        return states
+
+    def open_note_store(self) -> NoteStore:
+        """Open the persistent note store at `self.store_path`."""
+        return NoteStore(
+            self.store_path, FIELD_NAMES, get_reference_resolver().fingerprint
         )
 
-        return "".join(self.show_saved_status())
+    def convert_incrementally(self, notes_paths, store: NoteStore):
+        """Convert the notes like `self.convert_with_full_memory`, but only
+        build the notes that are not in `store` yet.
 
-    def convert_with_full_memory(self, notes_paths):
+        Parameters
+        ----------
+        notes_paths : The paths to the files to load.
+        store : The `NoteStore` holding the notes of earlier conversions.
+
+        Returns
+        -------
+        A list of `Note` objects.
+        """
+        with self.stage("load", self._planned_rows()) as progress:
+            notes = store.load_notes(
+                notes_paths, get_reference_resolver().sort_key, self.note_filter()
+            )
+            progress.advance(len(notes))
+        with self.stage("sort", len(notes)) as progress:
+            sorted_notes = sort_notes_by_reference(notes)
+            progress.advance(len(sorted_notes))
+        return sorted_notes
+
+    def convert_with_full_memory(
+        self, notes_paths, cache_digest: Union[bytes, None] = None
+    ):
         """Convert the notes by loading them all into memory
-        before writing them to a `.docx` file.
+        before writing them to a `.docx` file. With `self.jobs` above 1,
+        the files are loaded in parallel.
 
         Parameters
         ----------
         notes_paths : The paths to the files to load.
+        cache_digest : The digest of the files, as returned by
+            `note_cache_digest`. If given, the sorted notes are written to
+            the note cache of the files, and all of them are loaded so that
+            the cache serves any filter.
 
         Returns
         -------
-        A list of notes built using a `namedtuple` object.
+        A list of `Note` objects.
         """
+        note_filter = self.note_filter()
+        with self.stage("load", self._planned_rows()) as progress:
+            notes = load_notes(
+                notes_paths,
+                FIELD_NAMES,
+                jobs=self.jobs,
+                note_filter=None if cache_digest is not None else note_filter,
+            )
+            progress.advance(len(notes))
 
-        merged_notes = load_csv_files(notes_paths, FIELD_NAMES)
-        notes = build_notes(merged_notes, FIELD_NAMES)
+        with self.stage("sort", len(notes)) as progress:
+            sorted_notes = sort_notes_by_reference(notes)
+            progress.advance(len(sorted_notes))
 
-        # TODO: Add support for splitting the notes on tag or notebook.
-
-        title_order = load_json(DATA_PATH / "standard_works_order.json")
-        sorted_notes = sort_notes_by_title_and_verse(notes, title_order)
+        if cache_digest is not None:
+            with self.stage("cache", len(sorted_notes)) as progress:
+                write_note_cache(
+                    self.note_cache_path(),
+                    _count(sorted_notes, progress),
+                    cache_digest,
+                )
+            if note_filter:
+                sorted_notes = list(filter(note_filter.matches, sorted_notes))
         return sorted_notes
 
+    def note_cache_path(self) -> Path:
+        """The path of the note cache of `self.input_path`."""
+        return note_cache_path(self.cache_dir, self.input_path)
+
+    def convert_from_cache(self, cache: NoteCache, in_memory: bool):
+        """Read the sorted notes of a note cache, skipping the parsing,
+        duplicate removal and sorting of the files.
+
+        Parameters
+        ----------
+        cache : The open `NoteCache` of the files.
+        in_memory : Whether the notes are read into memory. Otherwise, they
+            are read one at a time as they are written.
+
+        Returns
+        -------
+        A list of `Note` objects, or a generator if not `in_memory`.
+        """
+        notes: Iterable = cache
+        note_filter = self.note_filter()
+        if note_filter:
+            notes = filter(note_filter.matches, cache)
+        if not in_memory:
+            return iter(notes)
+        with self.stage("load", len(cache)) as progress:
+            notes = list(_count(notes, progress))
+        return notes
+
+    def convert_with_external_sort(self, notes_paths):
+        """Convert the notes one at a time, from the `csv` files to the
+        writer, sorting them in bounded memory with `external_sort`.
+
+        The source locations are read first, so that notes exported in
+        order are not spilled to disk.
+
+        Parameters
+        ----------
+        notes_paths : The paths to the notes to be loaded.
+
+        Returns
+        -------
+        A generator of unique `Note` objects, sorted by reference.
+        """
+        sort_key = get_reference_resolver().sort_key
+        rows = iter_csv_files(notes_paths, FIELD_NAMES)
+        note_filter = self.note_filter()
+        if note_filter:
+            rows = note_filter.filter_rows(rows)
+        notes = iter_notes(rows, FIELD_NAMES, sort_key)
+
+        locations = iter_csv_column(notes_paths, FIELD_NAMES, "source_location")
+        keys = (sort_key(location) for location in locations)
+        if not is_sorted(keys):
+            run_size = self.plan.run_size if self.plan else RUN_SIZE
+            notes = external_sort(notes, run_size=run_size, temp_dir=self.temp_dir)
+        notes = remove_sorted_duplicates(notes)
+        yield from note_filter.filter_notes(notes) if note_filter else notes
+
     def convert_with_limited_memory(self, notes_paths):
         """Convert and sort all notes using a `SQLite3` database.
 
@@ -85,11 +523,54 @@ class NotesConverter:
         -------
         A generator object connected directly to the database.
         """
-        print("Low system memory.")
+        sort_key = get_reference_resolver().sort_key
+        note_filter = self.note_filter()
+
+        with tempfile.TemporaryDirectory(dir=self.temp_dir) as temp_dir:
+            conn = open_database(Path(temp_dir) / "notes.sqlite3", FIELD_NAMES)
+            try:
+                commit_to_database(
+                    conn,
+                    notes_paths,
+                    FIELD_NAMES,
+                    sort_key=sort_key,
+                    note_filter=note_filter,
+                )
+                rows = select_sorted_notes(conn, FIELD_NAMES)
+                if note_filter:
+                    # The database kept the most recent copy of each note.
+                    rows = note_filter.filter_unique_rows(rows)
+                yield from iter_notes(rows, FIELD_NAMES, sort_key)
+            finally:
+                conn.close()
+
+    def _planned_rows(self) -> Union[int, None]:
+        """The number of rows estimated by the plan, if there is one."""
+        return self.plan.rows if self.plan else None
 
     def show_saved_status(self):
+        if len(self.saved_paths) > 1:
+            return (
+                f"{len(self.saved_paths)} parts of {self.output_path.stem} "
+                "saved successfully!\n",
+                "Files saved in the following location:\n",
+                f"{self.output_path.parent}",
+            )
         return (
             f"{self.output_path.stem} saved successfully!\n",
             "File saved in the following location:\n",
             f"{self.output_path.parent}",
         )
+
+
+def _count(notes: Iterable, progress: StageProgress) -> Iterator:
+    """Count the notes in `progress` as they are consumed."""
+    for note in notes:
+        progress.advance()
+        yield note
+
+
+def _cpu_time() -> float:
+    """Return the CPU time of this process and of its finished children."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
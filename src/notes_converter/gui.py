@@ -1,10 +1,39 @@
 """A module containing all the GUI elements for `notes_converter`."""
 
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox, ttk
 from tkinter.filedialog import askopenfilenames, asksaveasfilename
+from typing import Union
 
 from notes_converter.utils.constants import ROOT_PATH
+from notes_converter.utils.exceptions import ConversionCancelled
+from notes_converter.utils.profilers import ConversionHook
+
+# The number of milliseconds between two checks of the conversion's progress.
+POLL_INTERVAL = 100
+
+# The text shown while each stage of a conversion runs.
+STAGE_NAMES = {
+    "plan": "Reading",
+    "load": "Loading",
+    "sort": "Sorting",
+    "cache": "Caching",
+    "write": "Writing",
+    "stream": "Converting",
+}
+
+
+class ProgressQueue(ConversionHook):
+    """Pass the progress of a conversion running in a worker thread to the
+    Tk main thread, which polls `self.updates`."""
+
+    def __init__(self) -> None:
+        self.updates: queue.Queue = queue.Queue()
+
+    def stage_progress(self, stage: str, rows: int, total: Union[int, None]) -> None:
+        self.updates.put(("progress", stage, rows, total))
 
 
 class MainWindow(tk.Tk):
@@ -14,12 +43,16 @@ class MainWindow(tk.Tk):
         self.input_paths = []
         self.input_value = tk.StringVar(self, value="")
         self.output_path = tk.StringVar(self)
+        self.status_value = tk.StringVar(self, value="")
+        self.progress = ProgressQueue()
+        self.converter.add_hook(self.progress)
+        self.worker: Union[threading.Thread, None] = None
 
         # Screen orientation
         center_x = self.winfo_screenwidth() // 2
         center_y = self.winfo_screenheight() // 2
         window_width = 400
-        window_height = 90
+        window_height = 150
         x = center_x - window_width // 2
         y = center_y - window_height // 2
         self.geometry(f"{window_width}x{window_height}+{x}+{y}")
@@ -38,19 +71,19 @@ class MainWindow(tk.Tk):
         top_frame = tk.Frame(self, cnf=self.xy_padding)
         top_frame.pack(fill="both", expand=1)
 
-        input_button = ttk.Button(
+        self.input_button = ttk.Button(
             top_frame,
             text="Select file(s)",
             command=self.get_input_paths,
         )
-        input_button.grid(column=0, row=0)
+        self.input_button.grid(column=0, row=0)
 
-        output_button = ttk.Button(
+        self.output_button = ttk.Button(
             top_frame,
             text="Save file(s)",
             command=self.get_output_path,
         )
-        output_button.grid(column=0, row=1)
+        self.output_button.grid(column=0, row=1)
 
         input_label = tk.Label(
             top_frame,
@@ -72,31 +105,83 @@ class MainWindow(tk.Tk):
         self.progressbar = ttk.Progressbar(
             bottom_frame,
             orient="horizontal",
-            mode="indeterminate",
-            length=400,
+            mode="determinate",
+            length=300,
+        )
+        self.status_label = tk.Label(bottom_frame, textvariable=self.status_value)
+        self.cancel_button = ttk.Button(
+            bottom_frame,
+            text="Cancel",
+            command=self.cancel,
         )
 
     def convert(self):
         """Convert the given `.csv` files into one or more
-        `docx` files.
+        files, in the format of the output path's extension.
         """
         # Execution setup:
         self.converter.input_path = self.input_paths
         self.converter.output_path = self.output_path.get()
+        # Cleared here rather than in the worker, so that a cancel pressed
+        # before the worker starts is kept.
+        self.converter.clear_cancel()
 
         self.start_progressbar()
 
-        # Execution:
-        self.converter.convert()
-
-        self.stop_progressbar()
+        # Execution, in a worker thread so that the window keeps responding:
+        self.worker = threading.Thread(target=self.run_conversion, daemon=True)
+        self.worker.start()
+        self.after(POLL_INTERVAL, self.poll_progress)
+
+    def run_conversion(self):
+        """Run the conversion and queue its outcome. Called in the worker
+        thread, which must not touch the widgets."""
+        try:
+            status = self.converter.convert()
+        except ConversionCancelled:
+            self.progress.updates.put(("cancelled",))
+        except Exception as e:
+            self.progress.updates.put(("failed", e))
+        else:
+            self.progress.updates.put(("done", status))
+
+    def poll_progress(self):
+        """Show the updates queued by the worker thread, until the
+        conversion is over."""
+        while True:
+            try:
+                update = self.progress.updates.get_nowait()
+            except queue.Empty:
+                break
+            if update[0] == "progress":
+                self.show_progress(*update[1:])
+                continue
+
+            # Execution completion:
+            self.worker = None
+            self.stop_progressbar()
+            if update[0] == "done":
+                messagebox.showinfo("Info", update[1])
+            elif update[0] == "failed":
+                messagebox.showerror("Error", f"The conversion failed: {update[1]}")
+            self.reset_values()
+            return
+        self.after(POLL_INTERVAL, self.poll_progress)
+
+    def show_progress(self, stage: str, rows: int, total: Union[int, None]):
+        name = STAGE_NAMES.get(stage, stage.capitalize())
+        if total:
+            self.progressbar["value"] = min(rows / total, 1) * 100
+            self.status_value.set(f"{name} notes: {rows:,} of {total:,}")
+        else:
+            self.progressbar["value"] = 0
+            self.status_value.set(f"{name} notes: {rows:,}")
 
-        # Execution completion:
-        messagebox.showinfo(
-            "Info",
-            self.converter.show_saved_status(),
-        )
-        self.reset_values()
+    def cancel(self):
+        """Stop the conversion at the next note it processes."""
+        self.converter.cancel()
+        self.cancel_button.state(["disabled"])
+        self.status_value.set("Cancelling...")
 
     def get_input_paths(self):
         input_path = askopenfilenames(
@@ -114,7 +199,13 @@ class MainWindow(tk.Tk):
                 title="Save File",
                 initialdir=ROOT_PATH,
                 defaultextension=".docx",
-                filetypes=[("Word Document", "*.docx")],
+                filetypes=[
+                    ("Word Document", "*.docx"),
+                    ("Markdown", "*.md"),
+                    ("Web Page", "*.html"),
+                    ("JSON Lines", "*.jsonl"),
+                    ("Text File", "*.txt"),
+                ],
                 confirmoverwrite=True,
             )
             if docx_output_path:
@@ -124,12 +215,21 @@ class MainWindow(tk.Tk):
             self.get_input_paths()
 
     def start_progressbar(self):
-        self.progressbar.pack()
-        self.progressbar.start()
+        self.input_button.state(["disabled"])
+        self.output_button.state(["disabled"])
+        self.cancel_button.state(["!disabled"])
+        self.progressbar["value"] = 0
+        self.status_value.set("Starting...")
+        self.status_label.pack(side="top", fill="x")
+        self.progressbar.pack(side="left", **self.xy_padding)
+        self.cancel_button.pack(side="left", **self.xy_padding)
 
     def stop_progressbar(self):
-        self.progressbar.stop()
+        self.status_label.pack_forget()
         self.progressbar.pack_forget()
+        self.cancel_button.pack_forget()
+        self.input_button.state(["!disabled"])
+        self.output_button.state(["!disabled"])
 
     def reset_values(self):
         """Reset program to start state."""
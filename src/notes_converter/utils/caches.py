@@ -0,0 +1,333 @@
+"""A module containing the note cache, a binary file holding the sorted notes
+of an export, so that the export can be written again without being parsed
+and sorted."""
+
+import functools
+import hashlib
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Union
+
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.converters import Note
+
+# Change whenever the format of the cache, or the notes built from a row,
+# change, so that the caches written by earlier versions are not read.
+NOTE_CACHE_VERSION = 1
+MAGIC = b"NCNOTES\x00"
+
+# The magic bytes, the version, the digest of the inputs, the number of
+# notes and of strings, and the offsets of the string table and the index.
+_HEADER = struct.Struct("<8sI20sQQQQ")
+# The length of the rest of the record. Then the string ids of the type,
+# title, source location, study set and highlight, the last updated and
+# created timestamps, and the number of sort key values, tags, notebooks
+# and paragraphs.
+_RECORD = struct.Struct("<IIIIIIqqBHHH")
+# Stands in for a missing timestamp.
+_NO_TIMESTAMP = -(2**63)
+# The number of bytes read at once to hash the inputs.
+_BLOCK_SIZE = 1024 * 1024
+
+
+def note_cache_digest(
+    files: Sequence[Union[Path, str]], fingerprint: str = ""
+) -> bytes:
+    """Hash the content of the input files, in order.
+
+    Parameters
+    ----------
+    files : A list containing the paths to the files.
+    fingerprint : A digest of the other data the notes are built from, such
+        as `ReferenceResolver.fingerprint`.
+
+    Returns
+    -------
+    A 20-byte digest, which changes whenever the cached notes would.
+    """
+    digest = hashlib.sha1(f"{NOTE_CACHE_VERSION}:{fingerprint}".encode("utf-8"))
+    for file in files:
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+                digest.update(block)
+        # Keeps `a` + `bc` apart from `ab` + `c`.
+        digest.update(b"\x00")
+    return digest.digest()
+
+
+def note_cache_path(
+    cache_dir: Union[Path, str], files: Sequence[Union[Path, str]]
+) -> Path:
+    """Return the path of the note cache of the given input files, named
+    after their paths, so that each export has a single cache."""
+    paths = "\n".join(str(Path(file).resolve()) for file in files)
+    name = hashlib.sha1(paths.encode("utf-8")).hexdigest()
+    return Path(cache_dir) / f"{name}.notes"
+
+
+def write_note_cache(
+    path: Union[Path, str], notes: Iterable[Note], digest: bytes
+) -> int:
+    """Write notes to a note cache.
+
+    The file starts with a header, followed by a length-prefixed record per
+    note. The values repeated across notes, such as the names of tags and
+    notebooks, are kept once in a string table after the records, and the
+    offset of each record is kept in an index at the end of the file. The
+    file is written under a temporary name and then renamed, so that a
+    conversion that fails never leaves a broken cache.
+
+    Parameters
+    ----------
+    path : The path to the cache.
+    notes : The notes, sorted by reference.
+    digest : The digest of the inputs, as returned by `note_cache_digest`.
+
+    Returns
+    -------
+    The number of notes written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    strings = _StringTable()
+    offsets: List[int] = []
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(bytes(_HEADER.size))
+            position = _HEADER.size
+            for note in notes:
+                record = _record(note, strings)
+                offsets.append(position)
+                f.write(record)
+                position += len(record)
+
+            strings_offset = position
+            encoded = [string.encode("utf-8") for string in strings.ids]
+            f.write(struct.pack(f"<{len(encoded)}I", *map(len, encoded)))
+            f.write(b"".join(encoded))
+            index_offset = f.tell()
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+
+            f.seek(0)
+            f.write(
+                _HEADER.pack(
+                    MAGIC,
+                    NOTE_CACHE_VERSION,
+                    digest,
+                    len(offsets),
+                    len(strings.ids),
+                    strings_offset,
+                    index_offset,
+                )
+            )
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+    return len(offsets)
+
+
+class _StringTable:
+    """The strings of a cache being written, each with its id in the order
+    it was first seen."""
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        # The string ids of the tag and notebook ids of `_catalog`.
+        self._names: Dict[tuple, tuple] = {}
+        self._catalog: Union[Catalog, None] = None
+
+    def id(self, string: str) -> int:
+        return self.ids.setdefault(string, len(self.ids))
+
+    def name_ids(self, catalog: Catalog, ids: tuple) -> tuple:
+        """Return the string ids of the names of catalog ids, which only
+        change with the catalog."""
+        if catalog is not self._catalog:
+            self._catalog = catalog
+            self._names = {}
+        names = self._names.get(ids)
+        if names is None:
+            names = self._names[ids] = tuple(map(self.id, catalog.names(ids)))
+        return names
+
+
+def _record(note: Note, strings: _StringTable) -> bytes:
+    string_id = strings.id
+    paragraphs = [paragraph.encode("utf-8") for paragraph in note.note_text]
+    tags = strings.name_ids(note.catalog, note.tag_ids)
+    notebooks = strings.name_ids(note.catalog, note.notebook_ids)
+    counts = (len(note.sort_key), len(tags), len(notebooks), len(paragraphs))
+    body = _values_struct(*counts).pack(
+        *note.sort_key, *tags, *notebooks, *map(len, paragraphs)
+    )
+    text = b"".join(paragraphs)
+    head = _RECORD.pack(
+        _RECORD.size - 4 + len(body) + len(text),
+        string_id(note.type),
+        string_id(note.title),
+        string_id(note.source_location),
+        string_id(note.study_set),
+        string_id(note.highlight),
+        _NO_TIMESTAMP if note.last_updated is None else note.last_updated,
+        _NO_TIMESTAMP if note.created is None else note.created,
+        *counts,
+    )
+    return head + body + text
+
+
+@functools.lru_cache(maxsize=1024)
+def _values_struct(keys: int, tags: int, notebooks: int, paragraphs: int):
+    """The sort key values, the ids of the tags and notebooks, and the
+    length of each paragraph, in bytes, that follow a record's head."""
+    return struct.Struct(f"<{keys}q{tags + notebooks + paragraphs}I")
+
+
+class NoteCache:
+    """A note cache opened through `mmap`, so that its notes are only read
+    from the file when they are needed.
+
+    Use `open_note_cache` to open a cache only if it matches the inputs.
+
+    Parameters
+    ----------
+    path : The path to the cache.
+    """
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The notes read from a cache share the catalog of the cache, which
+        # holds the strings of its string table.
+        self.catalog = Catalog()
+        # The catalog ids of the string ids of tags and notebooks.
+        self._name_ids: Dict[tuple, tuple] = {}
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self) -> None:
+        mm = self._mm
+        if len(mm) < _HEADER.size:
+            raise ValueError(f"'{self.path}' is not a note cache")
+        magic, version, digest, count, string_count, strings_offset, index_offset = (
+            _HEADER.unpack_from(mm, 0)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"'{self.path}' is not a note cache")
+        self.version = version
+        self.digest = digest
+        self._count = count
+        if version != NOTE_CACHE_VERSION:
+            return
+        if index_offset + 8 * count != len(mm):
+            # Caches are renamed into place once written, so this is a
+            # cache cut short by something else.
+            raise ValueError(f"'{self.path}' is truncated")
+
+        lengths = struct.unpack_from(f"<{string_count}I", mm, strings_offset)
+        position = strings_offset + 4 * string_count
+        intern_value = self.catalog.intern_value
+        self._strings: List[str] = []
+        for length in lengths:
+            string = mm[position : position + length].decode("utf-8")
+            self._strings.append(intern_value(string))
+            position += length
+        self._offsets = struct.unpack_from(f"<{count}Q", mm, index_offset)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Note:
+        return self._read(self._offsets[index])
+
+    def __iter__(self) -> Iterator[Note]:
+        read = self._read
+        for offset in self._offsets:
+            yield read(offset)
+
+    def _read(self, offset: int) -> Note:
+        mm = self._mm
+        strings = self._strings
+        (
+            _,
+            note_type,
+            title,
+            source_location,
+            study_set,
+            highlight,
+            last_updated,
+            created,
+            *counts,
+        ) = _RECORD.unpack_from(mm, offset)
+        keys, tags, notebooks, _ = counts
+        values_struct = _values_struct(*counts)
+        position = offset + _RECORD.size
+        values = values_struct.unpack_from(mm, position)
+        position += values_struct.size
+
+        paragraphs = []
+        for length in values[keys + tags + notebooks :]:
+            paragraphs.append(mm[position : position + length].decode("utf-8"))
+            position += length
+
+        return Note.from_interned(
+            strings[note_type],
+            strings[title],
+            tuple(paragraphs),
+            strings[source_location],
+            self._catalog_ids(values[keys : keys + tags]),
+            self._catalog_ids(values[keys + tags : keys + tags + notebooks]),
+            strings[study_set],
+            None if last_updated == _NO_TIMESTAMP else last_updated,
+            None if created == _NO_TIMESTAMP else created,
+            strings[highlight],
+            values[:keys],
+            self.catalog,
+        )
+
+    def _catalog_ids(self, string_ids: tuple) -> tuple:
+        ids = self._name_ids.get(string_ids)
+        if ids is None:
+            names = [self._strings[i] for i in string_ids]
+            ids = self._name_ids[string_ids] = self.catalog.intern(names)
+        return ids
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def open_note_cache(path: Union[Path, str], digest: bytes) -> Union[NoteCache, None]:
+    """Open the note cache at `path` if it was written from the same inputs.
+
+    Parameters
+    ----------
+    path : The path to the cache.
+    digest : The digest of the inputs, as returned by `note_cache_digest`.
+
+    Returns
+    -------
+    An open `NoteCache`, or `None` if there is no cache, or if it is out of
+    date or broken.
+    """
+    try:
+        cache = NoteCache(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if cache.version != NOTE_CACHE_VERSION or cache.digest != digest:
+        cache.close()
+        return None
+    return cache
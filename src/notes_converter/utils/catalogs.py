@@ -0,0 +1,111 @@
+"""A module containing the catalog of names shared by the notes of a run."""
+
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+
+class Catalog:
+    """Intern the names of tags and notebooks as integer ids, and the values
+    repeated across notes, such as their type, as shared strings.
+
+    A catalog lives as long as the notes of one conversion, so that it does
+    not grow without bound in a long-lived process.
+    """
+
+    def __init__(self) -> None:
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._id_tuples: Dict[Tuple[str, ...], Tuple[int, ...]] = {}
+        self._values: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, names: Iterable[str]) -> Tuple[int, ...]:
+        """Return the ids of `names`, adding the new names to the catalog.
+
+        Notes sharing the same names share the same `tuple` of ids.
+        """
+        names = tuple(names)
+        ids = self._id_tuples.get(names)
+        if ids is None:
+            ids = tuple(self._id(name) for name in names)
+            self._id_tuples[names] = ids
+        return ids
+
+    def _id(self, name: str) -> int:
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def id(self, name: str) -> int:
+        """Return the id of `name`, or `-1` if it is not in the catalog."""
+        return self._ids.get(name, -1)
+
+    def name(self, name_id: int) -> str:
+        return self._names[name_id]
+
+    def names(self, ids: Iterable[int]) -> List[str]:
+        """Return the names of the given ids."""
+        return [self._names[name_id] for name_id in ids]
+
+    def intern_value(self, value: str) -> str:
+        """Return a shared copy of `value`."""
+        return self._values.setdefault(value, value)
+
+
+class NameIndex:
+    """An inverted index from the tags or notebooks of notes to the
+    positions of the notes that have them, built once per run so that the
+    notes of a name are found without scanning every note.
+
+    The notes are moved to a single catalog, so that their names are
+    indexed by id.
+
+    Parameters
+    ----------
+    notes : A sequence of `Note`s.
+    field : `"tags"` or `"notebooks"`.
+    catalog : The catalog of the ids. `None` means that the catalog of the
+        first note is used.
+    """
+
+    def __init__(
+        self, notes: Sequence, field: str, catalog: Union[Catalog, None] = None
+    ) -> None:
+        if field not in ("tags", "notebooks"):
+            raise ValueError(f"cannot index notes by '{field}'")
+        self.notes = notes
+        if catalog is None:
+            catalog = notes[0].catalog if notes else Catalog()
+        self.catalog = catalog
+        # The positions of the notes without a name.
+        self.unnamed: List[int] = []
+        self._positions: Dict[int, List[int]] = {}
+
+        ids_name = field[:-1] + "_ids"
+        # Notes sharing the same names share the same tuple of ids.
+        named: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+        for position, note in enumerate(notes):
+            note.rebind(catalog)
+            ids = getattr(note, ids_name)
+            name_ids = named.get(ids)
+            if name_ids is None:
+                name_ids = named[ids] = tuple(i for i in ids if catalog.name(i))
+            if not name_ids:
+                self.unnamed.append(position)
+            for name_id in name_ids:
+                self._positions.setdefault(name_id, []).append(position)
+
+    def names(self) -> List[str]:
+        """Return the names held by at least one note."""
+        return self.catalog.names(self._positions)
+
+    def positions(self, name: str) -> List[int]:
+        """Return the positions of the notes that have `name`, in order."""
+        return list(self._positions.get(self.catalog.id(name), ()))
+
+    def select(self, name: str) -> List:
+        """Return the notes that have `name`, in their order."""
+        return [self.notes[position] for position in self.positions(name)]
@@ -11,9 +11,24 @@ TEST_DATA_PATH = CWD / "tests"
 
 DATA_PATH = CWD / "data"
 TEMPLATE_PATH = CWD / "templates"
+NOTE_STORE_PATH = DATA_PATH / "sqlite3" / "note_store.sqlite3"
+NOTE_CACHE_PATH = DATA_PATH / "cache"
 
 # ######## OTHER CONSTANTS #########
 
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+DATETIME_FORMAT = "%B %d, %Y, %I:%M %p %Z"
+
+# Sort the notes in memory, on disk in sorted runs, or in a database.
+PIPELINES = ("memory", "spill", "sqlite")
+
+# The formats of the writers in `writers.WRITERS`: Word documents, Markdown,
+# HTML, JSON Lines and plain text.
+OUTPUT_FORMATS = ("docx", "md", "html", "jsonl", "txt")
+
+# Split the notes into parts by volume, tag or notebook.
+SPLIT_OPTIONS = ("volume", "tag", "notebook")
+
 FIELD_NAMES = [
     "type",
     "title",
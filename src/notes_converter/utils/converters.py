@@ -1,91 +1,255 @@
 """A module containing conversion functions and their helper functions."""
 
 import re
-from collections import namedtuple
-from typing import Dict, List, Union
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from urllib.parse import parse_qs
 
-TAGS: set[str] = set()
-NOTEBOOKS: set[str] = set()
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.normalizers import NORMALIZE_BATCH_SIZE, normalize_texts
+from notes_converter.utils.timestamps import parse_timestamp
+
+
+class Note:
+    """A note built from a row of a Gospel Library export.
+
+    Notes are built in large numbers, so they only hold their own text: the
+    names of their tags and notebooks are kept as ids in a `Catalog` shared
+    by the notes of a run, the values repeated across notes are shared,
+    and timestamps are stored as seconds since the epoch.
+
+    Defined at module level so that notes can be sent between processes.
+    """
+
+    __slots__ = (
+        "type",
+        "title",
+        "note_text",
+        "source_location",
+        "tag_ids",
+        "notebook_ids",
+        "study_set",
+        "last_updated",
+        "created",
+        "highlight",
+        "sort_key",
+        "catalog",
+    )
+
+    def __init__(
+        self,
+        type: str,
+        title: str,
+        note_text: Iterable[str],
+        source_location: str,
+        tags: Iterable[str],
+        notebooks: Iterable[str],
+        study_set: str,
+        last_updated: Union[int, None],
+        created: Union[int, None],
+        highlight: str,
+        sort_key: Tuple[int, ...],
+        catalog: Catalog,
+    ) -> None:
+        self.type = catalog.intern_value(type)
+        self.title = title
+        self.note_text = tuple(note_text)
+        self.source_location = catalog.intern_value(source_location)
+        self.tag_ids = catalog.intern(tags)
+        self.notebook_ids = catalog.intern(notebooks)
+        self.study_set = catalog.intern_value(study_set)
+        self.last_updated = last_updated
+        self.created = created
+        self.highlight = catalog.intern_value(highlight)
+        self.sort_key = sort_key
+        self.catalog = catalog
+
+    @property
+    def tags(self) -> List[str]:
+        return self.catalog.names(self.tag_ids)
+
+    @property
+    def notebooks(self) -> List[str]:
+        return self.catalog.names(self.notebook_ids)
+
+    def as_record(self) -> tuple:
+        """Return the note's fields, in the order of `FIELD_NAMES`, followed
+        by its sort key. Tags and notebooks are given by name."""
+        return (
+            self.type,
+            self.title,
+            self.note_text,
+            self.source_location,
+            tuple(self.tags),
+            tuple(self.notebooks),
+            self.study_set,
+            self.last_updated,
+            self.created,
+            self.highlight,
+            self.sort_key,
+        )
+
+    @classmethod
+    def from_interned(
+        cls,
+        type: str,
+        title: str,
+        note_text: Tuple[str, ...],
+        source_location: str,
+        tag_ids: Tuple[int, ...],
+        notebook_ids: Tuple[int, ...],
+        study_set: str,
+        last_updated: Union[int, None],
+        created: Union[int, None],
+        highlight: str,
+        sort_key: Tuple[int, ...],
+        catalog: Catalog,
+    ) -> "Note":
+        """Build a note from values already interned in `catalog`, with its
+        tags and notebooks given by id, such as when it is read from a note
+        cache. Nothing is interned again."""
+        note = cls.__new__(cls)
+        note.type = type
+        note.title = title
+        note.note_text = note_text
+        note.source_location = source_location
+        note.tag_ids = tag_ids
+        note.notebook_ids = notebook_ids
+        note.study_set = study_set
+        note.last_updated = last_updated
+        note.created = created
+        note.highlight = highlight
+        note.sort_key = sort_key
+        note.catalog = catalog
+        return note
+
+    def rebind(self, catalog: Catalog) -> None:
+        """Move the note's tags and notebooks to `catalog`, such as when
+        notes built by other processes are merged."""
+        if catalog is not self.catalog:
+            self.tag_ids = catalog.intern(self.tags)
+            self.notebook_ids = catalog.intern(self.notebooks)
+            self.catalog = catalog
+
+    def __reduce__(self):
+        # The catalog and the names it holds are pickled once for all the
+        # notes sent together.
+        return (Note, (*self.as_record(), self.catalog))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Note):
+            return NotImplemented
+        return self.as_record() == other.as_record()
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={value!r}"
+            for name, value in zip([*FIELD_NAMES, "sort_key"], self.as_record())
+        )
+        return f"Note({fields})"
+
+
+paragraph_pattern = re.compile(r"\bp(\d+)")
 
 
 def build_notes(
-    notes_list: List[Dict[str, Union[str, List[str]]]], field_names: List[str]
-):
-    """Build a list of notes using a `namedtuple` object.
+    notes_list: List[Dict[str, Union[str, List[str]]]],
+    field_names: List[str],
+    sort_key: Callable[[str], Tuple[int, ...]],
+    catalog: Union[Catalog, None] = None,
+) -> List[Note]:
+    """Build a list of notes.
 
     Parameters
     ----------
     notes_list : A `list` of dictionaries.
+    field_names : A list of strings mapping to the csv fields.
+    sort_key : A function mapping a note's source location to its sort key.
+    catalog : The `Catalog` holding the notes' tags and notebooks.
+        `None` means that a new catalog is used.
 
     Returns
     -------
-    A list of `namedtuple` objects.
+    A list of `Note` objects.
     """
-
-    Note = namedtuple("Note", field_names=field_names)
-
-    notes = []
-    for n in notes_list:
-        n = _process_note(n)
-        values = [value if value else "" for value in n.values()]
-        note = Note(*values)
-        notes.append(note)
-    return notes
-
-
-def _process_note(note):
-    """Convert a note's `note_text`, `tags` and `notebooks` to lists,
-    and remove the date and ruler, and update the `TAGS` and `NOTEBOOKS`
-    constants.
-    """
-    n = _convert_note_text_to_list(note)
-    _n = _convert_note_identifiers_to_list(n)
-    cleaned_n = _remove_headers(_n)
-
-    add_tags(TAGS, cleaned_n["tags"])
-    add_tags(NOTEBOOKS, cleaned_n["notebooks"])
-
-    return cleaned_n
-
-
-# process_note() helper functions
-
-
-def add_tags(tags_set, new_tags) -> None:
-    tags_set.update(new_tags)
+    return list(iter_notes(notes_list, field_names, sort_key, catalog))
 
 
-def _strip_artifacts(line: str) -> Union[str, None]:
-    """Strip unwanted parts of a list."""
-    if line.startswith("[") or line.startswith("-----"):
-        return ""
-    return line
+def iter_notes(
+    notes: Iterable[Dict[str, Union[str, List[str]]]],
+    field_names: List[str],
+    sort_key: Callable[[str], Tuple[int, ...]],
+    catalog: Union[Catalog, None] = None,
+) -> Iterator[Note]:
+    """Build notes one at a time.
 
-
-def _remove_headers(note):
-    """Remove unwanted text at the head of a list."""
-    n = [_strip_artifacts(_) for _ in note["note_text"]]
-    cleaned_n = [_ for _ in n if _.strip()]  # Remove empty values
-    note["note_text"] = cleaned_n
-    return note
-
-
-def _convert_note_text_to_list(note):
-    """Convert `note`'s `note_text` value to a list using `re.findall()`.
+    Each note's source location is parsed once into a `sort_key` field, and
+    the text of the notes is normalized in batches of
+    `NORMALIZE_BATCH_SIZE` by `normalize_texts`.
 
     Parameters
     ----------
-    note : A `dict` object.
+    notes : An iterable of dictionaries, such as a database cursor.
+    field_names : A list of strings mapping to the csv fields.
+    sort_key : A function mapping a note's source location to its sort key.
+    catalog : The `Catalog` holding the notes' tags and notebooks.
+        `None` means that a new catalog is used.
 
     Returns
     -------
-    A `dict` object with only its `["note_text"]` value changed.
+    A generator of `Note` objects.
     """
-    paragraphs = re.compile(r"([^\n]+(?:\n(?!\n)[^\n]+)*)")
-    p = paragraphs.findall(note["note_text"])
-    text = [i.replace("\n", " ") for i in p]
-    note["note_text"] = text
-    return note
+    if list(field_names) != FIELD_NAMES:
+        raise ValueError(f"notes must have the fields {FIELD_NAMES}")
+    if catalog is None:
+        catalog = Catalog()
+
+    notes = iter(notes)
+    while True:
+        batch = list(islice(notes, NORMALIZE_BATCH_SIZE))
+        if not batch:
+            return
+        texts = normalize_texts([n["note_text"] for n in batch])
+        for n, note_text in zip(batch, texts):
+            # Like the other fields, the text is converted in place, so that
+            # the raw text is freed as the notes are built.
+            n["note_text"] = note_text
+            yield _build_note(n, note_text, sort_key, catalog)
+
+
+def _build_note(n, note_text, sort_key, catalog) -> Note:
+    n = _process_note(n)
+    return Note(
+        n["type"] or "",
+        n["title"] or "",
+        note_text,
+        n["source_location"] or "",
+        n["tags"],
+        n["notebooks"],
+        n["study_set"] or "",
+        n["last_updated"],
+        n["created"],
+        n["highlight"] or "",
+        sort_key(n["source_location"] or ""),
+        catalog,
+    )
+
+
+def _process_note(note):
+    """Convert a note's `tags` and `notebooks` to lists and its `created`
+    and `last_updated` timestamps to seconds since the epoch. Its
+    `note_text` is normalized separately, in batches.
+    """
+    n = _convert_note_identifiers_to_list(note)
+    _convert_timestamps(n)
+
+    return n
+
+
+# process_note() helper functions
 
 
 def _convert_note_identifiers_to_list(note: Dict) -> Dict:
@@ -108,6 +272,14 @@ def _convert_note_identifiers_to_list(note: Dict) -> Dict:
     return note
 
 
+def _convert_timestamps(note: Dict) -> Dict:
+    """Convert a note's `["created"]` and `["last_updated"]` values to
+    seconds since the epoch."""
+    note["created"] = parse_timestamp(note["created"])
+    note["last_updated"] = parse_timestamp(note["last_updated"])
+    return note
+
+
 # Functions to build references using the URL under note.source_location.
 
 
@@ -115,7 +287,6 @@ def extract_study_data(raw_data, name_maps):
     """Extract scriptures' record, book, chapter and verse names and numbers
     and return a dict."""
 
-    # TODO: Add allowance for paragraph ranges (i.e. =p4-p6).
     # TODO: Need full support for General Conference references.
 
     def process_scriptures(raw_data):
@@ -129,7 +300,7 @@ def extract_study_data(raw_data, name_maps):
         -------
         A list of keys and the book name, chapter and verse.
         """
-        p_num = raw_data[-1:][0].split("=p")[-1:]  # Get paragraph number
+        p_num = _paragraph_numbers(raw_data[-1])  # Get paragraph number(s)
         c_num = raw_data[-1:][0].split("?")[0:1]  # Get chapter number
         b_name = raw_data[-2:-1]  # Get book name
 
@@ -147,7 +318,7 @@ def extract_study_data(raw_data, name_maps):
         return keys, data
 
     def process_manuals(raw_data):
-        p_num = raw_data[-1:][0].split("=p")[-1:]  # Get paragraph number
+        p_num = _paragraph_numbers(raw_data[-1])  # Get paragraph number(s)
         c_num = raw_data[-1:][0].split("?")[0:1]  # Get chapter number
         b_name = raw_data[1:2]  # Get book name
 
@@ -156,7 +327,7 @@ def extract_study_data(raw_data, name_maps):
         return keys, data
 
     def process_ensigns(raw_data):
-        p_num = raw_data[-1:][0].split("=p")[-1:]  # Get paragraph number
+        p_num = _paragraph_numbers(raw_data[-1])  # Get paragraph number(s)
         a_name = raw_data[-1:][0].split("?")[0:1]  # Get article name
         e_month = raw_data[2:3]  # Get month
         e_year = raw_data[1:2]  # Get Ensign year
@@ -181,17 +352,28 @@ def extract_study_data(raw_data, name_maps):
     return dict(zip(key_maps, values))
 
 
+def _paragraph_numbers(url_end: str) -> List[str]:
+    """Return the paragraph number of a url's last element, such as
+    `3?lang=eng&id=p7`, or the range of paragraphs, such as `4-6` for
+    `id=p4-p6`, in a list."""
+    query = url_end.partition("?")[2].partition("#")[0]
+    paragraphs = parse_qs(query).get("id")
+    if paragraphs:
+        return [paragraph_pattern.sub(r"\1", paragraphs[0])]
+    return url_end.split("=p")[-1:]
+
+
 def build_study_references(data):
-    reference_numbers = f"{data["verse"]}"
+    reference_numbers = f"{data['verse']}"
     books = ""
     if "chapter" in data.keys():
-        reference_numbers = f"{data["chapter"]}:{data["verse"]}"
+        reference_numbers = f"{data['chapter']}:{data['verse']}"
     if "ensign" in data.keys():
-        books = f"Ensign, {data["month"]} {data["ensign"]}, {data["article"]}, "
+        books = f"Ensign, {data['month']} {data['ensign']}, {data['article']}, "
     if "manual" in data.keys():
-        books = f"{data["manual"]}, "
+        books = f"{data['manual']}, "
     if "book" and "sub_book" in data.keys():
-        books = f"{data["book"]}, {data["sub_book"]} "
+        books = f"{data['book']}, {data['sub_book']} "
     reference = books + reference_numbers
 
     return reference
@@ -1,22 +1,498 @@
 """A module containing all functions and classes pertaining to the database."""
 
+import hashlib
+import pickle
 import sqlite3
+from itertools import islice
 from pathlib import Path
-from typing import List, Sequence, Union
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
 
+from notes_converter.utils.caches import note_cache_digest
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.converters import Note, iter_notes
+from notes_converter.utils.filters import (
+    NoteFilter,
+    note_identity,
+    remove_duplicate_notes,
+)
 from notes_converter.utils.loaders import load_csv_as_dict
 
+# The number of rows inserted per transaction.
+CHUNK_SIZE = 5000
+# The number of notes looked up in the note store per query.
+LOOKUP_SIZE = 500
+# Change whenever the notes built from a row, or the tables they are stored
+# in, change, so that the notes stored by earlier versions are not reused.
+NOTE_STORE_VERSION = 5
+# The size of the digest of a row, in bytes.
+DIGEST_SIZE = 20
 
-def open_database(database):
-    pass
+
+def open_database(database: Union[Path, str], field_names: List[str]):
+    """Open `database` and create the `Notes` table if it does not exist.
+
+    Each note's volume, book, chapter, verse and last verse are kept in
+    their own integer columns so that the notes can be sorted by the
+    database.
+
+    Parameters
+    ----------
+    database : The path to the `SQLite3` database.
+    field_names : A list of strings mapping to the csv fields.
+
+    Returns
+    -------
+    An open `sqlite3.Connection`.
+    """
+    conn = sqlite3.connect(database)
+    # The database only lives for the duration of a conversion.
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    columns = ",\n".join(f"    {name} TEXT" for name in field_names)
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS Notes(
+    id INTEGER PRIMARY KEY,
+    identity BLOB NOT NULL UNIQUE,
+    volume INTEGER,
+    book INTEGER,
+    chapter INTEGER,
+    verse INTEGER,
+    last_verse INTEGER,
+{columns}
+)""")
+    return conn
 
 
 def commit_to_database(
-    database, files: Sequence[Union[Path, str]], field_names: List[str]
+    conn: sqlite3.Connection,
+    files: Sequence[Union[Path, str]],
+    field_names: List[str],
+    sort_key: Callable[[str], Tuple[int, int, int, int, int]],
+    chunk_size: int = CHUNK_SIZE,
+    note_filter: Union[NoteFilter, None] = None,
 ):
+    """Load the given `csv` files into the `Notes` table in chunks.
+
+    Duplicate notes are merged on insert: the most recently updated copy
+    of a note is kept in the position where the note was first seen.
+
+    Parameters
+    ----------
+    conn : A connection returned by `open_database`.
+    files : A list containing the paths to the files.
+    field_names : A list of strings mapping to the csv fields.
+    sort_key : A function mapping a note's source location to its volume,
+        book, chapter, verse and last verse numbers.
+    chunk_size : The number of rows inserted per transaction.
+    note_filter : A `NoteFilter` selecting the rows to insert, if any, by
+        `NoteFilter.filter_rows`. The tags and notebooks of the notes are
+        left to be matched once they are selected.
+    """
+    placeholders = ", ".join("?" for _ in range(len(field_names) + 6))
+    updates = ", ".join(
+        f"{name} = excluded.{name}" for name in ("tags", "notebooks", "last_updated")
+    )
+    statement = (
+        "INSERT INTO Notes(identity, volume, book, chapter, verse, last_verse, "
+        f"{', '.join(field_names)}) "
+        f"VALUES({placeholders}) "
+        f"ON CONFLICT(identity) DO UPDATE SET {updates} "
+        "WHERE excluded.last_updated > Notes.last_updated"
+    )
+
     for file in files:
         reader = load_csv_as_dict(file, field_names=field_names)
-        next(reader)  # Skip titles (first line)
-        with sqlite3.connect(database) as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT into VALUES(?, ?, ?)")
+        if note_filter:
+            reader = note_filter.filter_rows(reader)
+        rows = (_to_row(note, field_names, sort_key) for note in reader)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            with conn:
+                conn.executemany(statement, chunk)
+
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notes_order "
+        "ON Notes(volume, book, chapter, verse, last_verse, id)"
+    )
+    conn.commit()
+
+
+def select_sorted_notes(
+    conn: sqlite3.Connection, field_names: List[str]
+) -> Iterator[Dict[str, str]]:
+    """Return the notes one row at a time, sorted by volume, book, chapter
+    and verse.
+
+    Parameters
+    ----------
+    conn : A connection returned by `open_database`.
+    field_names : A list of strings mapping to the csv fields.
+
+    Returns
+    -------
+    A generator of `dict`s connected directly to the database.
+    """
+    cursor = conn.execute(
+        f"SELECT {', '.join(field_names)} FROM Notes "
+        "ORDER BY volume, book, chapter, verse, last_verse, id"
+    )
+    for row in cursor:
+        yield dict(zip(field_names, row))
+
+
+def _to_row(note, field_names, sort_key):
+    identity = "\x1f".join(value or "" for value in note_identity(note))
+    digest = hashlib.sha1(identity.encode("utf-8")).digest()
+    key = sort_key(note["source_location"] or "")
+    return (digest, *key, *(note[name] for name in field_names))
+
+
+class NoteStore:
+    """A persistent store of parsed notes and of their rendered paragraphs,
+    keyed by a hash of their content.
+
+    Re-converting an export only parses the rows that were not seen before
+    and only renders the notes whose paragraphs are not cached yet. An
+    export that did not change at all is not parsed again. Each run removes
+    the notes and paragraphs of the rows its input no longer contains, and
+    the store is emptied when `fingerprint` changes.
+
+    Parameters
+    ----------
+    path : The path to the `SQLite3` database holding the store.
+    field_names : A list of strings mapping to the csv fields.
+    fingerprint : A digest of the data the notes are built from, such as
+        `ReferenceResolver.fingerprint`.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        field_names: Sequence[str],
+        fingerprint: str = "",
+    ) -> None:
+        self.path = Path(path)
+        self.field_names = list(field_names)
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        # The hash of each note loaded, by the note's id, so that its
+        # paragraphs are looked up without hashing it again. The note is
+        # kept with its hash, so that its id is not reused.
+        self._note_hashes: Dict[int, Tuple[Note, bytes]] = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS Settings(
+    name TEXT PRIMARY KEY,
+    value TEXT
+)""")
+        self._check_fingerprint(
+            f"{NOTE_STORE_VERSION}:{','.join(self.field_names)}:{fingerprint}"
+        )
+        # `note_hash` is the hash under which the note's paragraphs are
+        # rendered, and `Input` holds the digest of the last input and the
+        # hashes of its notes, once their duplicates are removed.
+        self.conn.executescript("""CREATE TABLE IF NOT EXISTS Notes(
+    hash BLOB PRIMARY KEY,
+    note BLOB NOT NULL,
+    note_hash BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS Fragments(
+    render_key TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    head TEXT NOT NULL,
+    tail TEXT NOT NULL,
+    link TEXT NOT NULL,
+    PRIMARY KEY(render_key, hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS Input(
+    digest BLOB NOT NULL,
+    hashes BLOB NOT NULL
+);""")
+
+    def _check_fingerprint(self, fingerprint: str) -> None:
+        row = self.conn.execute(
+            "SELECT value FROM Settings WHERE name = 'fingerprint'"
+        ).fetchone()
+        if row is not None and row[0] == fingerprint:
+            return
+        with self.conn:
+            # Dropped rather than emptied, as their columns may have changed.
+            self.conn.execute("DROP TABLE IF EXISTS Notes")
+            self.conn.execute("DROP TABLE IF EXISTS Fragments")
+            self.conn.execute("DROP TABLE IF EXISTS Input")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO Settings(name, value) "
+                "VALUES('fingerprint', ?)",
+                (fingerprint,),
+            )
+
+    def load_notes(
+        self,
+        files: Sequence[Union[Path, str]],
+        sort_key: Callable[[str], Tuple[int, ...]],
+        note_filter: Union[NoteFilter, None] = None,
+    ) -> list:
+        """Load the notes from the given `csv` files, only building those
+        whose rows are not in the store yet.
+
+        If the files are the same as in the last run without a filter, their
+        notes are read from the store without parsing them. Otherwise, the
+        notes of the rows the files no longer contain are removed, with
+        their paragraphs.
+
+        Parameters
+        ----------
+        files : A list containing the paths to the files.
+        sort_key : A function mapping a note's source location to its sort key.
+        note_filter : A `NoteFilter` selecting the notes, if any. The rows
+            left out by `NoteFilter.filter_rows` are neither built nor
+            stored, and the tags and notebooks are matched once the
+            duplicates are removed.
+
+        Returns
+        -------
+        A list of notes without duplicates, in the order of the files.
+        """
+        catalog = Catalog()
+        self._note_hashes.clear()
+        input_digest = note_cache_digest(files)
+        notes = self._load_input(input_digest, catalog)
+        if notes is not None:
+            self.hits += len(notes)
+            if note_filter:
+                notes = [note for note in notes if note_filter.matches(note)]
+            return notes
+
+        notes = []
+        digests: List[bytes] = []
+        seen = set()
+        for file in files:
+            reader = load_csv_as_dict(file, field_names=self.field_names)
+            if note_filter:
+                # The rows left out are still part of the input, so their
+                # notes are kept in the store.
+                reader = note_filter.filter_rows(self._seen_rows(reader, seen))
+            while True:
+                rows = list(islice(reader, LOOKUP_SIZE))
+                if not rows:
+                    break
+                digests.extend(self._row_digest(row) for row in rows)
+                notes.extend(
+                    self._load_rows(rows, digests[-len(rows) :], sort_key, catalog)
+                )
+            self.conn.commit()
+        seen.update(digests)
+        self._prune(seen)
+
+        digest_of = {id(note): digest for note, digest in zip(notes, digests)}
+        notes = remove_duplicate_notes(notes)
+        if note_filter:
+            # Only the notes of every row can be read again as a whole.
+            self._save_input(None)
+            return list(note_filter.filter_notes(notes))
+        self._save_input(input_digest, [digest_of[id(note)] for note in notes])
+        return notes
+
+    def _load_input(self, input_digest: bytes, catalog) -> Union[list, None]:
+        """Return the notes of the last input if its digest is
+        `input_digest`, or `None`."""
+        row = self.conn.execute(
+            "SELECT hashes FROM Input WHERE digest = ?", (input_digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        hashes = row[0]
+        digests = [
+            hashes[start : start + DIGEST_SIZE]
+            for start in range(0, len(hashes), DIGEST_SIZE)
+        ]
+        found: Dict[bytes, Note] = {}
+        for start in range(0, len(digests), LOOKUP_SIZE):
+            found.update(
+                self._select_notes(digests[start : start + LOOKUP_SIZE], catalog)
+            )
+        if len(found) < len(set(digests)):
+            return None
+        return [found[digest] for digest in digests]
+
+    def _save_input(
+        self, input_digest: Union[bytes, None], digests: Sequence[bytes] = ()
+    ) -> None:
+        """Keep the digest of the input and the hashes of its notes, or
+        forget the last input if `input_digest` is `None`."""
+        with self.conn:
+            self.conn.execute("DELETE FROM Input")
+            if input_digest is not None:
+                self.conn.execute(
+                    "INSERT INTO Input(digest, hashes) VALUES(?, ?)",
+                    (input_digest, b"".join(digests)),
+                )
+
+    def _seen_rows(self, rows, seen: set):
+        for row in rows:
+            seen.add(self._row_digest(row))
+            yield row
+
+    def _prune(self, seen: set) -> None:
+        """Remove the notes whose rows are not in `seen`, and the paragraphs
+        of the notes that are no longer stored."""
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS Seen(hash BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO Seen(hash) VALUES(?)",
+                ((digest,) for digest in seen),
+            )
+            self.pruned += self.conn.execute(
+                "DELETE FROM Notes WHERE hash NOT IN (SELECT hash FROM Seen)"
+            ).rowcount
+            self.conn.execute(
+                "DELETE FROM Fragments "
+                "WHERE hash NOT IN (SELECT note_hash FROM Notes)"
+            )
+            self.conn.execute("DELETE FROM Seen")
+
+    def _load_rows(self, rows, digests, sort_key, catalog) -> list:
+        found = self._select_notes(set(digests), catalog)
+
+        # The rows not in the store are built together, so that their text
+        # is normalized in a single batch.
+        missing = {}
+        for digest, row in zip(digests, rows):
+            if digest not in found:
+                missing.setdefault(digest, row)
+        built = iter_notes(missing.values(), self.field_names, sort_key, catalog)
+
+        new_notes = []
+        for digest, note in zip(missing, built):
+            found[digest] = note
+            # Stored without the catalog, which only lasts for a run.
+            record = pickle.dumps(note.as_record(), pickle.HIGHEST_PROTOCOL)
+            note_hash = _note_digest(note)
+            self._note_hashes[id(note)] = (note, note_hash)
+            new_notes.append((digest, record, note_hash))
+        self.misses += len(missing)
+        self.hits += len(rows) - len(missing)
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO Notes(hash, note, note_hash) VALUES(?, ?, ?)",
+            new_notes,
+        )
+        return [found[digest] for digest in digests]
+
+    def _row_digest(self, row) -> bytes:
+        content = "\x1f".join(row.get(name) or "" for name in self.field_names)
+        return hashlib.sha1(content.encode("utf-8")).digest()
+
+    def _select_notes(self, digests, catalog) -> Dict[bytes, Note]:
+        digests = list(digests)
+        placeholders = ", ".join("?" for _ in digests)
+        cursor = self.conn.execute(
+            f"SELECT hash, note, note_hash FROM Notes WHERE hash IN ({placeholders})",
+            digests,
+        )
+        found = {}
+        for digest, record, note_hash in cursor:
+            note = found[digest] = Note(*pickle.loads(record), catalog)
+            self._note_hashes[id(note)] = (note, note_hash)
+        return found
+
+    def fragments(self, render_key: str) -> "FragmentCache":
+        """Return the paragraphs rendered with the settings in `render_key`."""
+        return FragmentCache(self.conn, render_key, self._note_hashes)
+
+    def close(self) -> None:
+        self._note_hashes.clear()
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class FragmentCache:
+    """The rendered paragraphs of the notes in a `NoteStore`, for one
+    template, time zone and set of name maps.
+
+    A note's paragraphs are stored as its heading, as its date and body,
+    and as the link to its reference, as the notes sharing a reference are
+    written under one heading and above one link. The link's relationship
+    id differs from one document to the next, so it is stored as a
+    placeholder.
+
+    Parameters
+    ----------
+    conn : The connection to the store's database.
+    render_key : A digest of the settings the paragraphs are rendered with.
+    note_hashes : The hashes of the notes loaded from the store, by the
+        notes' ids. Other notes are hashed when they are looked up.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        render_key: str,
+        note_hashes: Union[Dict[int, Tuple[Note, bytes]], None] = None,
+    ) -> None:
+        self.conn = conn
+        self.render_key = render_key
+        self.hits = 0
+        self.misses = 0
+        self._note_hashes = {} if note_hashes is None else note_hashes
+        self._pending: List[Tuple[str, bytes, str, str, str]] = []
+
+    def get_many(self, notes: Sequence) -> List[Union[Tuple[str, str, str], None]]:
+        """Return the paragraphs of each note in `notes`, or `None` for the
+        notes whose paragraphs are not cached."""
+        digests = [self._note_hash(note) for note in notes]
+        found = {}
+        for start in range(0, len(digests), LOOKUP_SIZE):
+            chunk = digests[start : start + LOOKUP_SIZE]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor = self.conn.execute(
+                "SELECT hash, head, tail, link FROM Fragments "
+                f"WHERE render_key = ? AND hash IN ({placeholders})",
+                (self.render_key, *chunk),
+            )
+            found.update(
+                (digest, (head, tail, link)) for digest, head, tail, link in cursor
+            )
+        fragments = [found.get(digest) for digest in digests]
+        hits = len(fragments) - fragments.count(None)
+        self.hits += hits
+        self.misses += len(fragments) - hits
+        return fragments
+
+    def put(self, note, fragment: Tuple[str, str, str]) -> None:
+        self._pending.append((self.render_key, self._note_hash(note), *fragment))
+        if len(self._pending) >= CHUNK_SIZE:
+            self.commit()
+
+    def commit(self) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO Fragments(render_key, hash, head, tail, link) "
+                "VALUES(?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._pending.clear()
+
+    def _note_hash(self, note) -> bytes:
+        known = self._note_hashes.get(id(note))
+        if known is not None and known[0] is note:
+            return known[1]
+        return _note_digest(note)
+
+
+def _note_digest(note) -> bytes:
+    return hashlib.sha1(repr(note.as_record()).encode("utf-8")).digest()
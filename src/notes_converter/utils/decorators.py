@@ -22,22 +22,3 @@ def report_error(func):
             raise
 
     return wrapper_report_error
-
-
-def remove_duplicates(func):
-    """Remove duplicate notes."""
-
-    # TODO: Add more tailored duplicate removal.
-    # For example, if a note is the same but the tags or notebooks are
-    # different. In these cases, the note most recently updated should
-    # be kept and the other discarded.
-
-    @functools.wraps(func)
-    def wrapper_remove_duplicates(*args, **kwargs):
-        removed_exact_duplicates = []
-        for note in func(*args, **kwargs):
-            if note not in removed_exact_duplicates:
-                removed_exact_duplicates.append(note)
-        return removed_exact_duplicates
-
-    return wrapper_remove_duplicates
@@ -3,3 +3,11 @@
 
 class NoAvailableTemplate(Exception):
     pass
+
+
+class InvalidTemplate(NoAvailableTemplate):
+    pass
+
+
+class ConversionCancelled(Exception):
+    pass
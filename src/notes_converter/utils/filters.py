@@ -0,0 +1,309 @@
+"""A module containing functions that filter notes."""
+
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import attrgetter
+from typing import Dict, FrozenSet, Hashable, Iterable, Iterator, List, TypeVar, Union
+
+import pytz
+
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.constants import DEFAULT_TIMEZONE, FIELD_NAMES
+from notes_converter.utils.timestamps import parse_timestamp
+
+# Fields that may differ between two copies of the same note. When they do,
+# only the most recently updated copy is kept.
+VERSION_FIELDS = ("tags", "notebooks", "last_updated")
+IDENTITY_FIELDS = tuple(f for f in FIELD_NAMES if f not in VERSION_FIELDS)
+
+NoteT = TypeVar("NoteT")
+
+# The format of the exported timestamps, such as `2024-12-04T16:01:00.000Z`,
+# up to the seconds.
+_ROW_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def note_identity(note) -> tuple:
+    """Return a hashable key identifying `note`, ignoring its tags,
+    notebooks and last update.
+
+    `note` is either a `dict` loaded from a `csv` file or a built `Note`.
+    """
+    if isinstance(note, dict):
+        return tuple(note.get(field) for field in IDENTITY_FIELDS)
+    return tuple(_hashable(getattr(note, field)) for field in IDENTITY_FIELDS)
+
+
+def remove_duplicate_notes(notes: Iterable[NoteT]) -> List[NoteT]:
+    """Remove duplicate notes in linear time.
+
+    Exact duplicates are dropped. Notes that only differ by their tags,
+    notebooks or last update are reduced to the most recently updated one.
+
+    Parameters
+    ----------
+    notes : An iterable of `dict`s or of built `Note`s.
+
+    Returns
+    -------
+    A list of unique notes in the order they were first seen.
+    """
+    index: dict = {}
+    unique_notes: List[NoteT] = []
+    for note in notes:
+        key = note_identity(note)
+        position = index.get(key)
+        if position is None:
+            index[key] = len(unique_notes)
+            unique_notes.append(note)
+        elif _last_updated(note) > _last_updated(unique_notes[position]):
+            unique_notes[position] = note
+    return unique_notes
+
+
+def remove_sorted_duplicates(notes: Iterable[NoteT]) -> Iterator[NoteT]:
+    """Remove duplicate notes from notes sorted by their sort key, one group
+    of notes at a time.
+
+    Copies of the same note share a source location, and thus a sort key,
+    so they are found among the notes with the same sort key. The result is
+    the same as `remove_duplicate_notes`.
+
+    Parameters
+    ----------
+    notes : An iterable of built `Note`s, sorted by a stable sort.
+
+    Returns
+    -------
+    A generator of unique notes.
+    """
+    for _, group in groupby(notes, key=attrgetter("sort_key")):
+        yield from remove_duplicate_notes(group)
+
+
+def _hashable(value) -> Hashable:
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _last_updated(note):
+    # Built notes store the time in seconds since the epoch, while `csv`
+    # rows keep the ISO 8601 string.
+    if isinstance(note, dict):
+        return note.get("last_updated") or ""
+    return note.last_updated or 0
+
+
+class NoteFilter:
+    """Select notes by tag, notebook, creation date and volume.
+
+    A note matches if it has any of the given tags, any of the given
+    notebooks, was created within the date range and lies in any of the
+    given volumes, for the criteria that are set.
+
+    The creation time and the volume are the same in every copy of a note,
+    so they are matched on the raw strings of the `csv` rows by
+    `filter_rows`, before the rows are built, and the rows left out are
+    never normalized, sorted or written. Tags and notebooks may differ
+    between copies, so they are matched by `filter_notes` once the
+    duplicates are removed, on the most recent copy of each note.
+
+    Parameters
+    ----------
+    tags : The names of the tags, as shown in Gospel Library.
+    notebooks : The names of the notebooks.
+    since : The first day, or time, of the range, as an ISO 8601 string
+        such as `2024-01-31`.
+    until : The last day, included, or time of the range.
+    volumes : The names of the volumes, as given by
+        `ReferenceResolver.volume_name`, such as `Book of Mormon`, in any
+        case.
+    time_zone : The time zone of the days and times of the range.
+    """
+
+    def __init__(
+        self,
+        tags: Iterable[str] = (),
+        notebooks: Iterable[str] = (),
+        since: Union[str, None] = None,
+        until: Union[str, None] = None,
+        volumes: Iterable[str] = (),
+        time_zone: str = DEFAULT_TIMEZONE,
+    ) -> None:
+        self.tags = frozenset(tags)
+        self.notebooks = frozenset(notebooks)
+        self.volumes = frozenset(volume.casefold() for volume in volumes)
+        zone = pytz.timezone(time_zone)
+        # Seconds since the epoch, and the same time in the format of the
+        # exported timestamps, which compare in the same order.
+        self._since = _bound(since, zone, end=False)
+        self._until = _bound(until, zone, end=True)
+        self._since_row = _row_time(self._since)
+        self._until_row = _row_time(self._until)
+        # The indexes of `volumes` in a sort key, found on first use.
+        self._volume_indexes: Union[FrozenSet[int], None] = None
+        # The ids of the tags and notebooks in the catalog of built notes,
+        # while the catalog holds `_catalog_size` names.
+        self._catalog: Union[Catalog, None] = None
+        self._catalog_size = 0
+        self._catalog_ids: Dict[str, FrozenSet[int]] = {}
+
+    def __bool__(self) -> bool:
+        """Whether any criterion is set."""
+        return bool(
+            self.tags
+            or self.notebooks
+            or self.volumes
+            or self._since is not None
+            or self._until is not None
+        )
+
+    def matches_row(self, row: Dict[str, str]) -> bool:
+        """Whether the note of a `csv` row may match, judged by the row's
+        `created` string and by the volume of its source location, which
+        every copy of the note shares. Its tags and notebooks are left to
+        `matches_names`."""
+        if self._since_row is not None or self._until_row is not None:
+            created = _row_created(row["created"])
+            if created is None:
+                return False
+            if self._since_row is not None and created < self._since_row:
+                return False
+            if self._until_row is not None and created >= self._until_row:
+                return False
+        if self.volumes:
+            return self._in_volumes(row["source_location"] or "")
+        return True
+
+    def matches_names(self, note) -> bool:
+        """Whether a built `Note` has any of the tags and any of the
+        notebooks."""
+        if self.tags and self._ids(note.catalog, "tags").isdisjoint(note.tag_ids):
+            return False
+        if self.notebooks and self._ids(note.catalog, "notebooks").isdisjoint(
+            note.notebook_ids
+        ):
+            return False
+        return True
+
+    def matches(self, note) -> bool:
+        """Whether a built `Note` matches, such as a note read from a note
+        cache."""
+        if not self.matches_names(note):
+            return False
+        if self._since is not None or self._until is not None:
+            if note.created is None:
+                return False
+            if self._since is not None and note.created < self._since:
+                return False
+            if self._until is not None and note.created >= self._until:
+                return False
+        if self.volumes:
+            return note.sort_key[0] in self.volume_indexes()
+        return True
+
+    def volume_indexes(self) -> FrozenSet[int]:
+        """Return the indexes of `self.volumes` in a sort key.
+
+        Raises a `ValueError` if a volume is unknown.
+        """
+        if self._volume_indexes is None:
+            # Imported here, as the resolver's modules depend on this one.
+            from notes_converter.utils.resolvers import get_reference_resolver
+
+            resolver = get_reference_resolver()
+            # Other study material and annotations follow the standard works.
+            names = [
+                resolver.volume_name(index)
+                for index in range(len(resolver.volumes) + 2)
+            ]
+            indexes = {name.casefold(): index for index, name in enumerate(names)}
+            unknown = sorted(self.volumes - indexes.keys())
+            if unknown:
+                raise ValueError(
+                    f"unknown volume: '{unknown[0]}' "
+                    f"(choose from {', '.join(map(repr, names))})"
+                )
+            self._volume_indexes = frozenset(indexes[name] for name in self.volumes)
+        return self._volume_indexes
+
+    def _in_volumes(self, source_location: str) -> bool:
+        from notes_converter.utils.resolvers import get_reference_resolver
+
+        volume = get_reference_resolver().volume(source_location)
+        return volume in self.volume_indexes()
+
+    def _ids(self, catalog: Catalog, field: str) -> FrozenSet[int]:
+        """The ids of the tags or notebooks of the filter in `catalog`."""
+        # Names are added to the catalog of a note cache as they are read.
+        if catalog is not self._catalog or len(catalog) != self._catalog_size:
+            self._catalog = catalog
+            self._catalog_size = len(catalog)
+            self._catalog_ids = {}
+        ids = self._catalog_ids.get(field)
+        if ids is None:
+            ids = self._catalog_ids[field] = frozenset(
+                map(catalog.id, getattr(self, field))
+            )
+        return ids
+
+    def filter_rows(self, rows: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+        """Return the rows whose notes may match, lazily. See `matches_row`."""
+        return filter(self.matches_row, rows)
+
+    def filter_unique_rows(
+        self, rows: Iterable[Dict[str, str]]
+    ) -> Iterator[Dict[str, str]]:
+        """Return the rows with any of the tags and notebooks, lazily,
+        judged by their raw `tags` and `notebooks` strings. Only for rows
+        without duplicates, such as the rows of a database that merged them.
+        """
+        if not (self.tags or self.notebooks):
+            return iter(rows)
+        return filter(self._row_has_names, rows)
+
+    def _row_has_names(self, row: Dict[str, str]) -> bool:
+        if self.tags and self.tags.isdisjoint((row["tags"] or "").split("; ")):
+            return False
+        return not self.notebooks or not self.notebooks.isdisjoint(
+            (row["notebooks"] or "").split("; ")
+        )
+
+    def filter_notes(self, notes: Iterable[NoteT]) -> Iterator[NoteT]:
+        """Return the built notes with any of the tags and notebooks,
+        lazily. Called once the duplicates are removed, on notes whose rows
+        went through `filter_rows`."""
+        if not (self.tags or self.notebooks):
+            return iter(notes)
+        return filter(self.matches_names, notes)
+
+
+def _bound(value: Union[str, None], zone, end: bool) -> Union[int, None]:
+    """Convert the bound of a date range to seconds since the epoch. The end
+    of a range is excluded: a day ends at the next midnight, and a time at
+    the next second, as timestamps are compared to the second."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if end:
+        is_day = len(value) == len("YYYY-MM-DD")
+        moment += timedelta(days=1) if is_day else timedelta(seconds=1)
+    if moment.tzinfo is None:
+        moment = zone.localize(moment)
+    return int(moment.timestamp())
+
+
+def _row_time(seconds: Union[int, None]) -> Union[str, None]:
+    if seconds is None:
+        return None
+    return time.strftime(_ROW_TIME_FORMAT, time.gmtime(seconds))
+
+
+def _row_created(created: Union[str, None]) -> Union[str, None]:
+    """Return a row's creation time in UTC, in `_ROW_TIME_FORMAT`, reading
+    exported timestamps as they are and parsing any other."""
+    if not created:
+        return None
+    if created.endswith("Z") and len(created) >= 20 and created[10] == "T":
+        return created[:19]
+    return _row_time(parse_timestamp(created))
@@ -0,0 +1,98 @@
+"""A module containing the functions that group sorted notes sharing a
+reference, so that they are written under a single heading."""
+
+import functools
+from itertools import groupby
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query parameters that do not change the reference of a url.
+IGNORED_PARAMETERS = frozenset(["lang"])
+
+
+class NoteGroup(NamedTuple):
+    """Notes sharing a reference and a title, written under the heading
+    `title` and followed by a single link to `source_location`."""
+
+    title: str
+    source_location: str
+    notes: List
+
+
+@functools.lru_cache(maxsize=8192)
+def reference_key(source_location: str) -> Union[str, None]:
+    """Normalize a source location url into a key shared by every url of
+    the same reference.
+
+    The host is lowercased, and the language, the order of the query's
+    parameters, trailing slashes and the fragment are ignored, so that
+    `...alma/5?lang=eng&id=p3#p3` and `...alma/5?id=p3` share a key.
+
+    Returns
+    -------
+    A string, or `None` for notes without a source location, which are
+    never grouped.
+    """
+    if not source_location or source_location == "undefined":
+        return None
+    url = urlsplit(source_location.strip())
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(url.query)
+        if name not in IGNORED_PARAMETERS
+    )
+    return f"{url.netloc.lower()}{url.path.rstrip('/')}?{urlencode(query)}"
+
+
+def group_notes(notes: Iterable, combine: bool = True) -> Iterator[NoteGroup]:
+    """Group the notes that share a reference and a title.
+
+    Notes on the same reference have the same sort key, so the sorted notes
+    are read as runs of equal sort keys and each run is grouped by
+    `reference_key` and title in a `dict`. Notes are never compared with
+    each other, and only one run is held in memory. Notes with different
+    titles keep their own headings, so that no title is lost.
+
+    Parameters
+    ----------
+    notes : An iterable of `Note`s, sorted by reference.
+    combine : Whether to group the notes. Otherwise, each note is a group of
+        its own.
+
+    Returns
+    -------
+    A generator of `NoteGroup`s, in the order of their first notes. The
+    notes of each group are in the order they were created.
+    """
+    if not combine:
+        for note in notes:
+            yield NoteGroup(note.title, note.source_location, [note])
+        return
+
+    for _, run in groupby(notes, key=_sort_key):
+        first = next(run)
+        rest = list(run)
+        if not rest:
+            # Most runs hold a single note, whose key is not needed.
+            yield NoteGroup(first.title, first.source_location, [first])
+            continue
+
+        groups: Dict[Tuple[str, str], List] = {}
+        for note in (first, *rest):
+            key = reference_key(note.source_location)
+            if key is None:
+                yield NoteGroup(note.title, note.source_location, [note])
+                continue
+            groups.setdefault((key, note.title), []).append(note)
+
+        for group in groups.values():
+            group.sort(key=_created)
+            yield NoteGroup(group[0].title, group[0].source_location, group)
+
+
+_sort_key = attrgetter("sort_key")
+
+
+def _created(note) -> int:
+    return note.created or 0
@@ -5,9 +5,7 @@ functions.
 import csv
 import json
 from pathlib import Path
-from typing import List, Sequence, Union
-
-from notes_converter.utils.decorators import remove_duplicates
+from typing import Dict, Iterator, List, Sequence, Union
 
 
 def load_json(path):
@@ -28,8 +26,11 @@ def load_json(path):
 def load_csv_as_dict(
     path: Union[Path, str],
     field_names: List[str],
-) -> csv.DictReader:
-    """Load a CSV into a `csv.DictReader` iterable.
+) -> Iterator[Dict[str, str]]:
+    """Load the rows of a CSV, after its titles, as `dict`s.
+
+    The file is closed once its last row is read, or once the generator is
+    closed.
 
     Parameters
     ----------
@@ -38,29 +39,53 @@ def load_csv_as_dict(
 
     Returns
     -------
-    A `csv.DictReader` iterable.
+    A generator of `dict`s, as read by a `csv.DictReader`.
     """
-    return csv.DictReader(open(path, encoding="utf-8"), fieldnames=field_names)
+    with open(path, encoding="utf-8") as f:
+        reader = csv.DictReader(f, fieldnames=field_names)
+        next(reader, None)  # Skip titles (first line)
+        yield from reader
 
 
-@remove_duplicates
-def load_csv_files(files: Sequence[Union[Path, str]], field_names: List[str]):
-    """Load multiple `csv` files and return a merged list.
+def iter_csv_files(
+    files: Sequence[Union[Path, str]], field_names: List[str]
+) -> Iterator[Dict[str, str]]:
+    """Load multiple `csv` files one row at a time.
 
     Parameters
     ----------
     files : A list containing the paths to the files.
-        These can be either `str` or `Path` objects.
-    field_names : A list of strings
-        Containing the fields to which to map the csv columns.
+    field_names : A list of strings mapping to the csv fields.
+
+    Returns
+    -------
+    A generator of `dict`s, in the order of `files`.
+    """
+    for file in files:
+        yield from load_csv_as_dict(file, field_names=field_names)
+
+
+def iter_csv_column(
+    files: Sequence[Union[Path, str]], field_names: List[str], name: str
+) -> Iterator[str]:
+    """Load a single column of multiple `csv` files, skipping the work of
+    building a `dict` for each row.
+
+    Parameters
+    ----------
+    files : A list containing the paths to the files.
+    field_names : A list of strings mapping to the csv fields.
+    name : The field to load.
 
     Returns
     -------
-    A merged list of `dict`s.
+    A generator of strings, in the order of `files`. Missing values are
+    empty strings.
     """
-    notes = []
+    index = field_names.index(name)
     for file in files:
-        reader = load_csv_as_dict(file, field_names=field_names)
-        next(reader)  # Skip titles (first line)
-        notes += [note for note in reader]
-    return notes
+        with open(file, encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip titles (first line)
+            for row in reader:
+                yield row[index] if index < len(row) else ""
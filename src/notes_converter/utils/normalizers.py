@@ -0,0 +1,85 @@
+"""A module containing the functions that split the text of the notes into
+paragraphs and clean them."""
+
+import re
+from typing import List, Sequence
+
+# The number of notes normalized at once.
+NORMALIZE_BATCH_SIZE = 1000
+
+# A block of lines separated from the others by blank lines.
+_paragraph = re.compile(r"[^\n]+(?:\n(?!\n)[^\n]+)*")
+# A straight quote opens a quotation at the start of the text or after a
+# space, an opening bracket or quote, or a dash. The lookbehind follows the
+# quote so that `re` can skip straight to each quote.
+_opening_double = re.compile(r"\"(?<![^\s(\[{<“‘—–]\")")
+_opening_single = re.compile(r"'(?<![^\s(\[{<“‘—–]')")
+# Paragraphs starting with these are date headers, such as `[Dec 4, 2024]`,
+# or rulers.
+_HEADERS = ("[", "-----")
+# A paragraph of its own between the notes of a batch.
+_SEPARATOR = "\x1e"
+
+
+def smarten_quotes(text: str) -> str:
+    """Convert the straight quotes and apostrophes of `text` to curly ones.
+
+    Quotes that open a quotation become `“` and `‘`, and all others,
+    including apostrophes, become `”` and `’`.
+    """
+    text = _opening_single.sub("‘", _opening_double.sub("“", text))
+    return text.replace('"', "”").replace("'", "’")
+
+
+def normalize_text(text: str) -> List[str]:
+    """Split a note's text into paragraphs and clean them.
+
+    Paragraphs are separated by blank lines, and the line breaks within a
+    paragraph become spaces. Date headers, rulers and blank paragraphs are
+    removed, and quotes are made curly.
+
+    Parameters
+    ----------
+    text : The `note_text` of a note.
+
+    Returns
+    -------
+    A list of paragraphs.
+    """
+    return [
+        paragraph.replace("\n", " ")
+        for paragraph in _paragraph.findall(smarten_quotes(text))
+        if not paragraph.startswith(_HEADERS) and not paragraph.isspace()
+    ]
+
+
+def normalize_texts(texts: Sequence[str]) -> List[List[str]]:
+    """Normalize the text of several notes, as `normalize_text` does, in a
+    single pass over them all.
+
+    The texts are joined into one, so that the quotes are converted and the
+    paragraphs found by a single call each, rather than once per note.
+
+    Parameters
+    ----------
+    texts : The `note_text` of each note.
+
+    Returns
+    -------
+    A list of paragraphs for each text, in the order of `texts`.
+    """
+    joined = f"\n\n{_SEPARATOR}\n\n".join(texts)
+    if joined.count(_SEPARATOR) != len(texts) - 1:
+        # No texts, or a text contains the separator itself.
+        return [normalize_text(text) for text in texts]
+
+    normalized = []
+    paragraphs: List[str] = []
+    for paragraph in _paragraph.findall(smarten_quotes(joined)):
+        if paragraph == _SEPARATOR:
+            normalized.append(paragraphs)
+            paragraphs = []
+        elif not paragraph.startswith(_HEADERS) and not paragraph.isspace():
+            paragraphs.append(paragraph.replace("\n", " "))
+    normalized.append(paragraphs)
+    return normalized
@@ -0,0 +1,303 @@
+"""A module containing functions that spread the conversion over several
+processes."""
+
+import csv
+import io
+import math
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, List, Sequence, Tuple, Union
+
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.converters import iter_notes
+from notes_converter.utils.filters import NoteFilter, remove_duplicate_notes
+from notes_converter.utils.loaders import load_csv_as_dict
+from notes_converter.utils.resolvers import get_reference_resolver
+
+# Files are split into byte ranges of at least this size, in bytes.
+MIN_RANGE_SIZE = 4 * 1024 * 1024
+# The number of ranges given to each worker, to balance their load.
+RANGES_PER_JOB = 4
+_BLOCK_SIZE = 1024 * 1024
+
+
+def load_notes(
+    files: Sequence[Union[Path, str]],
+    field_names: List[str],
+    jobs: int = 1,
+    note_filter: Union[NoteFilter, None] = None,
+) -> list:
+    """Load and build the notes of several `csv` files in worker processes,
+    and merge them.
+
+    Large files are split into byte ranges, so that even a single file is
+    spread over all the workers. The result is the same as loading the
+    files one after the other.
+
+    Parameters
+    ----------
+    files : A list containing the paths to the files.
+    field_names : A list of strings mapping to the csv fields.
+    jobs : The number of worker processes. `1` loads the files in this
+        process, and `0` uses one process per CPU.
+    note_filter : A `NoteFilter` selecting the notes, if any. The rows are
+        filtered before they are built, and the tags and notebooks once the
+        duplicates are removed.
+
+    Returns
+    -------
+    A merged list of unique `Note`s, in the order of `files`.
+    """
+    jobs = worker_count(jobs)
+    catalog = Catalog()
+
+    if jobs == 1:
+        loaded = (
+            load_notes_file(file, field_names, catalog, note_filter) for file in files
+        )
+        notes = remove_duplicate_notes(note for notes in loaded for note in notes)
+        return _filter_notes(notes, note_filter)
+
+    ranges = _plan_ranges(files, jobs)
+    if not ranges:
+        # Every file is empty or only has its titles.
+        return []
+    load = partial(_load_range, field_names=field_names, note_filter=note_filter)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(ranges))) as executor:
+        loaded = executor.map(load, ranges)
+        notes = remove_duplicate_notes(_rebind(loaded, catalog))
+    return _filter_notes(notes, note_filter)
+
+
+def _filter_notes(notes: list, note_filter: Union[NoteFilter, None]) -> list:
+    if note_filter:
+        return list(note_filter.filter_notes(notes))
+    return notes
+
+
+def _rebind(loaded: Iterable[list], catalog: Catalog):
+    """Move the notes built by each worker to the same catalog."""
+    for notes in loaded:
+        for note in notes:
+            note.rebind(catalog)
+            yield note
+
+
+def load_notes_file(
+    path: Union[Path, str],
+    field_names: List[str],
+    catalog: Union[Catalog, None] = None,
+    note_filter: Union[NoteFilter, None] = None,
+) -> list:
+    """Load a single `csv` file and build its notes.
+
+    Parameters
+    ----------
+    path : A string or Path object to the file.
+    field_names : A list of strings mapping to the csv fields.
+    catalog : The `Catalog` holding the notes' tags and notebooks.
+        `None` means that a new catalog is used.
+    note_filter : A `NoteFilter` selecting the rows to build, if any, by
+        `NoteFilter.filter_rows`.
+
+    Returns
+    -------
+    A list of `Note`s.
+    """
+    reader = load_csv_as_dict(path, field_names=field_names)
+    if note_filter:
+        reader = note_filter.filter_rows(reader)
+    sort_key = get_reference_resolver().sort_key
+    return list(iter_notes(reader, field_names, sort_key, catalog))
+
+
+def load_notes_range(
+    path: Union[Path, str],
+    start: int,
+    end: int,
+    field_names: List[str],
+    note_filter: Union[NoteFilter, None] = None,
+) -> list:
+    """Load the records between the bytes `start` and `end` of a `csv` file
+    and build their notes.
+
+    Parameters
+    ----------
+    path : A string or Path object to the file.
+    start : The offset of the first record, as returned by `split_csv`.
+    end : The offset following the last record.
+    field_names : A list of strings mapping to the csv fields.
+    note_filter : A `NoteFilter` selecting the rows to build, if any, by
+        `NoteFilter.filter_rows`.
+
+    Returns
+    -------
+    A list of `Note`s.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    # Decoded like `load_csv_as_dict`, including its newline translation.
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+    reader = csv.DictReader(text, fieldnames=field_names)
+    if note_filter:
+        reader = note_filter.filter_rows(reader)
+    return list(iter_notes(reader, field_names, get_reference_resolver().sort_key))
+
+
+def split_csv(path: Union[Path, str], parts: int) -> List[Tuple[int, int]]:
+    """Split a `csv` file into about `parts` byte ranges of whole records.
+
+    A newline ends a record only outside of a quoted field. As quotes within
+    a quoted field are escaped by doubling them, a newline is outside of a
+    quoted field when the number of quotes before it is even, which allows
+    note texts to span several lines.
+
+    Parameters
+    ----------
+    path : A string or Path object to the file.
+    parts : The desired number of ranges.
+
+    Returns
+    -------
+    A list of `(start, end)` byte offsets. The titles (first line) are not
+    part of any range.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        first_record = _record_end(mm, 0, in_quotes=False)
+        step = max(1, (size - first_record) // max(1, parts))
+
+        boundaries = [first_record]
+        target = first_record + step
+        while target < size:
+            previous = boundaries[-1]
+            in_quotes = _count_quotes(mm, previous, target) % 2 == 1
+            boundary = _record_end(mm, target, in_quotes)
+            if boundary >= size:
+                break
+            boundaries.append(boundary)
+            target = boundary + step
+        boundaries.append(size)
+
+    return [
+        (start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end
+    ]
+
+
+def write_parts(
+    parts: Iterable[Tuple[str, list]],
+    writer: Callable,
+    output_path: Union[Path, str],
+    jobs: int = 1,
+    paths: Union[List[Path], None] = None,
+    **kwargs,
+) -> List[Path]:
+    """Write each part of the notes to its own document, in worker
+    processes.
+
+    Parameters
+    ----------
+    parts : An iterable of `(name, notes)` tuples, as returned by
+        `split_notes`.
+    writer : The function writing a document, such as `write_to_docx`.
+    output_path : The path of the document before splitting. Each part is
+        saved next to it, with the part's name appended to its name.
+    jobs : The number of worker processes. `1` writes the parts in this
+        process, one at a time, and `0` uses one process per CPU.
+    paths : A list to which the path of each part is added as its writing
+        starts, so that the parts written before a failure can be found.
+    kwargs : Other arguments passed to `writer`.
+
+    Returns
+    -------
+    The paths of the saved documents.
+    """
+    jobs = worker_count(jobs)
+    if paths is None:
+        paths = []
+
+    def named(parts):
+        for name, notes in parts:
+            paths.append(_part_path(Path(output_path), name, paths))
+            yield notes, paths[-1]
+
+    if jobs == 1:
+        for notes, path in named(parts):
+            writer(notes, path, **kwargs)
+        return paths
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(writer, notes, path, **kwargs)
+            for notes, path in named(parts)
+        ]
+        for future in futures:
+            future.result()
+    return paths
+
+
+def _part_path(output_path: Path, name: str, taken: List[Path]) -> Path:
+    """Append `name` to the output file's name, without characters that are
+    not allowed in file names. Parts without a name are only numbered."""
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .")
+    label = f" ({name})" if name else ""
+    path = output_path.with_name(f"{output_path.stem}{label}{output_path.suffix}")
+    number = 2
+    while path in taken:
+        label = f" ({name}, {number})" if name else f" ({number})"
+        path = output_path.with_name(f"{output_path.stem}{label}{output_path.suffix}")
+        number += 1
+    return path
+
+
+def _load_range(task, field_names, note_filter):
+    path, start, end = task
+    return load_notes_range(path, start, end, field_names, note_filter)
+
+
+def _plan_ranges(files, jobs: int) -> List[Tuple[Union[Path, str], int, int]]:
+    """Split the files into ranges so that each worker gets several of
+    about the same size."""
+    sizes = [os.path.getsize(file) for file in files]
+    range_size = max(MIN_RANGE_SIZE, sum(sizes) // (jobs * RANGES_PER_JOB))
+    return [
+        (file, start, end)
+        for file, size in zip(files, sizes)
+        for start, end in split_csv(file, math.ceil(size / range_size))
+    ]
+
+
+def _count_quotes(mm, start: int, end: int) -> int:
+    quotes = 0
+    for position in range(start, end, _BLOCK_SIZE):
+        quotes += mm[position : min(position + _BLOCK_SIZE, end)].count(b'"')
+    return quotes
+
+
+def _record_end(mm, position: int, in_quotes: bool) -> int:
+    """Return the offset following the first newline at or after `position`
+    that ends a record."""
+    while True:
+        newline = mm.find(b"\n", position)
+        if newline == -1:
+            return len(mm)
+        in_quotes ^= mm[position:newline].count(b'"') % 2 == 1
+        if not in_quotes:
+            return newline + 1
+        position = newline + 1
+
+
+def worker_count(jobs: int) -> int:
+    """Return the number of worker processes to start."""
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+    return jobs
@@ -0,0 +1,283 @@
+"""A module containing the planner that chooses how to convert the notes
+within a memory budget.
+"""
+
+import csv
+import gc
+import logging
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Iterator, List, NamedTuple, Sequence, Tuple, Union
+
+import psutil
+
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.converters import iter_notes
+from notes_converter.utils.filters import remove_duplicate_notes
+from notes_converter.utils.profilers import reset_peak
+from notes_converter.utils.sorters import (
+    MERGE_WIDTH,
+    RUN_BATCH_SIZE,
+    RUN_SIZE,
+    sort_notes_by_reference,
+)
+
+logger = logging.getLogger(__name__)
+
+# The number of rows read to estimate the memory used by each note.
+SAMPLE_ROWS = 1000
+# `python-docx` builds its document with `lxml`, outside of the memory
+# traced by `tracemalloc`, so its cost per note was measured once as RSS.
+DOCX_BYTES_PER_NOTE = 10_000
+# The hyperlink relationships kept by the streaming writer, per note. Notes
+# on the same verse share a relationship.
+LINK_BYTES_PER_NOTE = 50
+# The page cache and buffers of the `SQLite3` pipeline, which do not grow
+# with the number of notes.
+SQLITE_BYTES = 16 * 2**20
+# The share of the available system memory that a conversion may use.
+HEADROOM = 0.8
+
+
+class NoteSample(NamedTuple):
+    """The memory used by the notes of the first rows of an export.
+
+    The sizes are in bytes per note. `dedup_bytes` and `sort_bytes` are held
+    on top of the notes while their duplicates are removed and while they
+    are sorted.
+    """
+
+    rows: int
+    csv_bytes: float
+    note_bytes: float
+    dedup_bytes: float
+    sort_bytes: float
+    complete: bool
+
+    def estimate_rows(self, total_csv_bytes: int) -> int:
+        """Estimate the number of rows in files of `total_csv_bytes`."""
+        if self.complete or not self.rows:
+            return self.rows
+        return round(total_csv_bytes / self.csv_bytes)
+
+
+class MemoryPlan(NamedTuple):
+    """The way a conversion fits within its memory budget.
+
+    `pipeline` is one of `PIPELINES`. `streaming` is set when the document
+    must be streamed to disk, and `run_size` is the number of notes sorted
+    at once by the `spill` pipeline. `needed` and `budget` are in bytes.
+    """
+
+    pipeline: str
+    streaming: bool
+    run_size: int
+    rows: int
+    needed: int
+    budget: int
+    reason: str
+
+
+def sample_notes(
+    files: Sequence[Union[Path, str]],
+    field_names: List[str],
+    sort_key: Callable[[str], Tuple[int, ...]],
+    rows: int = SAMPLE_ROWS,
+) -> NoteSample:
+    """Build the notes of the first `rows` rows of the given `csv` files and
+    measure the memory they use at each stage.
+
+    Parameters
+    ----------
+    files : A list containing the paths to the files.
+    field_names : A list of strings mapping to the csv fields.
+    sort_key : A function mapping a note's source location to its sort key.
+    rows : The number of rows to sample.
+
+    Returns
+    -------
+    A `NoteSample`.
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        records, csv_bytes, complete = _read_sample(files, field_names, rows)
+        if not records:
+            return NoteSample(0, 0.0, 0.0, 0.0, 0.0, complete)
+
+        notes = list(iter_notes(records, field_names, sort_key, Catalog()))
+        del records
+        gc.collect()
+        note_bytes = tracemalloc.get_traced_memory()[0] - before
+
+        extra_bytes = []
+        for stage in (remove_duplicate_notes, sort_notes_by_reference):
+            current = tracemalloc.get_traced_memory()[0]
+            # Keeps the peak of the stage of a profiled conversion sampling
+            # the notes.
+            reset_peak()
+            stage(notes)
+            extra_bytes.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    count = len(notes)
+    return NoteSample(
+        rows=count,
+        csv_bytes=csv_bytes / count,
+        note_bytes=note_bytes / count,
+        dedup_bytes=extra_bytes[0] / count,
+        sort_bytes=extra_bytes[1] / count,
+        complete=complete,
+    )
+
+
+def _read_sample(files, field_names, rows):
+    """Return the first `rows` rows of `files` as `dict`s, the size of those
+    rows in the files, and whether the files were read to the end."""
+    records = []
+    total = 0
+    for file in files:
+        size = [0]
+        with open(file, encoding="utf-8") as f:
+            reader = csv.DictReader(_count_bytes(f, size), fieldnames=field_names)
+            next(reader, None)  # Skip titles (first line)
+            size[0] = 0
+            for record in reader:
+                records.append(record)
+                if len(records) == rows:
+                    return records, total + size[0], False
+        total += size[0]
+    return records, total, True
+
+
+def _count_bytes(lines: Iterator[str], size: List[int]) -> Iterator[str]:
+    for line in lines:
+        size[0] += len(line.encode("utf-8"))
+        yield line
+
+
+def memory_budget(max_memory: Union[int, None] = None) -> int:
+    """Return the memory, in bytes, that a conversion may use now.
+
+    The available system memory is read at each call, since it changes
+    while the program runs.
+
+    Parameters
+    ----------
+    max_memory : The most memory the whole process may use, in bytes.
+    """
+    budget = int(psutil.virtual_memory().available * HEADROOM)
+    if max_memory is not None:
+        used = psutil.Process().memory_info().rss
+        budget = min(budget, max_memory - used)
+    return max(budget, 0)
+
+
+def plan_conversion(
+    files: Sequence[Union[Path, str]],
+    field_names: List[str],
+    sort_key: Callable[[str], Tuple[int, ...]],
+    max_memory: Union[int, None] = None,
+    streaming: bool = False,
+    sample_rows: int = SAMPLE_ROWS,
+) -> MemoryPlan:
+    """Choose the pipeline that converts the given files within the memory
+    budget, from a sample of their first rows.
+
+    In order of preference, the notes are held in memory, with the document
+    built in memory unless `streaming` is set, then with the document
+    streamed to disk. Otherwise, they are sorted in runs spilled to disk,
+    as large as the budget allows, or in a `SQLite3` database.
+
+    Parameters
+    ----------
+    files : A list containing the paths to the files.
+    field_names : A list of strings mapping to the csv fields.
+    sort_key : A function mapping a note's source location to its sort key.
+    max_memory : The most memory the whole process may use, in bytes.
+        Defaults to a share of the available system memory.
+    streaming : Whether the document is streamed to disk regardless.
+    sample_rows : The number of rows to sample.
+
+    Returns
+    -------
+    A `MemoryPlan`.
+    """
+    sample = sample_notes(files, field_names, sort_key, sample_rows)
+    rows = sample.estimate_rows(sum(Path(file).stat().st_size for file in files))
+    budget = memory_budget(max_memory)
+    logger.debug(
+        "Sampled %d rows: %.0f bytes in the files, %.0f bytes per note, "
+        "%.0f more to remove duplicates and %.0f more to sort",
+        sample.rows,
+        sample.csv_bytes,
+        sample.note_bytes,
+        sample.dedup_bytes,
+        sample.sort_bytes,
+    )
+
+    def in_memory(write_bytes):
+        extra = max(sample.dedup_bytes, sample.sort_bytes, write_bytes)
+        return round(rows * (sample.note_bytes + extra))
+
+    needed = in_memory(LINK_BYTES_PER_NOTE if streaming else DOCX_BYTES_PER_NOTE)
+    if needed <= budget:
+        plan = MemoryPlan(
+            "memory",
+            streaming,
+            RUN_SIZE,
+            rows,
+            needed,
+            budget,
+            f"the {rows} notes need about {_mb(needed)}",
+        )
+    elif in_memory(LINK_BYTES_PER_NOTE) <= budget:
+        plan = MemoryPlan(
+            "memory",
+            True,
+            RUN_SIZE,
+            rows,
+            in_memory(LINK_BYTES_PER_NOTE),
+            budget,
+            f"the {rows} notes fit, but building the document in memory "
+            f"would need about {_mb(needed)}, so it is streamed to disk",
+        )
+    else:
+        plan = _plan_on_disk(sample, rows, budget, in_memory(LINK_BYTES_PER_NOTE))
+
+    logger.info(
+        "Chose the %s pipeline within a budget of %s: %s.",
+        plan.pipeline,
+        _mb(budget),
+        plan.reason,
+    )
+    return plan
+
+
+def _plan_on_disk(sample: NoteSample, rows: int, budget: int, in_memory: int):
+    """Size the runs of the `spill` pipeline to the budget, or fall back to
+    the `SQLite3` pipeline when even small runs do not fit."""
+    reason = f"the {rows} notes would need about {_mb(in_memory)} in memory"
+    # The writer's links and the batches of the runs being merged.
+    fixed = rows * LINK_BYTES_PER_NOTE
+    fixed += MERGE_WIDTH * RUN_BATCH_SIZE * sample.note_bytes
+    per_note = sample.note_bytes + sample.sort_bytes
+    run_size = min(RUN_SIZE, int((budget - fixed) / per_note))
+
+    if run_size >= RUN_BATCH_SIZE:
+        needed = round(fixed + run_size * per_note)
+        reason += f", so they are sorted on disk in runs of {run_size}"
+        return MemoryPlan("spill", True, run_size, rows, needed, budget, reason)
+
+    reason += ", and runs spilled to disk would be too small, so they are sorted"
+    reason += " in a database"
+    return MemoryPlan("sqlite", True, RUN_SIZE, rows, SQLITE_BYTES, budget, reason)
+
+
+def _mb(size: float) -> str:
+    return f"{size / 2**20:.0f} MB"
@@ -0,0 +1,139 @@
+"""A module containing the hooks that observe the stages of a conversion."""
+
+import cProfile
+import json
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Union
+
+# The highest peak of the traced memory before the last `reset_peak`, since
+# `tracemalloc` keeps a single peak for the whole process.
+_earlier_peak = 0
+
+
+def start_peak() -> None:
+    """Start measuring the peak of the traced memory, such as for a stage."""
+    global _earlier_peak
+    _earlier_peak = 0
+    tracemalloc.reset_peak()
+
+
+def reset_peak() -> None:
+    """Reset the peak of `tracemalloc` to measure part of a stage, keeping
+    the peak measured since `start_peak` for `traced_peak`."""
+    global _earlier_peak
+    _earlier_peak = max(_earlier_peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+
+
+def traced_peak() -> int:
+    """Return the peak of the traced memory since `start_peak`, including
+    the peaks before each `reset_peak`."""
+    return max(_earlier_peak, tracemalloc.get_traced_memory()[1])
+
+
+class StageStats(NamedTuple):
+    """The measurements of a stage of a conversion.
+
+    `cpu_time` includes the worker processes that finished during the
+    stage. `peak_memory` is the peak of the memory traced by `tracemalloc`
+    during the stage, including the memory held by earlier stages, in bytes.
+    It is `None` if `tracemalloc` is not tracing.
+    """
+
+    stage: str
+    wall_time: float
+    cpu_time: float
+    rows: int
+    peak_memory: Union[int, None]
+
+
+class ConversionHook:
+    """The base class of the hooks registered with
+    `NotesConverter.add_hook`. The methods do nothing by default."""
+
+    def stage_started(self, stage: str) -> None:
+        """Called before the stage named `stage` starts."""
+
+    def stage_progress(self, stage: str, rows: int, total: Union[int, None]) -> None:
+        """Called as a stage processes rows, with the number of rows it has
+        processed so far and the number it is expected to process, if known.
+        Hooks are called from the thread running the conversion."""
+
+    def stage_finished(self, stats: StageStats) -> None:
+        """Called once a stage has finished, with its measurements."""
+
+
+class Profiler(ConversionHook):
+    """Record the measurements of each stage and write them as a JSON report.
+
+    Memory is traced with `tracemalloc` from the first stage on, which slows
+    the conversion down.
+
+    Parameters
+    ----------
+    profile_hottest : Whether to run each stage under `cProfile` and keep
+        the profile of the stage that took the longest.
+    """
+
+    def __init__(self, profile_hottest: bool = False) -> None:
+        self.stages: List[StageStats] = []
+        self.hottest_profile: Union[cProfile.Profile, None] = None
+        self._profile_hottest = profile_hottest
+        self._profile: Union[cProfile.Profile, None] = None
+        self._started_tracing = False
+
+    def stage_started(self, stage: str) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self._profile_hottest:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stage_finished(self, stats: StageStats) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+            if not self.stages or stats.wall_time > self.hottest.wall_time:
+                self.hottest_profile = self._profile
+            self._profile = None
+        self.stages.append(stats)
+
+    @property
+    def hottest(self) -> Union[StageStats, None]:
+        """The stage that took the longest."""
+        return max(self.stages, key=lambda stats: stats.wall_time, default=None)
+
+    def close(self) -> None:
+        """Stop tracing memory if the profiler started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def report(self) -> Dict:
+        """Return the measurements of each stage and their totals."""
+        hottest = self.hottest
+        return {
+            "stages": [stats._asdict() for stats in self.stages],
+            "total": {
+                "wall_time": sum(stats.wall_time for stats in self.stages),
+                "cpu_time": sum(stats.cpu_time for stats in self.stages),
+                "peak_memory": max(
+                    (stats.peak_memory or 0 for stats in self.stages), default=0
+                ),
+            },
+            "hottest_stage": hottest.stage if hottest else None,
+        }
+
+    def write_report(self, path: Union[str, Path]) -> None:
+        """Write the report returned by `self.report` to `path`."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=4)
+            f.write("\n")
+
+    def dump_hottest_profile(self, path: Union[str, Path]) -> None:
+        """Write the `cProfile` statistics of the hottest stage to `path`,
+        to be read with `pstats`."""
+        if self.hottest_profile is None:
+            raise ValueError("no stage was profiled")
+        self.hottest_profile.dump_stats(str(path))
@@ -0,0 +1,102 @@
+"""A module containing the classes that resolve a note's source location."""
+
+import functools
+import hashlib
+import json
+
+from notes_converter.utils.constants import DATA_PATH
+from notes_converter.utils.converters import build_study_references, extract_study_data
+from notes_converter.utils.loaders import load_json
+from notes_converter.utils.sorters import reference_sort_key, reference_volume
+
+
+class ReferenceResolver:
+    """Build the references displayed for source location urls, and the keys
+    used to sort them, caching the most recently used ones.
+
+    Parameters
+    ----------
+    name_maps : A `dict` mapping shorthand names to long-hand names.
+    standard_works : A `dict` mapping each volume of the standard works to
+        its books, in order.
+    volume_names : A `dict` mapping each volume of the standard works to the
+        name it is given when notes are split or filtered by volume. Volumes
+        it lacks are named by `name_maps`.
+    maxsize : The number of references and sort keys kept in each cache.
+    """
+
+    def __init__(
+        self, name_maps, standard_works, volume_names=None, maxsize: int = 8192
+    ) -> None:
+        self.name_maps = name_maps
+        self.standard_works = standard_works
+        # Kept apart from `name_maps`, so that naming a volume never changes
+        # the references of its notes.
+        volume_names = volume_names or {}
+        self.volumes = [
+            volume_names.get(volume, name_maps.get(volume, volume))
+            for volume in standard_works
+        ]
+        self.resolve = functools.lru_cache(maxsize=maxsize)(self._resolve)
+        self.sort_key = functools.lru_cache(maxsize=maxsize)(
+            reference_sort_key(standard_works)
+        )
+        # The first value of `sort_key`, found without parsing the whole url.
+        self.volume = reference_volume(standard_works)
+
+    def _resolve(self, source_location: str) -> str:
+        """Return the reference for `source_location`."""
+        # NOTE: Any note created directly in Annotations in the Gospel Library
+        # app or Gospel Library Online will have an "undefined" source
+        # location.
+        if source_location == "undefined":
+            return "Source"
+        # Notes without a location have no reference, and are not linked.
+        if not source_location:
+            return ""
+
+        extracted_reference = extract_study_data(source_location, self.name_maps)
+        return build_study_references(extracted_reference)
+
+    def volume_name(self, volume: int) -> str:
+        """Return the name of the volume at index `volume` of a sort key."""
+        if volume < len(self.volumes):
+            return self.volumes[volume]
+        if volume == len(self.volumes):
+            return "Other Study Material"
+        return "Annotations"
+
+    @functools.cached_property
+    def fingerprint(self) -> str:
+        """A digest of the name maps and of the order of the standard works.
+        It changes whenever the references or sort keys may change."""
+        data = json.dumps([self.name_maps, self.standard_works], sort_keys=True)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    @property
+    def hits(self) -> int:
+        return self.resolve.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        return self.resolve.cache_info().misses
+
+    def cache_info(self):
+        """Return the `functools.lru_cache` statistics of the cache."""
+        return self.resolve.cache_info()
+
+    def cache_clear(self) -> None:
+        self.resolve.cache_clear()
+        self.sort_key.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_reference_resolver() -> ReferenceResolver:
+    """Return the resolver shared by the whole process. The name maps, the
+    order of the standard works and the names of the volumes are loaded the
+    first time it is requested."""
+    return ReferenceResolver(
+        load_json(DATA_PATH / "data_maps.json"),
+        load_json(DATA_PATH / "standard_works_order.json"),
+        load_json(DATA_PATH / "volume_names.json"),
+    )
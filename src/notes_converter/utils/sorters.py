@@ -1,38 +1,226 @@
 """A module containing sorting functions."""
 
+import heapq
+import pickle
 import re
+import tempfile
+from itertools import chain, count, islice
+from operator import attrgetter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
 
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.converters import Note
 
-def sort_notes_by_title_and_verse(notes, title_order):
-    """Sort notes by title and verse.
+# Volume, book, chapter, first paragraph and last paragraph.
+SortKey = Tuple[int, int, int, int, int]
+
+# The number of notes sorted in memory before they are spilled to disk.
+RUN_SIZE = 50_000
+# The number of notes written to, and read from, a run at once.
+RUN_BATCH_SIZE = 1000
+# The number of runs merged at once.
+MERGE_WIDTH = 64
+
+paragraph_pattern = re.compile(r"p(\d+)")
+
+
+def reference_sort_key(
+    standard_works: Dict[str, List[str]],
+) -> Callable[[str], SortKey]:
+    """Build a function returning the sort key of a note's source location.
 
     Parameters
     ----------
-    notes : A list of Note objects with `.title`, `.date` and `.body`
-        attributes.
+    standard_works : A `dict` mapping each volume of the standard works, as
+        named in the urls, to its books, in the desired order for the output
+        notes.
+
+    Returns
+    -------
+    A function mapping a source location url to a tuple of integers: the
+    volume, book, chapter, first paragraph and last paragraph. Other study
+    material is placed after the standard works, and notes without a source
+    location are placed last.
+    """
+    volumes = {
+        volume: (index, {book: i for i, book in enumerate(books)})
+        for index, (volume, books) in enumerate(standard_works.items())
+    }
+    other_material = len(volumes)
+    undefined = other_material + 1
+
+    def arrange_by_reference(source_location: str) -> SortKey:
+        if not source_location or source_location == "undefined":
+            return undefined, 0, 0, 0, 0
+
+        url = urlsplit(source_location)
+        segments = [segment for segment in url.path.split("/") if segment]
+        first, last = _paragraph_range(url)
+
+        if "scriptures" not in segments:
+            chapter = _number(segments[-1]) if segments else 0
+            return other_material, 0, chapter, first, last
+
+        # For example: ["bofm", "1-ne", "3"] or ["bofm", "three"].
+        path = segments[segments.index("scriptures") + 1 :]
+        volume = volumes.get(path[0]) if path else None
+        if volume is None:
+            return other_material, 0, 0, first, last
+
+        volume_index, books = volume
+        book = books.get(path[1], len(books)) if len(path) > 1 else 0
+        chapter = _number(path[2]) if len(path) > 2 else 0
+        return volume_index, book, chapter, first, last
 
-    title_order : A list of strings in the desired order for the output notes.
+    return arrange_by_reference
+
+
+def reference_volume(standard_works: Dict[str, List[str]]) -> Callable[[str], int]:
+    """Build a function returning the volume of a note's source location,
+    the first value of its sort key, without parsing the rest of the url.
+
+    Parameters
+    ----------
+    standard_works : A `dict` mapping each volume of the standard works, as
+        named in the urls, to its books, in the desired order for the output
+        notes.
 
     Returns
     -------
-    A list of `Note` objects sorted by title and verse.
+    A function mapping a source location url to the same volume as
+    `reference_sort_key`, for the urls of Gospel Library.
     """
-    indexed_titles = {title: index for index, title in enumerate(title_order)}
-    chapter_verse_pattern = re.compile(r"\W(\d+|\d+:\d+)|;|:.*")
-
-    def extract_chapter_and_verse(title):
-        _match = [i for i in chapter_verse_pattern.findall(title) if i.strip()]
-        index = 1
-        if _match:
-            chapter = int(_match[0])
-            verse = int(_match[index]) if index < len(_match) else 0
-            return chapter, verse
+    volumes = {volume: index for index, volume in enumerate(standard_works)}
+    other_material = len(volumes)
+    undefined = other_material + 1
+
+    def volume_of(source_location: str) -> int:
+        if not source_location or source_location == "undefined":
+            return undefined
+        # Cheaper than `urlsplit`, which is most of the cost for unique urls.
+        path = "/" + source_location.partition("?")[0].partition("#")[0]
+        after = path.partition("/scriptures/")[2]
+        volume = after.lstrip("/").partition("/")[0]
+        return volumes.get(volume, other_material)
+
+    return volume_of
+
+
+def sort_notes_by_reference(notes):
+    """Sort notes by the sort key built from their source location.
+
+    Parameters
+    ----------
+    notes : An iterable of Note objects with a `.sort_key` attribute.
+
+    Returns
+    -------
+    A list of `Note` objects sorted by volume, book, chapter and paragraph.
+    """
+    return sorted(notes, key=attrgetter("sort_key"))
+
+
+def is_sorted(keys: Iterable) -> bool:
+    """Return whether `keys` never decrease, stopping at the first key that
+    does."""
+    keys = iter(keys)
+    previous = next(keys, None)
+    for key in keys:
+        if key < previous:
+            return False
+        previous = key
+    return True
+
+
+def external_sort(
+    notes: Iterable[Note],
+    run_size: int = RUN_SIZE,
+    temp_dir: Union[Path, str, None] = None,
+) -> Iterator[Note]:
+    """Sort notes by their sort key without holding them all in memory.
+
+    The notes are sorted in runs of `run_size` notes. If there is more than
+    one run, each run is spilled to a temporary file and the runs are merged
+    with `heapq.merge`. Like `sorted`, the sort is stable.
+
+    Parameters
+    ----------
+    notes : An iterable of `Note` objects, such as a generator.
+    run_size : The number of notes sorted in memory at once.
+    temp_dir : The directory in which the runs are spilled.
+        `None` means that the system's temporary directory is used.
+
+    Returns
+    -------
+    A generator of `Note` objects sorted by volume, book, chapter and
+    paragraph.
+    """
+    notes = iter(notes)
+    run = sorted(islice(notes, run_size), key=_sort_key)
+    following = next(notes, None)
+    if following is None:
+        # The notes fit in a single run, so nothing is spilled.
+        yield from run
+        return
+
+    notes = chain([following], notes)
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        paths = (Path(directory) / f"run{i}.pickle" for i in count())
+        runs: List[Iterator[Note]] = []
+        while run:
+            runs.append(_spill(run, next(paths)))
+            if len(runs) == MERGE_WIDTH:
+                # Keep the number of open files bounded.
+                runs = [_spill(heapq.merge(*runs, key=_sort_key), next(paths))]
+            run = sorted(islice(notes, run_size), key=_sort_key)
+
+        yield from heapq.merge(*runs, key=_sort_key)
+
+
+_sort_key = attrgetter("sort_key")
+
+
+def _spill(notes: Iterable[Note], path: Path) -> Iterator[Note]:
+    """Write sorted notes to `path` and return a generator reading them
+    back."""
+    notes = iter(notes)
+    catalog = None
+    with open(path, "wb") as f:
+        while True:
+            batch = list(islice(notes, RUN_BATCH_SIZE))
+            if not batch:
+                break
+            if catalog is None:
+                catalog = batch[0].catalog
+            # Notes are written without their catalog, which would otherwise
+            # be pickled with every batch.
+            records = [note.as_record() for note in batch]
+            pickle.dump(records, f, pickle.HIGHEST_PROTOCOL)
+    return _read_run(path, catalog)
+
+
+def _read_run(path: Path, catalog: Catalog) -> Iterator[Note]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                records = pickle.load(f)
+            except EOFError:
+                return
+            for record in records:
+                yield Note(*record, catalog)
+
+
+def _paragraph_range(url) -> Tuple[int, int]:
+    """Return the first and last paragraph numbers of a url's `id`, such as
+    `p4` or `p4-p6`."""
+    ids = parse_qs(url.query).get("id", [url.fragment])[0]
+    numbers = paragraph_pattern.findall(ids)
+    if not numbers:
         return 0, 0
+    return int(numbers[0]), int(numbers[-1])
 
-    def arrange_by_title_and_verse(note):
-        title_without_verse = chapter_verse_pattern.sub("", note.title)
-        chapter_index = indexed_titles.get(title_without_verse, float("inf"))
-        chapter, verse = extract_chapter_and_verse(note.title)
-        return chapter_index, chapter, verse
 
-    return sorted(notes, key=arrange_by_title_and_verse)
+def _number(segment: str) -> int:
+    return int(segment) if segment.isascii() and segment.isdigit() else 0
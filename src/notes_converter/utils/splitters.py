@@ -0,0 +1,110 @@
+"""A module containing functions that split notes into several parts, each
+written to its own document."""
+
+import re
+from itertools import groupby
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from notes_converter.utils.catalogs import NameIndex
+from notes_converter.utils.constants import SPLIT_OPTIONS
+
+# The markup written around each note, in bytes, as a rough estimate.
+NOTE_OVERHEAD = 600
+
+verse_pattern = re.compile(r":.*$")
+
+
+def split_notes(
+    notes: Iterable,
+    by: Optional[str] = None,
+    max_notes: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    volume_name: Optional[Callable[[int], str]] = None,
+) -> Iterator[Tuple[str, List]]:
+    """Split sorted notes into named parts.
+
+    Parameters
+    ----------
+    notes : An iterable of `Note`s, sorted by reference.
+    by : How to group the notes: `"volume"`, `"tag"`, `"notebook"` or `None`
+        to keep them together. A note with several tags or notebooks is
+        placed in each of their parts, and the notes without any are placed
+        in a part of their own, named "No Tag" or "No Notebook".
+    max_notes : The maximum number of notes per part.
+    max_bytes : The approximate maximum size of the text in each part.
+    volume_name : A function mapping a volume index to its name.
+        Required to split by volume.
+
+    Returns
+    -------
+    A generator of `(name, notes)` tuples. Parts limited by size are named
+    after the references of their first and last notes, such as
+    "1 Nephi 1 - 3 Nephi 5". Grouping by volume consumes `notes` lazily.
+    """
+    if by is not None and by not in SPLIT_OPTIONS:
+        raise ValueError(f"cannot split notes by '{by}'")
+    for option, limit in (("max_notes", max_notes), ("max_bytes", max_bytes)):
+        if limit is not None and limit < 1:
+            raise ValueError(f"{option} must be at least 1, not {limit}")
+
+    for name, group in _group_notes(notes, by, volume_name):
+        if not (max_notes or max_bytes):
+            yield name, list(group)
+            continue
+        for chunk in _chunk_notes(group, max_notes, max_bytes):
+            label = _span_label(chunk)
+            yield ", ".join(part for part in (name, label) if part), chunk
+
+
+def _group_notes(notes, by, volume_name) -> Iterator[Tuple[str, Iterable]]:
+    if by is None:
+        yield "", notes
+    elif by == "volume":
+        # The notes are sorted by volume first, so each volume is a run.
+        for volume, group in groupby(notes, key=lambda note: note.sort_key[0]):
+            yield volume_name(volume), group
+    else:
+        # Each note is read once, to index it by name.
+        index = NameIndex(list(notes), by + "s")
+        # Parts are keyed by whether they hold the notes without a name, so
+        # that a tag or notebook called "No Tag" keeps a part of its own.
+        parts = [(name, False) for name in index.names()]
+        if index.unnamed:
+            parts.append(("No " + by.capitalize(), True))
+        for name, unnamed in sorted(
+            parts, key=lambda part: (part[0].casefold(), part[1])
+        ):
+            positions = index.unnamed if unnamed else index.positions(name)
+            yield name, [index.notes[position] for position in positions]
+
+
+def _chunk_notes(notes, max_notes, max_bytes) -> Iterator[List]:
+    chunk: List = []
+    size = 0
+    for note in notes:
+        note_size = _estimate_size(note)
+        full = (max_notes and len(chunk) >= max_notes) or (
+            max_bytes and size + note_size > max_bytes
+        )
+        if chunk and full:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(note)
+        size += note_size
+    if chunk:
+        yield chunk
+
+
+def _estimate_size(note) -> int:
+    text = sum(len(paragraph) for paragraph in note.note_text)
+    return text + len(note.title) + len(note.source_location) + NOTE_OVERHEAD
+
+
+def _span_label(notes: List) -> str:
+    """Name a part after the references of its first and last notes. Notes
+    without a title, such as annotations, are left out of the name."""
+    first = verse_pattern.sub("", notes[0].title).strip()
+    last = verse_pattern.sub("", notes[-1].title).strip()
+    if first and last and first != last:
+        return f"{first} - {last}"
+    return first or last
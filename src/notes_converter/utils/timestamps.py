@@ -0,0 +1,89 @@
+"""A module containing functions and classes that parse and format the
+notes' timestamps."""
+
+import functools
+from datetime import datetime, timezone
+from typing import Union
+
+import pytz
+
+from notes_converter.utils.constants import DATETIME_FORMAT, DEFAULT_TIMEZONE
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_timestamp(value: str) -> Union[int, None]:
+    """Convert an ISO 8601 timestamp, such as `2024-12-04T16:01:00.000Z`,
+    to seconds since the epoch.
+
+    Parameters
+    ----------
+    value : The timestamp exported by Gospel Library.
+
+    Returns
+    -------
+    An `int`, or `None` if `value` is empty.
+    """
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+class TimestampFormatter:
+    """Format timestamps in a given time zone.
+
+    The time zone is resolved once. Everything but the minutes is cached by
+    the hour, as only the minutes change within an hour of the same offset.
+
+    Parameters
+    ----------
+    time_zone : The name of a time zone, such as `America/Los_Angeles`.
+    maxsize : The number of formatted strings kept in the cache.
+    """
+
+    def __init__(self, time_zone: str = DEFAULT_TIMEZONE, maxsize: int = 8192):
+        self.time_zone = pytz.timezone(time_zone)
+        self._prefix_format, self._suffix_format = DATETIME_FORMAT.split("%M")
+        self._format_hour = functools.lru_cache(maxsize=maxsize)(self._format_hour)
+        self._format_minute = functools.lru_cache(maxsize=maxsize)(self._format_minute)
+
+    def format(self, timestamp: Union[int, None]) -> str:
+        """Convert seconds since the epoch to a human-readable format.
+
+        Anything other than an `int`, such as a missing timestamp, is
+        formatted as an empty string.
+        """
+        if not isinstance(timestamp, int):
+            return ""
+        hour, seconds = divmod(timestamp, 3600)
+        parts = self._format_hour(hour)
+        if parts is None:
+            return self._format_minute(timestamp // 60)
+        prefix, suffix = parts
+        return f"{prefix}{seconds // 60:02d}{suffix}"
+
+    def _format_hour(self, hour: int):
+        """Return the text before and after the minutes for a whole hour, or
+        `None` if the offset changes or is not whole hours."""
+        start = datetime.fromtimestamp(hour * 3600, tz=self.time_zone)
+        end = datetime.fromtimestamp(hour * 3600 + 3599, tz=self.time_zone)
+        offset = start.utcoffset()
+        if offset != end.utcoffset() or offset.total_seconds() % 3600:
+            return None
+        return start.strftime(self._prefix_format), start.strftime(self._suffix_format)
+
+    def _format_minute(self, minute: int) -> str:
+        dt = datetime.fromtimestamp(minute * 60, tz=self.time_zone)
+        return dt.strftime(DATETIME_FORMAT)
+
+    def cache_info(self):
+        """Return the `functools.lru_cache` statistics of the hourly cache."""
+        return self._format_hour.cache_info()
+
+
+@functools.lru_cache(maxsize=None)
+def get_timestamp_formatter(time_zone: str = DEFAULT_TIMEZONE) -> TimestampFormatter:
+    """Return the formatter shared by the whole process for `time_zone`."""
+    return TimestampFormatter(time_zone)
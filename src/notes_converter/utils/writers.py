@@ -1,38 +1,33 @@
 """A module containing all functions used to write data to a file or files."""
 
+import copy
 import getpass
-from datetime import datetime
+import hashlib
+import io
+import json
+import re
+import time
+import zipfile
+from itertools import islice
 from pathlib import Path
-from typing import Union
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
 
-import pytz
-from docx import Document
-from docx.opc.constants import RELATIONSHIP_TYPE
-from docx.opc.exceptions import PackageNotFoundError
-from docx.opc.oxml import qn
-from docx.oxml import OxmlElement
+from lxml import etree
 
-from notes_converter.utils.constants import DATA_PATH, TEMPLATE_PATH
-from notes_converter.utils.converters import build_study_references, extract_study_data
-from notes_converter.utils.exceptions import NoAvailableTemplate
-from notes_converter.utils.loaders import load_json
-
-
-def write_to_txt(notes, output_path):
-    """Write the given notes to a `.txt` file."""
-    with open(output_path, "w", encoding="utf-8") as f:
-        for note in notes:
-            f.write("\n\n" + note.title + "\n")
-            f.write(_convert_datetime(note.created) + "\n\n")
-            for body in note.note_text:
-                f.write(body + " ")
-            f.write("\n" + note.source_location)
+from notes_converter.utils.constants import DEFAULT_TIMEZONE, TEMPLATE_PATH
+from notes_converter.utils.exceptions import InvalidTemplate, NoAvailableTemplate
+from notes_converter.utils.groupers import group_notes
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.timestamps import get_timestamp_formatter
 
 
 def write_to_docx(
     notes,
     output_path: Union[str, Path],
     template_path: Union[str, Path, None],
+    time_zone: str = DEFAULT_TIMEZONE,
+    grouping: bool = True,
 ):
     """Write notes to a styled Word document.
 
@@ -42,65 +37,51 @@ def write_to_docx(
     output_path : The location to save the Word document.
     template_path : A path to a Word document template.
         `None` means that the default template will be used.
+    time_zone : The name of the time zone in which dates are displayed.
+    grouping : Whether the notes sharing a reference are written under a
+        single heading, with their dates separating their bodies.
 
     Returns
     -------
     A styled Word document in the given `output_path`.
     """
-    # Is there a custom template path?
-    if template_path:
-        template = Path(template_path)
-        valid_template = template.exists() and template.suffix == ".docx"
-        if not valid_template:
-            template = TEMPLATE_PATH / "default.docx"
-    else:
-        template = TEMPLATE_PATH / "default.docx"
-
-    try:
-        doc = Document(str(template))
-    except PackageNotFoundError:
-        # This error is raised only when default.docx is open in another
-        # application. Aside from development, that should (in theory)
-        # never happen in production.
-        raise NoAvailableTemplate
+    # A copy of the template, without its content.
+    doc = _templates.document(template_path)
+    # python-docx looks up the styles part for each paragraph given a style
+    # by name, through every relationship of the document. The ids are
+    # resolved once instead, as the template's styles are those of `doc`.
+    styles = read_template(template_path).styles
+    add_paragraph = _ParagraphAdder(doc)
 
     file_name = Path(output_path).stem
+    resolver = get_reference_resolver()
+    formatter = get_timestamp_formatter(time_zone)
 
-    # Clear existing template data
-    doc._body.clear_content()
-    doc.add_heading(file_name, level=0)
+    add_paragraph(file_name, _style(styles, "Title"))
+    hyperlinks = HyperlinkBuilder(doc.part)
 
-    for note in notes:
-        doc.add_heading(note.title, level=1)
-        doc.add_paragraph(_convert_datetime(note.created), style="Date")
+    for group in group_notes(notes, combine=grouping):
+        add_paragraph(group.title, _style(styles, "heading 1"))
 
-        for value, body in enumerate(note.note_text):
-            if value == 0:  # Allow for no text indent on first paragraph.
-                doc.add_paragraph(body, style="Head")
-                continue
-            doc.add_paragraph(body, style="Normal")
+        for note in group.notes:
+            add_paragraph(formatter.format(note.created), _style(styles, "Date"))
+
+            for value, body in enumerate(note.note_text):
+                if value == 0:  # Allow for no text indent on first paragraph.
+                    add_paragraph(body, _style(styles, "Head"))
+                    continue
+                add_paragraph(body, _style(styles, "Normal"))
 
         # TODO: an add_run() will be needed to use Word's
-        # built-in Hyperlink style. Can add_hyperlink() be
+        # built-in Hyperlink style. Can HyperlinkBuilder.add() be
         # modified to use add_run() and to add the hyperlink
         # to that?
 
-        # NOTE: Any note created directly in Annotations in the Gospel Library
-        # app or Gospel Library Online will have an "undefined" source
-        # location.
-        if note.source_location == "undefined":
-            reference = "Source"
-        else:
-            # Build the source references using the source location URL.
-            mapped_names = load_json(DATA_PATH / "data_maps.json")
-            extracted_reference = extract_study_data(
-                note.source_location,
-                mapped_names,
-            )
-            reference = build_study_references(extracted_reference)
+        reference = resolver.resolve(group.source_location)
 
-        p = doc.add_paragraph(style="Link")
-        _add_hyperlink(p, note.source_location, reference)
+        p = add_paragraph("", _style(styles, "Link"))
+        if group.source_location:
+            hyperlinks.add(p, group.source_location, reference)
 
     # Add document properties
     doc.core_properties.author = getpass.getuser()
@@ -109,72 +90,958 @@ def write_to_docx(
     doc.save(str(output_path))
 
 
+def stream_to_docx(
+    notes,
+    output_path: Union[str, Path],
+    template_path: Union[str, Path, None],
+    time_zone: str = DEFAULT_TIMEZONE,
+    fragment_store=None,
+    grouping: bool = True,
+):
+    """Write notes to a styled Word document one note at a time.
+
+    Unlike `write_to_docx`, the document is never held in memory: the
+    template's parts are copied once, each note's paragraphs are written
+    straight into `word/document.xml` and the hyperlink relationships are
+    written last.
+
+    Parameters
+    ----------
+    notes : An iterable of `note` objects.
+    output_path : The location to save the Word document.
+    template_path : A path to a Word document template.
+        `None` means that the default template will be used.
+    time_zone : The name of the time zone in which dates are displayed.
+    fragment_store : A `NoteStore` in which each note's rendered paragraphs
+        are cached. Notes whose paragraphs are already cached for the same
+        template and time zone are not rendered again.
+    grouping : Whether the notes sharing a reference are written under a
+        single heading, with their dates separating their bodies.
+
+    Returns
+    -------
+    A styled Word document in the given `output_path`.
+    """
+    template = read_template(template_path)
+    start, end = template.start, template.end
+    styles = template.styles
+
+    resolver = get_reference_resolver()
+    formatter = get_timestamp_formatter(time_zone)
+
+    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as target:
+        for filename, date_time, data in template.parts:
+            target.writestr(
+                zipfile.ZipInfo(filename, date_time),
+                data,
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+
+        # Parsed for each document, as the links are added to it.
+        relationships = etree.fromstring(template.relationships)
+        hyperlinks = _HyperlinkRelationships(relationships)
+        fragments = None
+        if fragment_store is not None:
+            fragments = fragment_store.fragments(
+                _render_key(styles, time_zone, resolver.fingerprint)
+            )
+
+        with target.open(DOCUMENT_PART, "w") as document:
+            buffer = _Buffer(document)
+            buffer.write(start)
+            buffer.write(
+                _paragraph_xml(Path(output_path).stem, _style(styles, "Title"))
+            )
+            groups = group_notes(notes, combine=grouping)
+            for chunk in _chunks(groups, FRAGMENT_CHUNK_SIZE):
+                chunk_notes = [note for group in chunk for note in group.notes]
+                rendered = iter(
+                    _render_notes(chunk_notes, fragments, formatter, styles)
+                )
+                for group in chunk:
+                    # The group's heading and link are its first note's.
+                    for value, (heading, body, link) in enumerate(
+                        islice(rendered, len(group.notes))
+                    ):
+                        if value == 0:
+                            buffer.write(heading)
+                            group_link = link
+                        buffer.write(body)
+
+                    head, placeholder, tail = group_link.partition(RELATIONSHIP_ID)
+                    buffer.write(head)
+                    if placeholder:
+                        buffer.write(hyperlinks.get(group.source_location))
+                        buffer.write(tail)
+            buffer.write(end)
+            buffer.flush()
+
+        if fragments is not None:
+            fragments.commit()
+
+        with target.open(DOCUMENT_RELS_PART, "w") as rels:
+            buffer = _Buffer(rels)
+            for chunk in hyperlinks.to_xml():
+                buffer.write(chunk)
+            buffer.flush()
+
+
+def write_to_txt(
+    notes,
+    output_path: Union[str, Path],
+    time_zone: str = DEFAULT_TIMEZONE,
+    grouping: bool = True,
+):
+    """Write notes to a plain text file, one note at a time.
+
+    Parameters
+    ----------
+    notes : An iterable of `note` objects.
+    output_path : The location to save the file.
+    time_zone : The name of the time zone in which dates are displayed.
+    grouping : Whether the notes sharing a reference are written under a
+        single title, with their dates separating their bodies.
+    """
+    _write_text(notes, output_path, _txt_group, time_zone, grouping)
+
+
+def write_to_markdown(
+    notes,
+    output_path: Union[str, Path],
+    time_zone: str = DEFAULT_TIMEZONE,
+    grouping: bool = True,
+):
+    """Write notes to a Markdown file, one note at a time.
+
+    The file is titled after its name. Each group of notes has a heading,
+    followed by the date of each note in italics and its paragraphs, and
+    ends with a link to its reference.
+
+    Parameters
+    ----------
+    notes : An iterable of `note` objects.
+    output_path : The location to save the file.
+    time_zone : The name of the time zone in which dates are displayed.
+    grouping : Whether the notes sharing a reference are written under a
+        single heading, with their dates separating their bodies.
+    """
+    title = _markdown_text(Path(output_path).stem)
+    _write_text(
+        notes, output_path, _markdown_group, time_zone, grouping, start=f"# {title}\n"
+    )
+
+
+def write_to_html(
+    notes,
+    output_path: Union[str, Path],
+    time_zone: str = DEFAULT_TIMEZONE,
+    grouping: bool = True,
+):
+    """Write notes to an HTML page, one note at a time.
+
+    Each group of notes is a `section`, and its paragraphs have the classes
+    of the styles of a Word document: `date`, `head` for the first paragraph
+    of a note, and `link`.
+
+    Parameters
+    ----------
+    notes : An iterable of `note` objects.
+    output_path : The location to save the page.
+    time_zone : The name of the time zone in which dates are displayed.
+    grouping : Whether the notes sharing a reference are written under a
+        single heading, with their dates separating their bodies.
+    """
+    title = escape(Path(output_path).stem)
+    _write_text(
+        notes,
+        output_path,
+        _html_group,
+        time_zone,
+        grouping,
+        start=_HTML_START.format(title=title),
+        end=_HTML_END,
+    )
+
+
+def write_to_jsonl(
+    notes,
+    output_path: Union[str, Path],
+    time_zone: str = DEFAULT_TIMEZONE,
+    grouping: bool = True,
+):
+    """Write notes to a JSON Lines file, one note at a time.
+
+    Each line is an object holding the title, source location and reference
+    of a group of notes, and its `notes`, each with its fields, its
+    paragraphs as `text`, its timestamps in ISO 8601 and in UTC, and its
+    `date` as displayed in documents.
+
+    Parameters
+    ----------
+    notes : An iterable of `note` objects.
+    output_path : The location to save the file.
+    time_zone : The name of the time zone in which dates are displayed.
+    grouping : Whether the notes sharing a reference are written on a
+        single line. Otherwise, each line holds a single note.
+    """
+    _write_text(notes, output_path, _jsonl_group, time_zone, grouping)
+
+
+class OutputWriter(NamedTuple):
+    """The functions writing notes in an output format.
+
+    `write` writes notes held in memory, and `stream` writes them one at a
+    time, without holding the document in memory. Both take the notes, the
+    output path, `time_zone` and `grouping`.
+
+    Parameters
+    ----------
+    name : The name of the format, as given to `--format`.
+    suffixes : The extensions of the format's files, the first being the
+        one added to an output path without one.
+    write : The writer of notes held in memory.
+    stream : The writer of notes read one at a time.
+    templated : Whether the writers take a `template_path`.
+    fragments : Whether `stream` takes a `fragment_store`.
+    """
+
+    name: str
+    suffixes: Tuple[str, ...]
+    write: Callable
+    stream: Callable
+    templated: bool = False
+    fragments: bool = False
+
+
+WRITERS: Dict[str, OutputWriter] = {}
+
+
+def register_writer(writer: OutputWriter) -> None:
+    """Make `writer` available by its name and by the extensions of its
+    format, replacing any writer of the same name."""
+    WRITERS[writer.name] = writer
+
+
+def get_writer(
+    name: Union[str, None] = None, output_path: Union[str, Path, None] = None
+) -> OutputWriter:
+    """Return the writer of the format `name` or, without a name, of the
+    extension of `output_path`. Word documents are written for any other
+    extension.
+
+    Raises
+    ------
+    ValueError : If no writer is registered under `name`.
+    """
+    if name is not None:
+        try:
+            return WRITERS[name]
+        except KeyError:
+            raise ValueError(f"unknown output format: '{name}'") from None
+    suffix = Path(output_path).suffix.lower() if output_path else ""
+    for writer in WRITERS.values():
+        if suffix in writer.suffixes:
+            return writer
+    return WRITERS["docx"]
+
+
+for _writer in (
+    OutputWriter(
+        "docx",
+        (".docx",),
+        write_to_docx,
+        stream_to_docx,
+        templated=True,
+        fragments=True,
+    ),
+    # The text formats are always written one note at a time.
+    OutputWriter("md", (".md", ".markdown"), write_to_markdown, write_to_markdown),
+    OutputWriter("html", (".html", ".htm"), write_to_html, write_to_html),
+    OutputWriter("jsonl", (".jsonl",), write_to_jsonl, write_to_jsonl),
+    OutputWriter("txt", (".txt",), write_to_txt, write_to_txt),
+):
+    register_writer(_writer)
+
+
 # write_to_docx() helper functions
 
 
-def _convert_datetime(note_time: str) -> str:
-    """Convert the time to a human-readable format."""
-    default_time = datetime.fromisoformat(note_time.replace("Z", "+00:00"))
-    dt = default_time.replace(tzinfo=pytz.utc)
-    pacific_tz = pytz.timezone("America/Los_Angeles")
-    dt_pacific = dt.astimezone(pacific_tz)
-    return dt_pacific.strftime("%B %d, %Y, %I:%M %p %Z")
+def _get_template(template_path: Union[str, Path, None]) -> Path:
+    """Return the custom template, if it is valid, or the default one."""
+    if template_path:
+        template = Path(template_path)
+        valid_template = template.exists() and template.suffix == ".docx"
+        if valid_template:
+            return template
+    return TEMPLATE_PATH / "default.docx"
+
 
+# The characters that python-docx writes as elements of a run.
+_run_breaks = re.compile("[\t\r\n]")
 
-def _add_hyperlink(paragraph, url, text, color="#0000EE", underline=None):
-    """Place a hyperlink within a `paragraph` object.
+
+class HyperlinkBuilder:
+    """Place hyperlinks within the paragraphs of a python-docx document.
+
+    python-docx's `part.relate_to` scans every relationship of the document
+    to find one to the same url and to pick the next id, which makes adding
+    links quadratic. Here, the ids are kept in a `dict` by url, and the
+    run properties are built once and copied into each link.
 
     Parameters
     ----------
-    paragraph : The `paragraph` object to which to add the hyperlink.
-    url : A string containing a given url.
-    text : The text displayed for the url.
-    color : The color of the hyperlink.
+    part : The document's main part, such as `doc.part`.
+    color : The color of the hyperlinks.
     underline : Whether an underline is applied.
+    """
 
-    Returns
-    -------
-    A `hyperlink` object with the hyperlink
+    def __init__(self, part, color="#0000EE", underline=None) -> None:
+        from docx.oxml import OxmlElement
+        from docx.oxml.ns import qn
+
+        self._rels = part.rels
+        self._ids: Dict[str, str] = {
+            rel.target_ref: r_id
+            for r_id, rel in self._rels.items()
+            if rel.is_external and rel.reltype == HYPERLINK_RELATIONSHIP
+        }
+        numbers = [
+            int(r_id[3:])
+            for r_id in self._rels
+            if r_id.startswith("rId") and r_id[3:].isdigit()
+        ]
+        self._next_id = max(numbers, default=0) + 1
+
+        # Create a w:rPr element:
+        self._rPr = OxmlElement("w:rPr")
+
+        # Add provided color (if any):
+        if color:
+            c = OxmlElement("w:color")
+            c.set(qn("w:val"), color.lstrip("#"))
+            self._rPr.append(c)
+
+        # Remove underline if requested:
+        u = OxmlElement("w:u")
+        u.set(qn("w:val"), "single" if underline else "none")
+        self._rPr.append(u)
+
+        # A run with the run properties and an empty text, for plain text.
+        self._run = OxmlElement("w:r")
+        self._run.append(copy.deepcopy(self._rPr))
+        self._run.append(OxmlElement("w:t"))
+
+        self._r_id = qn("r:id")
+        self._space = qn("xml:space")
+        self._oxml_element = OxmlElement
+
+    def relate(self, url: str) -> str:
+        """Return the relationship id of `url`, adding it if it is new."""
+        r_id = self._ids.get(url)
+        if r_id is None:
+            r_id = f"rId{self._next_id}"
+            self._next_id += 1
+            self._rels.add_relationship(
+                HYPERLINK_RELATIONSHIP, url, r_id, is_external=True
+            )
+            self._ids[url] = r_id
+        return r_id
+
+    def add(self, paragraph, url: str, text: str):
+        """Place a hyperlink to `url` showing `text` within `paragraph`.
+
+        Returns
+        -------
+        The `w:hyperlink` element.
+        """
+        # Create the w:hyperlink tag and add needed values:
+        hyperlink = self._oxml_element("w:hyperlink")
+        hyperlink.set(self._r_id, self.relate(url))
+
+        # Join all xml elements and add hyperlink text to w:r element:
+        if text and not _run_breaks.search(text):
+            # The same elements as python-docx's `run.text`, which appends the
+            # text one character at a time.
+            new_run = copy.deepcopy(self._run)
+            new_run[-1].text = text
+            if len(text.strip()) < len(text):
+                new_run[-1].set(self._space, "preserve")
+        else:
+            # Tabs and line breaks are elements of their own.
+            new_run = self._oxml_element("w:r")
+            new_run.append(copy.deepcopy(self._rPr))
+            new_run.text = text
+        hyperlink.append(new_run)
+
+        paragraph._p.append(hyperlink)
+
+        return hyperlink
+
+
+class _ParagraphAdder:
+    """Add paragraphs to the end of a python-docx document, like
+    `doc.add_paragraph`, given the id of their style rather than its name.
+
+    Parameters
+    ----------
+    doc : A python-docx `Document`.
+    """
+
+    def __init__(self, doc) -> None:
+        from docx.oxml import OxmlElement
+        from docx.oxml.ns import qn
+        from docx.text.paragraph import Paragraph
+
+        self._body = doc._body
+        # python-docx finds the section properties, which end the body, for
+        # each paragraph by scanning the body. They are found once here.
+        self._section = self._body._element.find(qn("w:sectPr"))
+        self._oxml_element = OxmlElement
+        self._paragraph = Paragraph
+
+    def __call__(self, text: str, style_id: Union[str, None]):
+        """Add a paragraph showing `text`, in the style `style_id` or in the
+        default paragraph style if it is `None`.
+
+        Returns
+        -------
+        The new `Paragraph`.
+        """
+        p = self._oxml_element("w:p")
+        if self._section is not None:
+            self._section.addprevious(p)
+        else:
+            self._body._element.append(p)
+        # Like python-docx, which leaves an empty `w:pPr` for the default
+        # paragraph style.
+        p.style = style_id
+        paragraph = self._paragraph(p, self._body)
+        if text:
+            paragraph.add_run(text)
+        return paragraph
+
+
+# stream_to_docx() helper functions
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+STYLES_PART = "word/styles.xml"
+CORE_PROPERTIES_PART = "docProps/core.xml"
+
+# The namespace of WordprocessingML and the type of hyperlink relationships,
+# so that python-docx is not imported to stream documents.
+WORD_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+HYPERLINK_RELATIONSHIP = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink"
+)
+
+# The paragraph styles every template must have: those of the document's
+# title, of the groups' headings, and of the notes and their links.
+REQUIRED_STYLES = ("Title", "heading 1", "Head", "Normal", "Date", "Link")
+
+# Change whenever the paragraphs rendered for a note change, so that the
+# fragments cached by earlier versions are not reused.
+FRAGMENT_VERSION = 2
+# Stands in for a link's relationship id while a note is rendered.
+RELATIONSHIP_ID = "{r:id}"
+# The number of notes whose cached paragraphs are looked up at once.
+FRAGMENT_CHUNK_SIZE = 500
+
+# Characters that are not allowed in an XML document.
+_invalid_xml_chars = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_body_marker = "notes"
+
+
+class TemplateParts(NamedTuple):
+    """The parts of a template read by `stream_to_docx`.
+
+    `parts` holds the name, date and content of the parts copied to each
+    document. `start` and `end` surround the notes in `word/document.xml`.
+    """
+
+    parts: Tuple[Tuple[str, Tuple[int, ...], bytes], ...]
+    start: str
+    end: str
+    styles: Dict[str, Union[str, None]]
+    relationships: bytes
+
+
+def read_template(template_path: Union[str, Path, None]) -> TemplateParts:
+    """Return the parts of the template, read once per process for as long
+    as the file does not change."""
+    return _templates.get(template_path).parts
+
+
+class _CachedTemplate:
+    """A template file, its parts and, once `write_to_docx` needs it, the
+    template saved without its content by python-docx."""
+
+    __slots__ = ("mtime_ns", "size", "digest", "data", "parts", "document")
+
+    def __init__(self, stat, digest: str, data: bytes, parts: TemplateParts):
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.digest = digest
+        self.data = data
+        self.parts = parts
+        self.document: Union[bytes, None] = None
+
+
+class TemplateCache:
+    """Read, validate and parse each template once.
+
+    A template is read again when its modification time or size changes,
+    and only parsed again when its content changed too.
+
+    Parameters
+    ----------
+    maxsize : The number of templates kept.
     """
-    # Get access to the document.xml.rels file and get a new relation id value:
-    part = paragraph.part
-    r_id = part.relate_to(
-        url,
-        RELATIONSHIP_TYPE.HYPERLINK,
-        is_external=True,
+
+    def __init__(self, maxsize: int = 8) -> None:
+        self.maxsize = maxsize
+        self._templates: Dict[Path, _CachedTemplate] = {}
+
+    def get(self, template_path: Union[str, Path, None]) -> _CachedTemplate:
+        path = _get_template(template_path)
+        cached = self._templates.pop(path, None)
+        try:
+            stat = path.stat()
+            changed = cached is None or (cached.mtime_ns, cached.size) != (
+                stat.st_mtime_ns,
+                stat.st_size,
+            )
+            data = path.read_bytes() if changed else b""
+        except OSError:
+            raise NoAvailableTemplate
+
+        if changed:
+            digest = hashlib.sha1(data).hexdigest()
+            if cached is None or cached.digest != digest:
+                cached = _CachedTemplate(
+                    stat, digest, data, _parse_template(data, path)
+                )
+            else:
+                # Touched, or copied over with the same content.
+                cached.mtime_ns, cached.size = stat.st_mtime_ns, stat.st_size
+
+        # The most recently used templates are last.
+        self._templates[path] = cached
+        while len(self._templates) > self.maxsize:
+            del self._templates[next(iter(self._templates))]
+        return cached
+
+    def document(self, template_path: Union[str, Path, None]):
+        """Return a new python-docx `Document` of the template, without its
+        content."""
+        # python-docx is slow to import and only used by `write_to_docx`.
+        from docx import Document
+
+        cached = self.get(template_path)
+        if cached.document is None:
+            document = Document(io.BytesIO(cached.data))
+            document._body.clear_content()
+            buffer = io.BytesIO()
+            document.save(buffer)
+            cached.document = buffer.getvalue()
+        # Documents cannot be copied with `copy.deepcopy`, which loses the
+        # link between the package and the document's XML, so each one is
+        # opened from memory.
+        return Document(io.BytesIO(cached.document))
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+
+def _parse_template(data: bytes, path: Path) -> TemplateParts:
+    """Read the parts of a template and check that it has the styles of the
+    notes."""
+    try:
+        source = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise NoAvailableTemplate
+
+    with source:
+        try:
+            styles = _read_style_ids(source.read(STYLES_PART))
+            start, end = _split_document(source.read(DOCUMENT_PART))
+            relationships = source.read(DOCUMENT_RELS_PART)
+        except (KeyError, etree.XMLSyntaxError) as e:
+            raise InvalidTemplate(f"'{path}' is not a Word document: {e}")
+        missing = [name for name in REQUIRED_STYLES if name not in styles]
+        if missing:
+            raise InvalidTemplate(
+                f"'{path}' has no {', '.join(missing)} paragraph style"
+            )
+
+        parts = []
+        for info in source.infolist():
+            if info.filename not in (DOCUMENT_PART, DOCUMENT_RELS_PART):
+                data = source.read(info)
+                if info.filename == CORE_PROPERTIES_PART:
+                    data = _update_core_properties(data)
+                parts.append((info.filename, info.date_time, data))
+    return TemplateParts(
+        parts=tuple(parts),
+        start=start,
+        end=end,
+        styles=styles,
+        relationships=relationships,
     )
 
-    # Create the w:hyperlink tag and add needed values:
-    hyperlink = OxmlElement("w:hyperlink")
-    hyperlink.set(qn("r:id"), r_id)
 
-    # Create a w:r element:
-    new_run = OxmlElement("w:r")
+_templates = TemplateCache()
 
-    # Create a w:rPr element:
-    rPr = OxmlElement("w:rPr")
 
-    # Add provided color (if any):
-    if color:
-        c = OxmlElement("w:color")
-        c.set(qn("ct:val"), color)
-        rPr.append(c)
+class _Buffer:
+    """Gather small strings and write them to `file` in large blocks."""
 
-    # Remove underline if requested:
-    if underline:
-        u = OxmlElement("w:u")
-        u.set(qn("ct:val"), "single")
-        rPr.append(u)
+    def __init__(self, file, size: int = 1 << 16) -> None:
+        self._file = file
+        self._size = size
+        self._parts: List[str] = []
+        self._length = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._length += len(text)
+        if self._length >= self._size:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.write("".join(self._parts).encode("utf-8"))
+        self._parts = []
+        self._length = 0
+
+
+class _HyperlinkRelationships:
+    """Assign one relationship id per unique url and serialize them
+    after the template's own relationships."""
+
+    def __init__(self, relationships) -> None:
+        self._relationships = relationships
+        self._ids: Dict[str, str] = {}
+        existing = [
+            int(rel.get("Id")[3:])
+            for rel in relationships
+            if rel.get("Id", "").startswith("rId") and rel.get("Id")[3:].isdigit()
+        ]
+        self._next_id = max(existing, default=0) + 1
+
+    def get(self, url: str) -> str:
+        r_id = self._ids.get(url)
+        if r_id is None:
+            r_id = f"rId{self._next_id}"
+            self._next_id += 1
+            self._ids[url] = r_id
+        return r_id
+
+    def to_xml(self):
+        self._relationships.append(etree.Comment(_body_marker))
+        start, end = _serialize(self._relationships).split(f"<!--{_body_marker}-->")
+        yield start
+        for url, r_id in self._ids.items():
+            yield (
+                f'<Relationship Id="{r_id}" Type="{HYPERLINK_RELATIONSHIP}" '
+                f'Target={quoteattr(_clean(url))} TargetMode="External"/>'
+            )
+        yield end
+
+
+def _chunks(notes, size: int):
+    """Yield lists of up to `size` notes."""
+    notes = iter(notes)
+    while True:
+        chunk = list(islice(notes, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _split_document(document: bytes) -> Tuple[str, str]:
+    """Return the template's `document.xml` without its content, split where
+    the notes are to be inserted. The section properties are kept."""
+    root = etree.fromstring(document)
+    body = root.find(_qn("w:body"))
+    section = body.find(_qn("w:sectPr"))
+    for child in list(body):
+        body.remove(child)
+    body.append(etree.Comment(_body_marker))
+    if section is not None:
+        body.append(section)
+
+    start, end = _serialize(root).split(f"<!--{_body_marker}-->")
+    return start, end
+
+
+def _qn(tag: str) -> str:
+    """Return the qualified name of a `w:` tag, like python-docx's `qn`."""
+    return f"{{{WORD_NAMESPACE}}}{tag[2:]}"
+
+
+def _serialize(root) -> str:
+    return etree.tostring(
+        root, encoding="UTF-8", xml_declaration=True, standalone=True
+    ).decode("utf-8")
+
+
+def _read_style_ids(styles: bytes) -> Dict[str, Union[str, None]]:
+    """Map paragraph style names to their ids. The default paragraph style
+    maps to `None`, as it needs no explicit style."""
+    style_ids: Dict[str, Union[str, None]] = {}
+    for style in etree.fromstring(styles).iterfind(_qn("w:style")):
+        name = style.find(_qn("w:name"))
+        if style.get(_qn("w:type")) != "paragraph" or name is None:
+            continue
+        is_default = style.get(_qn("w:default")) in ("1", "true", "on")
+        style_ids[name.get(_qn("w:val"))] = (
+            None if is_default else style.get(_qn("w:styleId"))
+        )
+    return style_ids
+
+
+def _update_core_properties(core: bytes) -> bytes:
+    """Add the same document properties as `write_to_docx`."""
+    root = etree.fromstring(core)
+    nsmap = {"dc": "http://purl.org/dc/elements/1.1/"}
+    for tag, value in (
+        ("creator", getpass.getuser()),
+        ("description", "Document generated by a script."),
+    ):
+        element = root.find(f"dc:{tag}", nsmap)
+        if element is None:
+            element = etree.SubElement(root, f"{{{nsmap['dc']}}}{tag}")
+        element.text = value
+    return _serialize(root).encode("utf-8")
+
+
+def _style(styles: Dict[str, Union[str, None]], name: str) -> Union[str, None]:
+    try:
+        return styles[name]
+    except KeyError:
+        raise KeyError(f"no style with name '{name}'")
+
+
+def _render_notes(notes, fragments, formatter, styles) -> List[Tuple[str, str, str]]:
+    """Render the paragraphs of each note in `notes`, or read them from
+    `fragments` if they are cached there."""
+    if fragments is None:
+        cached = [None] * len(notes)
     else:
-        u = OxmlElement("w:u")
-        u.set(qn("ct:val"), "none")
-        rPr.append(u)
+        cached = fragments.get_many(notes)
+    rendered = []
+    for note, fragment in zip(notes, cached):
+        if fragment is None:
+            fragment = _note_xml(note, formatter, styles)
+            if fragments is not None:
+                fragments.put(note, fragment)
+        rendered.append(fragment)
+    return rendered
+
+
+def _note_xml(note, formatter, styles) -> Tuple[str, str, str]:
+    """Render a note's heading, its date and body, and the link to its
+    reference, as paragraphs.
+
+    The heading and link are returned apart, as the notes of a group share
+    the heading and link of the first one.
+    """
+    parts = [_paragraph_xml(formatter.format(note.created), _style(styles, "Date"))]
+    for value, body in enumerate(note.note_text):
+        # Allow for no text indent on first paragraph.
+        style = "Head" if value == 0 else "Normal"
+        parts.append(_paragraph_xml(body, _style(styles, style)))
+    heading = _paragraph_xml(note.title, _style(styles, "heading 1"))
+    return heading, "".join(parts), _link_xml(note.source_location, styles)
+
+
+def _link_xml(source_location: str, styles) -> str:
+    """Render the link to `source_location` as a paragraph.
+
+    The relationship id of the link is only known once the whole document
+    is written, so `RELATIONSHIP_ID` stands in for it. A note without a
+    location has nothing to link to, and gets an empty paragraph.
+    """
+    if not source_location:
+        return _paragraph_xml("", _style(styles, "Link"))
+    reference = get_reference_resolver().resolve(source_location)
+    return _paragraph_xml(
+        f'<w:hyperlink r:id="{RELATIONSHIP_ID}"><w:r><w:rPr>'
+        '<w:color w:val="0000EE"/><w:u w:val="none"/>'
+        f"</w:rPr>{_text_xml(reference)}</w:r></w:hyperlink>",
+        _style(styles, "Link"),
+        is_xml=True,
+    )
+
+
+def _render_key(styles, time_zone: str, fingerprint: str) -> str:
+    """Return a digest of everything that a note's paragraphs depend on
+    apart from the note itself."""
+    settings = json.dumps(
+        [FRAGMENT_VERSION, sorted(styles.items()), time_zone, fingerprint]
+    )
+    return hashlib.sha1(settings.encode("utf-8")).hexdigest()
+
+
+def _paragraph_xml(
+    content: str, style_id: Union[str, None], is_xml: bool = False
+) -> str:
+    properties = (
+        f"<w:pPr><w:pStyle w:val={quoteattr(style_id)}/></w:pPr>" if style_id else ""
+    )
+    if not is_xml:
+        content = f"<w:r>{_text_xml(content)}</w:r>" if content else ""
+    return f"<w:p>{properties}{content}</w:p>"
+
+
+def _text_xml(text: str) -> str:
+    """Render `text` as the contents of a `w:r` element, as
+    `python-docx` would."""
+    parts = []
+    for value, segment in enumerate(_clean(text).split("\t")):
+        if value:
+            parts.append("<w:tab/>")
+        if not segment:
+            continue
+        space = (
+            ' xml:space="preserve"'
+            if segment[0].isspace() or segment[-1].isspace()
+            else ""
+        )
+        parts.append(f"<w:t{space}>{escape(segment)}</w:t>")
+    return "".join(parts)
+
+
+def _clean(text: str) -> str:
+    return _invalid_xml_chars.sub("", text)
+
+
+# Text writers' helper functions
+
+_HTML_START = (
+    '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+    "<title>{title}</title>\n</head>\n<body>\n<h1>{title}</h1>\n"
+)
+_HTML_END = "</body>\n</html>\n"
+
+# The characters with a meaning within Markdown's text, and the markers
+# that would start a list, a quote or a heading at the start of a paragraph.
+_markdown_special = re.compile(r"([\\`*_~\[\]<>|])")
+_markdown_block = re.compile(r"(\s*\d*)([.)#>+=-])")
+
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _write_text(
+    notes,
+    output_path: Union[str, Path],
+    render: Callable,
+    time_zone: str,
+    grouping: bool,
+    start: str = "",
+    end: str = "",
+) -> None:
+    """Write each group of notes, as rendered by `render`, between `start`
+    and `end`, gathering them into large writes."""
+    resolve = get_reference_resolver().resolve
+    format_date = get_timestamp_formatter(time_zone).format
+    with open(output_path, "wb") as f:
+        buffer = _Buffer(f)
+        buffer.write(start)
+        for group in group_notes(notes, combine=grouping):
+            buffer.write(render(group, resolve, format_date))
+        buffer.write(end)
+        buffer.flush()
+
+
+def _txt_group(group, resolve, format_date) -> str:
+    parts = [f"\n\n{group.title}\n"]
+    for note in group.notes:
+        parts.append(f"{format_date(note.created)}\n\n")
+        parts.extend(f"{body} " for body in note.note_text)
+        parts.append("\n")
+    parts.append(group.source_location)
+    return "".join(parts)
+
+
+def _markdown_group(group, resolve, format_date) -> str:
+    parts = [f"\n## {_markdown_text(group.title)}\n"]
+    for note in group.notes:
+        date = format_date(note.created)
+        if date:
+            parts.append(f"\n*{_markdown_text(date)}*\n")
+        parts.extend(f"\n{_markdown_text(body)}\n" for body in note.note_text)
+    reference = _markdown_text(resolve(group.source_location))
+    if _has_link(group.source_location):
+        url = _markdown_url(group.source_location)
+        parts.append(f"\n[{reference}]({url})\n")
+    else:
+        parts.append(f"\n{reference}\n")
+    return "".join(parts)
+
+
+def _html_group(group, resolve, format_date) -> str:
+    parts = [f"<section>\n<h2>{escape(group.title)}</h2>\n"]
+    for note in group.notes:
+        parts.append(f'<p class="date">{escape(format_date(note.created))}</p>\n')
+        for value, body in enumerate(note.note_text):
+            # The first paragraph has no text indent, as in Word documents.
+            tag = '<p class="head">' if value == 0 else "<p>"
+            parts.append(f"{tag}{escape(body)}</p>\n")
+    reference = escape(resolve(group.source_location))
+    if _has_link(group.source_location):
+        reference = f"<a href={quoteattr(group.source_location)}>{reference}</a>"
+    parts.append(f'<p class="link">{reference}</p>\n</section>\n')
+    return "".join(parts)
+
+
+def _jsonl_group(group, resolve, format_date) -> str:
+    record = {
+        "title": group.title,
+        "source_location": group.source_location,
+        "reference": resolve(group.source_location),
+        "notes": [
+            {
+                "type": note.type,
+                "created": _iso_timestamp(note.created),
+                "last_updated": _iso_timestamp(note.last_updated),
+                "date": format_date(note.created),
+                "text": note.note_text,
+                "tags": [name for name in note.tags if name],
+                "notebooks": [name for name in note.notebooks if name],
+                "study_set": note.study_set,
+                "highlight": note.highlight,
+            }
+            for note in group.notes
+        ],
+    }
+    return _json_encode(record) + "\n"
+
+
+def _markdown_text(text: str) -> str:
+    """Escape the characters of `text` that Markdown would read as markup."""
+    # Most text has nothing to escape, which is found without `re.sub`.
+    if _markdown_special.search(text):
+        text = _markdown_special.sub(r"\\\1", text)
+    if _markdown_block.match(text):
+        text = _markdown_block.sub(r"\1\\\2", text, count=1)
+    return text
+
+
+def _markdown_url(url: str) -> str:
+    """Encode the characters that would end a Markdown link's url."""
+    return url.replace(" ", "%20").replace("(", "%28").replace(")", "%29")
+
 
-    # Join all xml elements and add hyperlink text to w:r element:
-    new_run.append(rPr)
-    new_run.text = text
-    hyperlink.append(new_run)
+def _has_link(source_location: str) -> bool:
+    """Whether a source location is a url, unlike the `undefined` location
+    of notes created in Annotations."""
+    return source_location.startswith(("https://", "http://"))
 
-    paragraph._p.append(hyperlink)
 
-    return hyperlink
+def _iso_timestamp(timestamp: Union[int, None]) -> Union[str, None]:
+    """Format seconds since the epoch as an ISO 8601 timestamp in UTC, as
+    exported by Gospel Library."""
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
@@ -0,0 +1,109 @@
+"""Check that notes read back from a note cache are the notes written to it,
+and that a cache is only used for the inputs it was written from."""
+
+import csv
+import json
+
+import pytest
+from generate_export import HEADER, generate_rows
+
+from notes_converter.converter import NotesConverter
+from notes_converter.utils.caches import (
+    note_cache_digest,
+    open_note_cache,
+    write_note_cache,
+)
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.converters import Note
+from notes_converter.utils.parallel import load_notes
+from notes_converter.utils.sorters import sort_notes_by_reference
+
+# Tags and notebooks are compared by name, as their ids are the catalog's.
+FIELDS = [
+    field
+    for field in Note.__slots__
+    if field not in ("tag_ids", "notebook_ids", "catalog")
+]
+
+
+def write_rows(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return path
+
+
+@pytest.fixture
+def export(tmp_path):
+    rows = list(generate_rows(800, seed=7, duplicates=0.05))
+    # Notes without a location, tags, notebooks or timestamps.
+    rows[0][3:6] = ["", "", ""]
+    rows[1][7:9] = ["", ""]
+    return write_rows(tmp_path / "notes.csv", rows)
+
+
+def test_cached_notes_are_the_notes_written(export, tmp_path):
+    notes = sort_notes_by_reference(load_notes([export], FIELD_NAMES))
+    digest = note_cache_digest([export])
+    path = tmp_path / "notes.cache"
+    assert write_note_cache(path, notes, digest) == len(notes)
+
+    with open_note_cache(path, digest) as cache:
+        cached = list(cache)
+        assert len(cache) == len(cached) == len(notes)
+        assert cache[len(cache) - 1].as_record() == notes[-1].as_record()
+
+    for note, read in zip(notes, cached):
+        for field in FIELDS:
+            assert getattr(read, field) == getattr(note, field), field
+        assert read.tags == note.tags
+        assert read.notebooks == note.notebooks
+    assert any(note.last_updated is None for note in cached)
+
+    # The names are interned once, in a single catalog, for all the notes.
+    catalog = cached[0].catalog
+    assert all(note.catalog is catalog for note in cached)
+    assert sorted(catalog.names(range(len(catalog)))) == sorted(
+        {name for note in notes for name in [*note.tags, *note.notebooks]}
+    )
+    for note in cached:
+        assert note.tag_ids == catalog.intern(note.tags)
+        assert note.notebook_ids == catalog.intern(note.notebooks)
+
+
+def test_changed_input_is_not_read_from_the_cache(export, tmp_path):
+    digest = note_cache_digest([export])
+    path = tmp_path / "notes.cache"
+    write_note_cache(path, load_notes([export], FIELD_NAMES), digest)
+    cache = open_note_cache(path, digest)
+    assert cache is not None
+    cache.close()
+
+    with open(export, "a", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerow(next(generate_rows(1, seed=8)))
+    assert open_note_cache(path, note_cache_digest([export])) is None
+    assert open_note_cache(path, note_cache_digest([export], "other maps")) is None
+
+
+def test_conversion_reads_a_changed_input_again(export, tmp_path):
+    def convert():
+        converter = NotesConverter()
+        converter.input_path = [export]
+        converter.output_path = tmp_path / "notes.jsonl"
+        converter.cache_dir = tmp_path / "cache"
+        converter.from_cache = True
+        converter.pipeline = "memory"
+        converter.grouping = False
+        converter.convert()
+        lines = converter.output_path.read_text(encoding="utf-8").splitlines()
+        return [json.loads(line)["title"] for line in lines]
+
+    titles = convert()
+    assert convert() == titles
+
+    row = next(generate_rows(1, seed=8))
+    row[1] = "A note added since"
+    with open(export, "a", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerow(row)
+    assert "A note added since" in convert()
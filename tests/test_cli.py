@@ -0,0 +1,35 @@
+"""Check that invalid command line arguments are rejected, and that valid
+ones are parsed."""
+
+import sys
+
+import pytest
+
+from notes_converter.cli import parse_args
+
+
+def parse(monkeypatch, *arguments):
+    monkeypatch.setattr(sys, "argv", ["notes_converter", "-i", "notes.csv", *arguments])
+    return parse_args()
+
+
+@pytest.mark.parametrize("option", ["--max-notes", "--max-bytes"])
+@pytest.mark.parametrize("value", ["0", "-5", "ten"])
+def test_split_limits_must_be_positive(monkeypatch, capsys, option, value):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, option, value)
+    assert option in capsys.readouterr().err
+
+
+def test_split_limits(monkeypatch):
+    args = parse(monkeypatch, "--max-notes", "500", "--max-bytes", "1")
+    assert (args.max_notes, args.max_bytes) == (500, 1)
+
+
+def test_profile_dump_requires_a_profile(monkeypatch, capsys):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, "--profile-dump", "stage.prof")
+    assert "--profile-dump requires --profile" in capsys.readouterr().err
+
+    args = parse(monkeypatch, "--profile", "report.json", "--profile-dump", "s.prof")
+    assert (args.profile, args.profile_dump) == ("report.json", "s.prof")
@@ -0,0 +1,84 @@
+"""Check that a conversion cancelled while it writes stops, and removes the
+files it partly wrote, and that a cancel made before it starts is kept."""
+
+import pytest
+from generate_export import write_export
+
+from notes_converter.converter import NotesConverter
+from notes_converter.utils.exceptions import ConversionCancelled
+from notes_converter.utils.profilers import ConversionHook
+
+
+class CancelWhileWriting(ConversionHook):
+    """Cancel the conversion once its last stage has processed `rows`."""
+
+    def __init__(self, converter: NotesConverter, rows: int) -> None:
+        self.converter = converter
+        self.rows = rows
+        self.reported = 0
+
+    def stage_progress(self, stage, rows, total) -> None:
+        if stage in ("write", "stream"):
+            self.reported = rows
+            if rows >= self.rows:
+                self.converter.cancel()
+
+
+@pytest.fixture(scope="module")
+def export(tmp_path_factory):
+    return write_export(tmp_path_factory.mktemp("exports") / "notes.csv", 5000)
+
+
+def convert(export, output_path, **options) -> CancelWhileWriting:
+    converter = NotesConverter()
+    converter.input_path = [export]
+    converter.output_path = output_path
+    for name, value in options.items():
+        setattr(converter, name, value)
+    hook = CancelWhileWriting(converter, 2000)
+    converter.add_hook(hook)
+    with pytest.raises(ConversionCancelled):
+        converter.convert()
+    return hook
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"pipeline": "memory"},
+        {"pipeline": "spill"},
+        {"pipeline": "sqlite", "output_format": "md"},
+        {"pipeline": "memory", "max_notes": 500},
+        {"pipeline": "memory", "max_notes": 500, "jobs": 2},
+    ],
+)
+def test_cancelled_conversion_removes_its_output(export, tmp_path, options):
+    hook = convert(export, tmp_path / "notes", **options)
+    # Stopped at the next row, not at the end of the stage.
+    assert hook.reported < 3000
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_earlier_output_is_kept_until_written(export, tmp_path):
+    # The in-memory writer only saves the document once every note is read.
+    earlier = tmp_path / "notes.docx"
+    earlier.write_bytes(b"an earlier conversion")
+    convert(export, earlier, pipeline="memory")
+    assert earlier.read_bytes() == b"an earlier conversion"
+
+    convert(export, earlier, pipeline="spill")
+    assert not earlier.exists()
+
+
+def test_cancel_before_the_conversion_starts_is_kept(export, tmp_path):
+    converter = NotesConverter()
+    converter.input_path = [export]
+    converter.output_path = tmp_path / "notes.md"
+    converter.cancel()
+    with pytest.raises(ConversionCancelled):
+        converter.convert()
+    assert list(tmp_path.iterdir()) == []
+
+    converter.clear_cancel()
+    converter.convert()
+    assert converter.output_path.exists()
@@ -0,0 +1,127 @@
+"""Check that the note store only keeps the notes of its last input, reads an
+unchanged input without parsing it, and writes its cached paragraphs again."""
+
+import csv
+import zipfile
+
+import pytest
+from generate_export import HEADER, generate_rows
+
+from notes_converter.utils import database, writers
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.database import NoteStore
+from notes_converter.utils.filters import NoteFilter
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.writers import (
+    DOCUMENT_PART,
+    DOCUMENT_RELS_PART,
+    stream_to_docx,
+)
+
+ROWS = list(generate_rows(1500, seed=4, duplicates=0.2))
+
+
+def write_rows(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return path
+
+
+def load(store, path, note_filter=None):
+    sort_key = get_reference_resolver().sort_key
+    return [
+        note.as_record() for note in store.load_notes([path], sort_key, note_filter)
+    ]
+
+
+def count(store, table: str) -> int:
+    return store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def write(store, path, tmp_path):
+    sort_key = get_reference_resolver().sort_key
+    notes = sorted(store.load_notes([path], sort_key), key=lambda n: n.sort_key)
+    stream_to_docx(notes, tmp_path / "notes.docx", None, fragment_store=store)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with NoteStore(tmp_path / "store.sqlite3", FIELD_NAMES) as store:
+        yield store
+
+
+def test_removed_rows_are_pruned(store, tmp_path):
+    export = write_rows(tmp_path / "notes.csv", ROWS)
+    write(store, export, tmp_path)
+    notes, fragments = count(store, "Notes"), count(store, "Fragments")
+
+    smaller = write_rows(tmp_path / "notes.csv", ROWS[:500])
+    expected = load(NoteStore(tmp_path / "other.sqlite3", FIELD_NAMES), smaller)
+    assert load(store, smaller) == expected
+    assert 0 < count(store, "Notes") < notes
+    assert 0 < count(store, "Fragments") < fragments
+    # Only the paragraphs of the notes still stored are kept.
+    assert store.conn.execute(
+        "SELECT COUNT(*) FROM Fragments "
+        "WHERE hash NOT IN (SELECT note_hash FROM Notes)"
+    ).fetchone() == (0,)
+
+
+def test_filtered_rows_are_kept(store, tmp_path):
+    export = write_rows(tmp_path / "notes.csv", ROWS)
+    load(store, export)
+    notes = count(store, "Notes")
+
+    # Changed, so that the rows are parsed and filtered again.
+    export = write_rows(tmp_path / "notes.csv", ROWS[:-1])
+    assert load(store, export, NoteFilter(since="2018-02-01"))
+    assert count(store, "Notes") >= notes - 1
+
+
+def test_unchanged_input_is_not_parsed(store, tmp_path, monkeypatch):
+    export = write_rows(tmp_path / "notes.csv", ROWS)
+    note_filter = NoteFilter(tags=["Faith"], since="2018-02-01")
+    other = NoteStore(tmp_path / "other.sqlite3", FIELD_NAMES)
+    filtered = load(other, export, note_filter)
+    expected = load(store, export)
+
+    def parse(*args, **kwargs):
+        raise AssertionError("the input was parsed again")
+
+    monkeypatch.setattr(database, "load_csv_as_dict", parse)
+    store.misses = 0
+    assert load(store, export) == expected
+    assert load(store, export, note_filter) == filtered
+    assert store.misses == 0
+
+
+def test_cached_paragraphs_are_written_again(store, tmp_path, monkeypatch):
+    rows = [list(row) for row in ROWS]
+    rows[0][3:6] = ["", "", ""]  # A note without a location.
+    export = write_rows(tmp_path / "notes.csv", rows)
+    sort_key = get_reference_resolver().sort_key
+
+    def document(name, notes_store, fragment_store=None):
+        notes = notes_store.load_notes([export], sort_key)
+        notes = sorted(notes, key=lambda note: note.sort_key)
+        path = tmp_path / name / "notes.docx"
+        path.parent.mkdir()
+        stream_to_docx(notes, path, None, fragment_store=fragment_store)
+        with zipfile.ZipFile(path) as docx:
+            return docx.read(DOCUMENT_PART), docx.read(DOCUMENT_RELS_PART)
+
+    other = NoteStore(tmp_path / "other.sqlite3", FIELD_NAMES)
+    expected = document("expected", other)
+    assert document("cold", store, store) == expected
+
+    def render(*args, **kwargs):
+        raise AssertionError("a note was rendered or hashed again")
+
+    # The stored notes are neither rendered nor hashed, nor are their links
+    # resolved.
+    monkeypatch.setattr(writers, "_note_xml", render)
+    monkeypatch.setattr(database, "_note_digest", render)
+    monkeypatch.setattr(get_reference_resolver(), "resolve", render)
+    assert document("warm", store, store) == expected
@@ -0,0 +1,151 @@
+"""Check that every pipeline selects the same notes with a `NoteFilter`, and
+that only the newest copy of each note is kept."""
+
+import csv
+import json
+
+import pytest
+from generate_export import HEADER, generate_rows
+
+from notes_converter.converter import NotesConverter
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.converters import Note
+from notes_converter.utils.filters import (
+    remove_duplicate_notes,
+    remove_sorted_duplicates,
+)
+
+FILTERS = [
+    {"tags": ["Faith"]},
+    {"notebooks": ["Seminary"], "since": "2018-06-01"},
+    {"tags": ["Faith", "Prayer"], "since": "2018-06-01", "until": "2019-12-31"},
+    {"volumes": ["book of mormon"], "notebooks": ["Personal Study"]},
+]
+PIPELINES = [
+    {"pipeline": "memory"},
+    {"pipeline": "memory", "jobs": 2},
+    {"pipeline": "spill"},
+    {"pipeline": "sqlite"},
+    {"pipeline": "memory", "incremental": True},
+    {"pipeline": "memory", "from_cache": True},
+    {"pipeline": "spill", "from_cache": True},
+]
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    """Two exports whose copies of the same notes may have other tags, and a
+    later update, in the second one."""
+    rows = list(generate_rows(3000, seed=1, duplicates=0.25))
+    paths = []
+    for name, part in (("a.csv", rows[::2]), ("b.csv", rows[1::2])):
+        path = tmp_path_factory.mktemp("exports") / name
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            writer.writerows(part)
+        paths.append(path)
+    return paths
+
+
+def convert(exports, output_path, **options) -> list:
+    converter = NotesConverter()
+    converter.input_path = exports
+    converter.output_path = output_path
+    converter.grouping = False
+    converter.store_path = output_path.with_name("store.sqlite3")
+    converter.cache_dir = output_path.with_name("cache")
+    for name, value in options.items():
+        setattr(converter, name, value)
+    converter.convert()
+    with open(output_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("criteria", FILTERS)
+def test_pipelines_select_the_same_notes(exports, tmp_path, criteria):
+    every_note = convert(exports, tmp_path / "all.jsonl")
+    note_filter = NotesConverter()
+    for name, value in criteria.items():
+        setattr(note_filter, name, value)
+    note_filter = note_filter.note_filter()
+    expected = [group for group in every_note if _matches(group, note_filter)]
+    assert expected
+
+    for index, options in enumerate(PIPELINES):
+        # Twice, to read the note cache and the note store once written.
+        for attempt in range(2):
+            output_path = tmp_path / f"{index}-{attempt}.jsonl"
+            notes = convert(exports, output_path, **options, **criteria)
+            assert notes == expected, options
+
+
+def make_row(title: str, last_updated: str, tags: str = "Faith") -> dict:
+    row = dict.fromkeys(FIELD_NAMES, "")
+    row.update(
+        title=title,
+        note_text="Text",
+        source_location="undefined",
+        tags=tags,
+        created="2018-01-01T00:00:00.000Z",
+        last_updated=last_updated,
+    )
+    return row
+
+
+def make_note(row: dict, catalog: Catalog) -> Note:
+    return Note(
+        row["type"],
+        row["title"],
+        [row["note_text"]],
+        row["source_location"],
+        [row["tags"]],
+        [],
+        row["study_set"],
+        int(row["last_updated"][:4]),
+        0,
+        row["highlight"],
+        (0,),
+        catalog,
+    )
+
+
+@pytest.mark.parametrize("newest_first", [False, True])
+def test_the_newest_copy_is_kept_in_place(newest_first):
+    older = make_row("Copy", "2018-01-01T00:00:00.000Z", tags="Faith")
+    newer = make_row("Copy", "2019-01-01T00:00:00.000Z", tags="Prayer")
+    copies = [newer, older] if newest_first else [older, newer]
+    rows = [make_row("First", "2018"), copies[0], make_row("Last", "2018")]
+    rows.append(copies[1])
+
+    assert remove_duplicate_notes(rows) == [rows[0], newer, rows[2]]
+
+    catalog = Catalog()
+    notes = [make_note(row, catalog) for row in rows]
+    kept = notes[rows.index(newer)]
+    for unique in (remove_duplicate_notes(notes), remove_sorted_duplicates(notes)):
+        assert [id(note) for note in unique] == [id(notes[0]), id(kept), id(notes[2])]
+    assert kept.tags == ["Prayer"]
+
+
+def _matches(group, note_filter) -> bool:
+    """Match the unfiltered output, holding the most recent copy of each
+    note, against the criteria."""
+    from notes_converter.utils.resolvers import get_reference_resolver
+    from notes_converter.utils.timestamps import parse_timestamp
+
+    (note,) = group["notes"]
+    if note_filter.tags and note_filter.tags.isdisjoint(note["tags"]):
+        return False
+    if note_filter.notebooks and note_filter.notebooks.isdisjoint(note["notebooks"]):
+        return False
+    created = parse_timestamp(note["created"])
+    if note_filter._since is not None and created < note_filter._since:
+        return False
+    if note_filter._until is not None and created >= note_filter._until:
+        return False
+    if note_filter.volumes:
+        volume = get_reference_resolver().sort_key(group["source_location"])[0]
+        return volume in note_filter.volume_indexes()
+    return True
@@ -0,0 +1,60 @@
+"""Check that the notes sharing a reference are grouped under one heading,
+in the order of the notes."""
+
+from types import SimpleNamespace
+
+from notes_converter.utils.groupers import group_notes
+
+URL = "https://www.churchofjesuschrist.org/study/scriptures/bofm/alma/5"
+
+
+def make_note(title, source_location, sort_key, created):
+    return SimpleNamespace(
+        title=title,
+        source_location=source_location,
+        sort_key=sort_key,
+        created=created,
+    )
+
+
+def groups(notes, **options):
+    return [
+        (group.title, group.source_location, [note.created for note in group.notes])
+        for group in group_notes(notes, **options)
+    ]
+
+
+def test_notes_sharing_a_reference_are_grouped():
+    notes = [
+        make_note("Alma 5:3", f"{URL}?lang=eng&id=p3#p3", (0, 1, 5, 3, 3), 30),
+        make_note("Alma 5:3", f"{URL}?id=p3", (0, 1, 5, 3, 3), 10),
+        make_note("Alma 5:3", f"{URL}?id=p3&lang=spa", (0, 1, 5, 3, 3), 20),
+        make_note("Alma 5:3 (1)", f"{URL}?id=p3", (0, 1, 5, 3, 3), 5),
+        make_note("Alma 5:4", f"{URL}?id=p4", (0, 1, 5, 4, 4), 40),
+        make_note("Alma 5:3", f"{URL}?id=p3", (0, 1, 5, 5, 5), 50),
+    ]
+    assert groups(notes) == [
+        # The group of the first note, with its notes by creation.
+        ("Alma 5:3", f"{URL}?id=p3", [10, 20, 30]),
+        # A title of its own keeps its own heading.
+        ("Alma 5:3 (1)", f"{URL}?id=p3", [5]),
+        ("Alma 5:4", f"{URL}?id=p4", [40]),
+        # Only notes of the same sort key are grouped.
+        ("Alma 5:3", f"{URL}?id=p3", [50]),
+    ]
+    assert groups(notes, combine=False) == [
+        (note.title, note.source_location, [note.created]) for note in notes
+    ]
+
+
+def test_notes_without_a_location_are_not_grouped():
+    notes = [
+        make_note("", location, (6, 0, 0, 0, 0), created)
+        for created, location in enumerate(["", "undefined", "", "undefined"])
+    ]
+    assert groups(notes) == [
+        ("", "", [0]),
+        ("", "undefined", [1]),
+        ("", "", [2]),
+        ("", "undefined", [3]),
+    ]
@@ -0,0 +1,52 @@
+"""Check that exports are read without their titles, and closed once
+read."""
+
+import csv
+
+import pytest
+from generate_export import HEADER, generate_rows
+
+from notes_converter.utils import loaders
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.loaders import iter_csv_files
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """The exports opened by the loaders."""
+    files = []
+
+    def recorded(path, *args, **kwargs):
+        f = open(path, *args, **kwargs)
+        if str(path).endswith(".csv"):
+            files.append(f)
+        return f
+
+    monkeypatch.setattr(loaders, "open", recorded, raising=False)
+    return files
+
+
+def test_rows_follow_the_titles_and_files_are_closed(tmp_path, opened):
+    rows = list(generate_rows(20, seed=6))
+    paths = [tmp_path / "empty.csv", tmp_path / "titles.csv", tmp_path / "notes.csv"]
+    paths[0].write_text("", encoding="utf-8")
+    for path, content in zip(paths[1:], [[], rows]):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            writer.writerows(content)
+
+    loaded = list(iter_csv_files(paths, FIELD_NAMES))
+    assert [list(row.values()) for row in loaded] == rows
+    assert len(opened) == 3 and all(f.closed for f in opened)
+
+
+def test_files_are_closed_when_reading_stops(tmp_path, opened):
+    path = tmp_path / "notes.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows([HEADER, *generate_rows(5, seed=6)])
+
+    rows = iter_csv_files([path], FIELD_NAMES)
+    next(rows)
+    rows.close()
+    assert opened[0].closed
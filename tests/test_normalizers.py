@@ -0,0 +1,57 @@
+"""Check that note texts are normalized the same way one at a time or in a
+batch, and that their quotes are made curly."""
+
+import pytest
+from generate_export import generate_rows
+
+from notes_converter.utils.normalizers import (
+    normalize_text,
+    normalize_texts,
+    smarten_quotes,
+)
+
+# Texts whose quotes, blank lines or separators could leak into the
+# paragraphs of the next text of a batch.
+TEXTS = [
+    "",
+    "\n\n",
+    '"Opening a quote\n\nand closing it."',
+    "Ends with an opening quote '",
+    "[Dec 4, 2024]\nA date header.\n\n-----\n\nA ruler.",
+    "A record separator \x1e within a paragraph.",
+    "\x1e",
+    "First line\nsecond line\n\n\n\nafter blank lines\n",
+    "   \n\nOnly spaces above.",
+    "'Single' and \"double\"",
+]
+
+
+@pytest.mark.parametrize("texts", [TEXTS, TEXTS[5:8], TEXTS[:1], []])
+def test_batch_matches_single_texts(texts):
+    assert normalize_texts(texts) == [normalize_text(text) for text in texts]
+
+
+def test_batch_matches_single_texts_of_an_export():
+    texts = [row[2] for row in generate_rows(500, seed=3)] + TEXTS
+    assert normalize_texts(texts) == [normalize_text(text) for text in texts]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('"Quoted"', "“Quoted”"),
+        ("He said 'yes' and left.", "He said ‘yes’ and left."),
+        ("Don't, won't.", "Don’t, won’t."),
+        ("The Saints' hymns", "The Saints’ hymns"),
+        ('("Quoted")', "(“Quoted”)"),
+        ('["Quoted"]', "[“Quoted”]"),
+        ("\"'Nested'\"", "“‘Nested’”"),
+        ('Ends with "a quote".', "Ends with “a quote”."),
+        ('"Asked?" "Answered!"', "“Asked?” “Answered!”"),
+        ('A dash—"quoted"', "A dash—“quoted”"),
+        ('Line one\n"line two"', "Line one\n“line two”"),
+        ("12'6\"", "12’6”"),
+    ],
+)
+def test_smarten_quotes(text, expected):
+    assert smarten_quotes(text) == expected
@@ -0,0 +1,105 @@
+"""Check that loading an export in byte ranges, in this process or in worker
+processes, builds the same notes as loading it whole."""
+
+import csv
+import os
+
+import pytest
+from generate_export import HEADER, generate_rows
+
+from notes_converter.utils import parallel
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.filters import remove_duplicate_notes
+from notes_converter.utils.parallel import load_notes, load_notes_range, split_csv
+
+# Note texts whose quotes and newlines could be mistaken for the end of a
+# record.
+TEXTS = [
+    'He said ""hello""\nand left.',
+    'A line ending in a quote"\r\nand a Windows line break.',
+    '"\n"',
+    '""',
+    "Ends with a newline\n",
+    '"Starts quoted,"\n\n\nafter blank lines.',
+]
+
+
+@pytest.fixture(
+    scope="module",
+    params=[("\r\n", True), ("\n", True), ("\r\n", False), ("\n", False)],
+    ids=["crlf", "lf", "crlf-no-final-newline", "lf-no-final-newline"],
+)
+def export(request, tmp_path_factory):
+    """An export with multi-line quoted texts, written with the given line
+    endings, and with or without a newline after its last record."""
+    line_terminator, final_newline = request.param
+    rows = list(generate_rows(2000, seed=2, duplicates=0.1))
+    # Spread the texts over the export, the last one ending it.
+    for index, text in enumerate(TEXTS, start=1):
+        position = len(rows) * index // len(TEXTS) - 1
+        rows[position] = [*rows[position][:2], text, *rows[position][3:]]
+
+    path = tmp_path_factory.mktemp("exports") / "notes.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator=line_terminator)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    if not final_newline:
+        with open(path, "rb+") as f:
+            f.truncate(os.path.getsize(path) - len(line_terminator))
+    return path
+
+
+@pytest.mark.parametrize("parts", [2, 3, 7, 64])
+def test_ranges_build_the_same_notes(export, parts):
+    expected = load_notes([export], FIELD_NAMES)
+    assert len(expected) > 1500
+
+    ranges = split_csv(export, parts)
+    assert len(ranges) > 1
+    assert ranges[-1][1] == os.path.getsize(export)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+
+    notes = remove_duplicate_notes(
+        note
+        for start, end in ranges
+        for note in load_notes_range(export, start, end, FIELD_NAMES)
+    )
+    assert [note.as_record() for note in notes] == [
+        note.as_record() for note in expected
+    ]
+
+
+@pytest.mark.parametrize("jobs", [2, 3])
+def test_workers_build_the_same_notes(export, monkeypatch, jobs):
+    expected = load_notes([export], FIELD_NAMES, jobs=1)
+    # Split even a small export into several ranges per worker.
+    monkeypatch.setattr(parallel, "MIN_RANGE_SIZE", 1)
+    assert len(parallel._plan_ranges([export], jobs)) > jobs
+
+    notes = load_notes([export], FIELD_NAMES, jobs=jobs)
+    assert [note.as_record() for note in notes] == [
+        note.as_record() for note in expected
+    ]
+
+
+def test_parts_without_a_name_are_numbered(tmp_path):
+    taken = []
+    for name in ["Alma 1", "", "Alma 1", ""]:
+        taken.append(parallel._part_path(tmp_path / "Notes.docx", name, taken))
+    assert [path.name for path in taken] == [
+        "Notes (Alma 1).docx",
+        "Notes.docx",
+        "Notes (Alma 1, 2).docx",
+        "Notes (2).docx",
+    ]
+
+
+@pytest.mark.parametrize("content", ["", ",".join(HEADER) + "\r\n"])
+def test_exports_without_notes(tmp_path, content, monkeypatch):
+    export = tmp_path / "notes.csv"
+    export.write_text(content, encoding="utf-8")
+    monkeypatch.setattr(parallel, "MIN_RANGE_SIZE", 1)
+    assert load_notes([export], FIELD_NAMES, jobs=1) == []
+    assert load_notes([export], FIELD_NAMES, jobs=2) == []
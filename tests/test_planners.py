@@ -0,0 +1,45 @@
+"""Check that sampling the notes of a profiled conversion leaves the peak
+memory of its stage intact."""
+
+import tracemalloc
+
+import pytest
+from generate_export import write_export
+
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.planners import sample_notes
+from notes_converter.utils.profilers import start_peak, traced_peak
+from notes_converter.utils.resolvers import get_reference_resolver
+
+PEAK = 50 * 2**20
+
+
+@pytest.fixture(scope="module")
+def export(tmp_path_factory):
+    return write_export(tmp_path_factory.mktemp("exports") / "notes.csv", 2000)
+
+
+def test_sampling_traces_memory_only_while_it_runs(export):
+    assert not tracemalloc.is_tracing()
+    sample = sample_notes([export], FIELD_NAMES, get_reference_resolver().sort_key)
+    assert not tracemalloc.is_tracing()
+    assert sample.rows == 1000 and sample.dedup_bytes > 0 and sample.sort_bytes > 0
+
+
+def test_sampling_keeps_the_peak_of_a_traced_stage(export):
+    sort_key = get_reference_resolver().sort_key
+    expected = sample_notes([export], FIELD_NAMES, sort_key)
+
+    tracemalloc.start()
+    try:
+        start_peak()
+        block = bytearray(PEAK)
+        del block
+        sample = sample_notes([export], FIELD_NAMES, sort_key)
+        assert tracemalloc.is_tracing()
+        assert traced_peak() >= PEAK
+    finally:
+        tracemalloc.stop()
+    # Measured as when nothing else traces memory.
+    assert sample.dedup_bytes == pytest.approx(expected.dedup_bytes, rel=0.2)
+    assert sample.sort_bytes == pytest.approx(expected.sort_bytes, rel=0.2)
@@ -0,0 +1,181 @@
+"""Check the sort keys built from source locations, and that notes sorted
+in runs spilled to disk come out as `sorted` would order them."""
+
+import random
+import re
+
+import pytest
+from generate_export import write_export
+
+from notes_converter.utils import sorters
+from notes_converter.utils.constants import FIELD_NAMES
+from notes_converter.utils.parallel import load_notes
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.sorters import (
+    external_sort,
+    is_sorted,
+    reference_sort_key,
+    reference_volume,
+)
+
+SITE = "https://www.churchofjesuschrist.org/study"
+STANDARD_WORKS = {
+    "ot": ["gen", "ex"],
+    "nt": ["matt"],
+    "bofm": ["1-ne", "alma"],
+    "dc-testament": ["introduction", "dc"],
+    "pgp": ["moses"],
+}
+# The titles of the books above that notes are written on, in the same
+# order, as the titles were sorted before the notes were sorted by their
+# source location.
+BOOKS = {
+    "gen": "Genesis",
+    "ex": "Exodus",
+    "matt": "Matthew",
+    "1-ne": "1 Nephi",
+    "alma": "Alma",
+    "dc": "Doctrine and Covenants",
+    "moses": "Moses",
+}
+
+
+@pytest.fixture(scope="module")
+def notes(tmp_path_factory):
+    export = write_export(tmp_path_factory.mktemp("exports") / "notes.csv", 3000)
+    return load_notes([export], FIELD_NAMES)
+
+
+@pytest.fixture
+def spills(monkeypatch):
+    """Merge three runs at once, in small batches, and count the runs
+    spilled."""
+    monkeypatch.setattr(sorters, "MERGE_WIDTH", 3)
+    monkeypatch.setattr(sorters, "RUN_BATCH_SIZE", 7)
+    spilled = []
+    spill = sorters._spill
+
+    def counted(notes, path):
+        spilled.append(path)
+        return spill(notes, path)
+
+    monkeypatch.setattr(sorters, "_spill", counted)
+    return spilled
+
+
+@pytest.mark.parametrize("run_size", [100, 150, 400, 5000])
+def test_runs_are_merged_in_a_stable_order(notes, tmp_path, spills, run_size):
+    sort_key = get_reference_resolver().sort_key
+    expected = sorted(notes, key=lambda note: sort_key(note.source_location))
+    # Some notes share their key, so that the order of ties is checked.
+    assert len({note.sort_key for note in notes}) < len(notes)
+
+    result = list(external_sort(notes, run_size=run_size, temp_dir=tmp_path))
+    assert [note.as_record() for note in result] == [
+        note.as_record() for note in expected
+    ]
+    if run_size == 100:
+        # More runs than are merged at once, so that merged runs are merged
+        # again.
+        assert len(spills) > len(notes) // run_size
+    if run_size >= len(notes):
+        assert spills == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_runs_are_removed_when_the_sort_is_stopped(notes, tmp_path, spills):
+    result = external_sort(notes, run_size=100, temp_dir=tmp_path)
+    next(result)
+    assert spills and list(tmp_path.iterdir())
+    result.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def baseline_title_key(title_order):
+    """The sort key of a note's title used before notes were sorted by their
+    source location."""
+    indexed_titles = {title: index for index, title in enumerate(title_order)}
+    chapter_verse_pattern = re.compile(r"\W(\d+|\d+:\d+)|;|:.*")
+
+    def arrange_by_title_and_verse(title):
+        title_without_verse = chapter_verse_pattern.sub("", title)
+        chapter_index = indexed_titles.get(title_without_verse, float("inf"))
+        found = [i for i in chapter_verse_pattern.findall(title) if i.strip()]
+        chapter = int(found[0]) if found else 0
+        verse = int(found[1]) if len(found) > 1 else 0
+        return chapter_index, chapter, verse
+
+    return arrange_by_title_and_verse
+
+
+def scripture_notes(count: int, seed: int = 9):
+    """Yield the title and source location of notes on the books of
+    `STANDARD_WORKS`, some on a range of verses or on a whole chapter."""
+    rng = random.Random(seed)
+    books = [
+        (volume, book)
+        for volume, names in STANDARD_WORKS.items()
+        for book in names
+        if book in BOOKS
+    ]
+    for _ in range(count):
+        volume, book = rng.choice(books)
+        chapter, verse = rng.randrange(1, 12), rng.randrange(1, 30)
+        url = f"{SITE}/scriptures/{volume}/{book}/{chapter}?lang=eng"
+        title = f"{BOOKS[book]} {chapter}"
+        kind = rng.random()
+        if kind < 0.2:  # The whole chapter.
+            yield title, url
+        elif kind < 0.4:
+            last = verse + rng.randrange(1, 4)
+            yield f"{title}:{verse}-{last}", f"{url}&id=p{verse}-p{last}#p{verse}"
+        else:
+            yield f"{title}:{verse}", f"{url}&id=p{verse}#p{verse}"
+
+
+@pytest.mark.parametrize(
+    "source_location, expected",
+    [
+        (f"{SITE}/scriptures/bofm/alma/5?lang=eng&id=p4-p6#p4", (2, 1, 5, 4, 6)),
+        (f"{SITE}/scriptures/bofm/alma/5?lang=eng&id=p4#p4", (2, 1, 5, 4, 4)),
+        (f"{SITE}/scriptures/bofm/alma/5?lang=eng", (2, 1, 5, 0, 0)),
+        (f"{SITE}/scriptures/bofm/alma/5#p7", (2, 1, 5, 7, 7)),
+        (f"{SITE}/scriptures/dc-testament/dc/121?id=p7", (3, 1, 121, 7, 7)),
+        (f"{SITE}/scriptures/dc-testament/introduction?id=p2", (3, 0, 0, 2, 2)),
+        (f"{SITE}/scriptures/bofm/unknown-book/3?id=p1", (2, 2, 3, 1, 1)),
+        (f"{SITE}/scriptures/unknown-volume/a/3?id=p1", (5, 0, 0, 1, 1)),
+        (f"{SITE}/manual/come-follow-me/12?lang=eng&id=p3", (5, 0, 12, 3, 3)),
+        (f"{SITE}/ensign/2020/05/faith?lang=eng&id=p9-p11", (5, 0, 0, 9, 11)),
+        ("https://example.com/", (5, 0, 0, 0, 0)),
+        ("undefined", (6, 0, 0, 0, 0)),
+        ("", (6, 0, 0, 0, 0)),
+    ],
+)
+def test_sort_keys(source_location, expected):
+    assert reference_sort_key(STANDARD_WORKS)(source_location) == expected
+    assert reference_volume(STANDARD_WORKS)(source_location) == expected[0]
+
+
+def test_sort_keys_order_notes_as_their_titles_did():
+    sort_key = reference_sort_key(STANDARD_WORKS)
+    title_key = baseline_title_key(list(BOOKS.values()))
+    notes = list(scripture_notes(2000))
+    other = [
+        ("Faith", f"{SITE}/ensign/2020/05/faith?lang=eng&id=p9"),
+        ("Lesson 12", f"{SITE}/manual/come-follow-me/12?lang=eng&id=p3"),
+    ]
+    unlocated = [("", "undefined"), ("", "")]
+
+    ordered = sorted(notes + other + unlocated, key=lambda note: sort_key(note[1]))
+    # The titles of the scriptures are in the order they were sorted in, only
+    # ranges of verses being placed after the verse they start at.
+    assert is_sorted(title_key(title) for title, _ in ordered[: len(notes)])
+    assert ordered[len(notes) :] == other + unlocated
+
+
+def test_volumes_of_an_export_match_their_sort_keys(notes):
+    standard_works = get_reference_resolver().standard_works
+    sort_key = reference_sort_key(standard_works)
+    volume = reference_volume(standard_works)
+    for note in notes:
+        assert volume(note.source_location) == sort_key(note.source_location)[0]
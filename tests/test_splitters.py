@@ -0,0 +1,96 @@
+"""Check the names given to the parts of split notes."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from notes_converter.utils.catalogs import Catalog
+from notes_converter.utils.converters import Note
+from notes_converter.utils.parallel import write_parts
+from notes_converter.utils.resolvers import get_reference_resolver
+from notes_converter.utils.splitters import split_notes
+from notes_converter.utils.writers import write_to_txt
+
+SCRIPTURES = "https://www.churchofjesuschrist.org/study/scriptures"
+
+
+def make_note(title: str, volume: int = 0):
+    return SimpleNamespace(
+        title=title,
+        note_text=("Text",),
+        source_location="undefined",
+        sort_key=(volume,),
+    )
+
+
+def names(notes, **options):
+    return [name for name, _ in split_notes(notes, max_notes=2, **options)]
+
+
+def test_parts_are_named_after_their_references():
+    notes = [make_note(title) for title in ("Alma 1:1", "Alma 1:5", "Alma 3:2")]
+    assert names(notes) == ["Alma 1", "Alma 3"]
+    assert names(notes, by="volume", volume_name=lambda _: "Book of Mormon") == [
+        "Book of Mormon, Alma 1",
+        "Book of Mormon, Alma 3",
+    ]
+
+
+def test_untitled_notes_are_left_out_of_names():
+    notes = [make_note(title, 4) for title in ("", "", "Ether 2:1", "", "")]
+    assert names(notes, by="volume", volume_name=lambda _: "Annotations") == [
+        "Annotations",
+        "Annotations, Ether 2",
+        "Annotations",
+    ]
+    assert names(notes) == ["", "Ether 2", ""]
+
+
+def test_volume_names_leave_references_unchanged():
+    resolver = get_reference_resolver()
+    assert [resolver.volume_name(volume) for volume in range(7)] == [
+        "Old Testament",
+        "New Testament",
+        "Book of Mormon",
+        "Doctrine and Covenants",
+        "Pearl of Great Price",
+        "Other Study Material",
+        "Annotations",
+    ]
+    # As the references were before the volumes were named.
+    assert resolver.resolve(f"{SCRIPTURES}/dc-testament/dc/121?id=p7") == (
+        "dc-testament, dc 121:7"
+    )
+    assert resolver.resolve(f"{SCRIPTURES}/pgp/moses/1?id=p39") == "pgp, moses 1:39"
+
+
+@pytest.mark.parametrize("limits", [{"max_notes": 0}, {"max_bytes": -1}])
+def test_limits_must_be_positive(limits):
+    with pytest.raises(ValueError, match="at least 1"):
+        list(split_notes([make_note("Alma 1:1")], **limits))
+
+
+def test_untagged_notes_keep_a_part_of_their_own(tmp_path):
+    catalog = Catalog()
+    notes = [
+        Note("", f"Alma {i}:1", ["Text"], "", tags, [], "", 0, 0, "", (i,), catalog)
+        for i, tags in enumerate([["No Tag"], [], ["Faith"], [], ["No Tag", "Faith"]])
+    ]
+    parts = [
+        (name, [note.title for note in part])
+        for name, part in split_notes(notes, by="tag")
+    ]
+    assert parts == [
+        ("Faith", ["Alma 2:1", "Alma 4:1"]),
+        ("No Tag", ["Alma 0:1", "Alma 4:1"]),
+        ("No Tag", ["Alma 1:1", "Alma 3:1"]),
+    ]
+
+    paths = write_parts(
+        split_notes(notes, by="tag"), write_to_txt, tmp_path / "notes.txt"
+    )
+    assert [path.name for path in paths] == [
+        "notes (Faith).txt",
+        "notes (No Tag).txt",
+        "notes (No Tag, 2).txt",
+    ]
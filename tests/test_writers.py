@@ -0,0 +1,102 @@
+"""Check that templates are validated against the styles the writers use."""
+
+import csv
+import json
+import zipfile
+
+import pytest
+from generate_export import HEADER, generate_rows, write_export
+
+from notes_converter.utils import writers
+from notes_converter.utils.constants import FIELD_NAMES, TEMPLATE_PATH
+from notes_converter.utils.exceptions import InvalidTemplate
+from notes_converter.utils.parallel import load_notes
+from notes_converter.utils.sorters import sort_notes_by_reference
+from notes_converter.utils.writers import (
+    DOCUMENT_RELS_PART,
+    REQUIRED_STYLES,
+    STYLES_PART,
+    WRITERS,
+    TemplateCache,
+    _style,
+    stream_to_docx,
+    write_to_docx,
+)
+
+
+def copy_template(path, rename_style: str):
+    """Copy the default template, with the style `rename_style` renamed so
+    that the copy lacks it."""
+    with zipfile.ZipFile(TEMPLATE_PATH / "default.docx") as source:
+        with zipfile.ZipFile(path, "w") as target:
+            for info in source.infolist():
+                data = source.read(info)
+                if info.filename == STYLES_PART:
+                    data = data.replace(
+                        f'<w:name w:val="{rename_style}"/>'.encode(),
+                        b'<w:name w:val="Renamed"/>',
+                    )
+                target.writestr(info, data)
+    return path
+
+
+@pytest.mark.parametrize("name", REQUIRED_STYLES)
+def test_template_without_a_style_is_invalid(tmp_path, name):
+    template = copy_template(tmp_path / "template.docx", name)
+    with pytest.raises(InvalidTemplate, match=name):
+        TemplateCache().get(template)
+
+
+@pytest.mark.parametrize("writer", [write_to_docx, stream_to_docx])
+def test_writers_use_only_required_styles(tmp_path, monkeypatch, writer):
+    used = set()
+
+    def style(styles, name):
+        used.add(name)
+        return _style(styles, name)
+
+    monkeypatch.setattr(writers, "_style", style)
+    export = write_export(tmp_path / "notes.csv", 200)
+    notes = sort_notes_by_reference(load_notes([export], FIELD_NAMES))
+    writer(notes, tmp_path / "notes.docx", None)
+    assert used and used <= set(REQUIRED_STYLES)
+
+
+@pytest.fixture(scope="module")
+def unlocated_notes(tmp_path_factory):
+    """Sorted notes, the first of which has no source location."""
+    rows = list(generate_rows(50, seed=5, duplicates=0))
+    rows[0][HEADER.index("Source Location")] = ""
+    path = tmp_path_factory.mktemp("exports") / "notes.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    notes = sort_notes_by_reference(load_notes([path], FIELD_NAMES))
+    assert any(not note.source_location for note in notes)
+    return notes
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["write", "stream"])
+@pytest.mark.parametrize("name", sorted(WRITERS))
+def test_notes_without_a_location_are_not_linked(
+    tmp_path, unlocated_notes, name, stream
+):
+    writer = WRITERS[name]
+    write = writer.stream if stream else writer.write
+    output_path = tmp_path / f"notes{writer.suffixes[0]}"
+    if writer.templated:
+        write(unlocated_notes, output_path, None)
+    else:
+        write(unlocated_notes, output_path)
+
+    if name == "docx":
+        with zipfile.ZipFile(output_path) as document:
+            assert b'Target=""' not in document.read(DOCUMENT_RELS_PART)
+        return
+    text = output_path.read_text(encoding="utf-8")
+    if name == "jsonl":
+        records = [json.loads(line) for line in text.splitlines()]
+        unlocated = [r for r in records if not r["source_location"]]
+        assert [record["reference"] for record in unlocated] == [""]
+    assert "]()" not in text and 'href=""' not in text